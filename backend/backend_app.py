@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, g, Response, stream_with_context
 
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
@@ -6,6 +6,8 @@ import pandas as pd
 import os
 import sys
 import math
+import time
+import shutil
 
 # Ensure this directory is on the path so sibling modules can be imported
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -13,8 +15,20 @@ if CURRENT_DIR not in sys.path:
     sys.path.insert(0, CURRENT_DIR)
 
 from werkzeug.utils import secure_filename
-from ml_models import FraudDetectionModel
+from ml_models import BATCH_STAT_COLUMNS, FraudDetectionModel, train_model_bundle, train_incremental_bundle
+from hyperparameter_search import tune_hyperparameters_job, validate_params
 from data_processor import DataProcessor
+from streaming import PredictionAccumulator, file_batch_statistics, iter_predictions, stream_predictions
+from csv_validation import CsvUploadError, spool_csv
+from parallel_scoring import ScoringPool
+from micro_batching import MicroBatcher
+from jobs import JobManager, promote_directory
+from model_bundle import POINTER_FILENAME, model_files, prune_model_files, publish_model_files, read_pointer
+from feature_cache import FeatureMatrixCache, file_sha256
+from model_registry import ModelRegistry, ModelSnapshot
+from results_store import EQUALITY_FILTERS, RANGE_FILTERS, ResultsNotReady, ResultsStore
+from downloads import ENCODINGS, compress_in_background, compressed_variants, negotiate
+from metrics import REGISTRY, MODEL_STAGE_SECONDS
 from auth import UserManager
 import json
 from datetime import datetime, timedelta
@@ -33,10 +47,57 @@ jwt = JWTManager(app)
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'csv'}
-MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+MAX_FILE_SIZE = int(os.environ.get('MAX_FILE_SIZE_MB', 50)) * 1024 * 1024  # 50MB by default
+# Uploads are validated by parsing only this many leading rows (header, dtypes, preview)
+VALIDATE_SAMPLE_ROWS = int(os.environ.get('VALIDATE_SAMPLE_ROWS', 10000))
+# Rows per chunk when a prediction is streamed (``stream=true``)
+PREDICT_CHUNK_ROWS = int(os.environ.get('PREDICT_CHUNK_ROWS', 50000))
+# NDJSON responses use smaller chunks so the first rows reach the client sooner
+NDJSON_CHUNK_ROWS = int(os.environ.get('NDJSON_CHUNK_ROWS', 10000))
+# Worker processes used to score a batch (1 = score in the request process)
+PREDICT_WORKERS = int(os.environ.get('PREDICT_WORKERS', 1))
+# Largest list accepted by the low-latency /api/score endpoint
+MAX_SCORE_TRANSACTIONS = int(os.environ.get('MAX_SCORE_TRANSACTIONS', 100))
+# Concurrent /api/score requests are coalesced for up to this window / row count
+# (SCORE_BATCH_WINDOW_MS=0 batches only what queues up while a batch is scoring)
+SCORE_MICRO_BATCHING = os.environ.get('SCORE_MICRO_BATCHING', '1').strip().lower() in {'1', 'true', 'yes', 'on'}
+SCORE_BATCH_WINDOW_MS = float(os.environ.get('SCORE_BATCH_WINDOW_MS', 2))
+SCORE_BATCH_MAX_ROWS = int(os.environ.get('SCORE_BATCH_MAX_ROWS', 256))
 ALERT_RULES_FILE = os.path.join('models', 'alert_rules.json')
 TRAINING_HISTORY_FILE = os.path.join('models', 'training_history.json')
 CASES_FILE = os.path.join('models', 'cases.json')
+# Report of the latest hyperparameter search (mode=tune)
+TUNING_RESULTS_FILE = os.path.join('models', 'tuning_results.json')
+# Training jobs write their bundle here and it is promoted into models/ on success
+MODEL_STAGING_FOLDER = os.path.join('models', 'staging')
+# Background predict jobs allowed to run at once (training always runs one at a time)
+PREDICT_JOB_CONCURRENCY = int(os.environ.get('PREDICT_JOB_CONCURRENCY', 2))
+# Trees (and XGBoost rounds) added by each incremental training run
+INCREMENTAL_NEW_TREES = int(os.environ.get('INCREMENTAL_NEW_TREES', 10))
+# Fraction of legitimate transactions kept per merchant category and day when
+# training (1 = train on everything); requests can override with negative_rate
+TRAIN_NEGATIVE_RATE = float(os.environ.get('TRAIN_NEGATIVE_RATE', 1))
+# Parsed uploads and engineered training matrices, keyed by file content
+# (FEATURE_CACHE_MB=0 disables the cache)
+FEATURE_CACHE_FOLDER = os.path.join('models', 'feature_cache')
+FEATURE_CACHE_MB = int(os.environ.get('FEATURE_CACHE_MB', 1024))
+# Process pool size for hyperparameter search trials (0 = one per core)
+TUNING_WORKERS = int(os.environ.get('TUNING_WORKERS', 0))
+# Saved models kept loaded for per-request selection (the active one is always kept)
+MODEL_REGISTRY_MB = int(os.environ.get('MODEL_REGISTRY_MB', 2048))
+# Registry name of the model trained into models/ itself; saved versions live in models/<name>
+DEFAULT_MODEL_NAME = 'default'
+
+# Every prediction run is stored here for /api/results browsing (RESULTS_MAX_RUNS=0 disables it)
+RESULTS_DB = os.path.join('models', 'results.sqlite3')
+RESULTS_MAX_RUNS = int(os.environ.get('RESULTS_MAX_RUNS', 20))
+RESULTS_PAGE_MAX = 1000
+# Results CSVs are gzip (and zstd, if installed) compressed once after they are written
+DOWNLOAD_COMPRESSION = os.environ.get('DOWNLOAD_COMPRESSION', '1').strip().lower() in {'1', 'true', 'yes', 'on'}
+# Response row formats: 'records' (one object per row) or 'columnar' (one array per column)
+RESULT_FORMATS = ('records', 'columnar')
+# Low-cardinality label columns sent as codes into a value list in the columnar format
+DICTIONARY_COLUMNS = {'risk_level', 'merchant_category', 'transaction_type', 'final_decision_label', 'agreement_state'}
 
 # Google OAuth Configuration
 GOOGLE_CLIENT_ID = os.environ.get('GOOGLE_CLIENT_ID', '711763554995-j7l0sglmojndro8399bh033buqecdu1d.apps.googleusercontent.com')
@@ -47,11 +108,68 @@ os.makedirs('models', exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
-# Global model instance
-fraud_model = FraudDetectionModel()
+# Loaded model snapshots; requests score against model_registry.active unless they name one
+model_registry = ModelRegistry(
+    lambda name: load_snapshot(name), MODEL_REGISTRY_MB * 1024 * 1024,
+    active=ModelSnapshot(DEFAULT_MODEL_NAME, FraudDetectionModel())
+)
+score_batcher = MicroBatcher(model_registry.active.model, SCORE_BATCH_WINDOW_MS, SCORE_BATCH_MAX_ROWS) if SCORE_MICRO_BATCHING else None
+job_manager = JobManager(concurrency={'train': 1, 'predict': PREDICT_JOB_CONCURRENCY})
+feature_cache = FeatureMatrixCache(FEATURE_CACHE_FOLDER, FEATURE_CACHE_MB * 1024 * 1024) if FEATURE_CACHE_MB > 0 else None
+results_store = ResultsStore(RESULTS_DB, RESULTS_MAX_RUNS) if RESULTS_MAX_RUNS > 0 else None
 processor = DataProcessor()
 user_manager = UserManager()
 
+# Request, storage and state metrics served by /api/metrics
+HTTP_REQUESTS = REGISTRY.counter(
+    'fraud_http_requests_total', 'HTTP requests by route, method and status', ('route', 'method', 'status')
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'fraud_http_request_seconds', 'HTTP request latency by route', ('route', 'method')
+)
+JSON_STORE_SECONDS = REGISTRY.histogram(
+    'fraud_json_store_seconds', 'Read/write latency of the JSON files under models/', ('operation', 'file')
+)
+MODEL_LOADED = REGISTRY.gauge('fraud_model_loaded', 'Whether a trained model is live (1) or not (0)')
+MODEL_INFO = REGISTRY.gauge('fraud_model_info', 'Version of the live model', ('version',))
+SCORE_QUEUE_DEPTH = REGISTRY.gauge('fraud_score_queue_depth', 'Requests waiting in the /api/score micro-batcher')
+JOBS = REGISTRY.gauge('fraud_jobs', 'Background jobs by kind and status', ('kind', 'status'))
+MODELS_RESIDENT = REGISTRY.gauge('fraud_models_resident', 'Model snapshots held by the registry')
+MODELS_RESIDENT_BYTES = REGISTRY.gauge('fraud_models_resident_bytes', 'On-disk size of the resident model snapshots')
+
+def collect_state_metrics():
+    """Scrape-time refresh of the model, queue and job gauges"""
+    active = model_registry.active
+    trained = is_model_trained(active.model)
+    MODEL_LOADED.labels().set(1 if trained else 0)
+    MODEL_INFO.clear()
+    if trained:
+        MODEL_INFO.labels(active.version or 'unknown').set(1)
+    registry_stats = model_registry.stats()
+    MODELS_RESIDENT.labels().set(registry_stats['resident'])
+    MODELS_RESIDENT_BYTES.labels().set(registry_stats['bytes'])
+    if score_batcher is not None:
+        SCORE_QUEUE_DEPTH.labels().set(score_batcher.stats()['queue_depth'])
+    JOBS.clear()
+    for job in job_manager.list():
+        JOBS.labels(job.kind, job.status).inc()
+
+REGISTRY.add_collector(collect_state_metrics)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Label by route pattern, not path, to keep the series count bounded
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.labels(route, request.method).observe(time.perf_counter() - started)
+        HTTP_REQUESTS.labels(route, request.method, response.status_code).inc()
+    return response
+
 BASE_CASE_FIELDS = [
     'id', 'transaction_id', 'customer_id', 'merchant_id',
     'amount', 'risk_level', 'status', 'notes', 'tags',
@@ -346,15 +464,20 @@ def synthesize_case_from_row(row_dict, extra_fields=None):
 def load_json_file(path, default):
     if not os.path.exists(path):
         return default
+    started = time.perf_counter()
     try:
         with open(path, 'r', encoding='utf-8') as f:
             return json.load(f)
     except Exception:
         return default
+    finally:
+        JSON_STORE_SECONDS.labels('read', os.path.basename(path)).observe(time.perf_counter() - started)
 
 def save_json_file(path, data):
+    started = time.perf_counter()
     with open(path, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+    JSON_STORE_SECONDS.labels('write', os.path.basename(path)).observe(time.perf_counter() - started)
 
 def get_alert_rules():
     default_rules = {
@@ -388,13 +511,329 @@ def load_cases():
 def save_cases(cases):
     save_json_file(CASES_FILE, cases)
 
-def is_model_trained():
-    return all([
-        fraud_model.rf_model is not None,
-        fraud_model.xgb_model is not None,
-        fraud_model.isolation_forest is not None,
-        fraud_model.feature_names is not None
-    ])
+def is_truthy(value):
+    if isinstance(value, str):
+        return value.strip().lower() in {'1', 'true', 'yes', 'on'}
+    return bool(value)
+
+def should_stream_predictions(stream_option=None):
+    """Streaming is opt-in (``stream=true``); a file is never streamed just for its size"""
+    return stream_option is not None and is_truthy(stream_option)
+
+def records_for_json(df):
+    """Convert a results frame to JSON-serializable records"""
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            try:
+                df[col] = df[col].astype(str)
+            except:
+                pass
+    return df.to_dict(orient='records')
+
+def columns_for_json(df):
+    """Convert a results frame to the compact columnar format.
+
+    ``{"format": "columnar", "length": n, "columns": {name: values}}``:
+    numeric and boolean columns are plain arrays (NaN becomes null),
+    DICTIONARY_COLUMNS and ``*_prediction`` labels are ``{"codes": [...],
+    "values": [...]}`` with code -1 for a missing value, and anything else
+    is an array of strings or nulls.
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        name = str(col)
+        if name in DICTIONARY_COLUMNS or name.endswith('_prediction'):
+            codes, uniques = pd.factorize(series)
+            columns[name] = {'codes': codes.tolist(), 'values': [str(value) for value in uniques]}
+        elif series.dtype.kind in 'biu':
+            columns[name] = series.to_numpy().tolist()
+        elif series.dtype.kind == 'f':
+            values = series.to_numpy()
+            missing = np.isnan(values)
+            columns[name] = values.tolist()
+            if missing.any():
+                for i in np.flatnonzero(missing):
+                    columns[name][i] = None
+        else:
+            present = series.notna().to_numpy()
+            columns[name] = [str(value) if keep else None for value, keep in zip(series.tolist(), present)]
+    return {'format': 'columnar', 'length': len(df), 'columns': columns}
+
+def rows_for_json(df, result_format='records'):
+    """Serialize returned rows in the requested RESULT_FORMATS entry"""
+    if result_format == 'columnar':
+        return columns_for_json(df)
+    return records_for_json(df)
+
+def result_format_option(value):
+    result_format = value or 'records'
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f'Unknown format: {result_format} (expected one of {", ".join(RESULT_FORMATS)})')
+    return result_format
+
+def run_streaming_prediction(model, filepath, chunk_size, workers=1, progress=None, result_format='records'):
+    """Score a CSV chunk by chunk and build the /api/predict response"""
+    alert_rules = get_alert_rules()
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    results_filepath = os.path.join(UPLOAD_FOLDER, f'predictions_{timestamp}.csv')
+
+    # The first pass leaves a columnar copy behind for the scoring pass to read
+    file_stats = upload_batch_statistics(model, filepath, chunk_size)
+    accumulator = stream_predictions(
+        model, filepath, results_filepath, alert_rules, chunk_size, workers, progress,
+        cached_chunks(filepath, chunk_size), file_stats
+    )
+    print(f"Streamed {accumulator.total_rows} transactions in {accumulator.chunks} chunks")
+    compress_results(results_filepath)
+    run_id = store_results(results_filepath, filepath, results_filepath, streamed=True)
+
+    response = streaming_summary(accumulator, results_filepath, run_id)
+    response['results'] = rows_for_json(accumulator.preview_frame(), result_format)
+    return response
+
+def cached_chunks(filepath, chunk_size):
+    """Chunks of an upload's columnar copy when the cache has one (None: read the CSV)"""
+    return feature_cache.frame_chunks(filepath, chunk_size) if feature_cache is not None else None
+
+def upload_batch_statistics(model, filepath, chunk_size):
+    """Whole-file batch statistics for chunked scoring, from the columnar copy when there is one.
+
+    Without one, the first pass parses every column rather than just
+    BATCH_STAT_COLUMNS and stores the chunks as the upload's columnar copy.
+    """
+    if feature_cache is None:
+        return file_batch_statistics(model, filepath, chunk_size)
+    chunks = feature_cache.frame_chunks(filepath, chunk_size, BATCH_STAT_COLUMNS)
+    if chunks is None:
+        chunks = feature_cache.stream_frame(filepath, chunk_size)
+    return file_batch_statistics(model, filepath, chunk_size, chunks)
+
+def streaming_summary(accumulator, results_filepath, run_id):
+    """Everything a streamed /api/predict response carries except the preview rows"""
+    return {
+        'success': True,
+        'run_id': run_id,
+        'statistics': accumulator.statistics.result(),
+        'insights': accumulator.insights.result(),
+        'total_results': accumulator.total_rows,
+        'results_file': results_filepath,
+        'alert_rules': accumulator.alert_rules,
+        'custom_alerts': accumulator.alerts.alerts,
+        'watchlist_hits': accumulator.alerts.watchlist_hits,
+        'alert_summary': accumulator.alerts.summary(),
+        'heatmap_data': accumulator.heatmap.result(),
+        'streamed': True,
+        'chunks': accumulator.chunks
+    }
+
+def ndjson_prediction(model, filepath, options):
+    """Score a CSV chunk by chunk, yielding newline-delimited JSON records.
+
+    A ``start`` record goes out immediately, then one ``rows`` record per
+    scored chunk (in the requested format) as soon as it finishes, then a
+    final ``summary`` record with the statistics, insights and alerts of a
+    streamed /api/predict response. A failure part-way through ends the
+    stream with an ``error`` record. Only one chunk is held at a time.
+    """
+    def line(record):
+        return app.json.dumps(record) + '\n'
+
+    try:
+        result_format = result_format_option(options.get('format'))
+        chunk_size = max(1, int(options.get('chunk_size') or NDJSON_CHUNK_ROWS))
+        workers = max(1, int(options.get('workers') or PREDICT_WORKERS))
+        alert_rules = get_alert_rules()
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        results_filepath = os.path.join(UPLOAD_FOLDER, f'predictions_{timestamp}.csv')
+        yield line({'type': 'start', 'chunk_size': chunk_size, 'format': result_format})
+
+        accumulator = PredictionAccumulator(alert_rules)
+        file_stats = upload_batch_statistics(model, filepath, chunk_size)
+        scored = iter_predictions(
+            model, filepath, results_filepath, accumulator, chunk_size, workers,
+            chunks=cached_chunks(filepath, chunk_size), file_stats=file_stats
+        )
+        for index, results_chunk in enumerate(scored):
+            yield line({
+                'type': 'rows',
+                'chunk': index,
+                'offset': accumulator.total_rows - len(results_chunk),
+                'results': rows_for_json(results_chunk, result_format)
+            })
+        print(f"Streamed {accumulator.total_rows} transactions in {accumulator.chunks} chunks (NDJSON)")
+        compress_results(results_filepath)
+        run_id = store_results(results_filepath, filepath, results_filepath, streamed=True)
+        yield line({'type': 'summary', **streaming_summary(accumulator, results_filepath, run_id)})
+    except Exception as e:
+        print(f"Prediction error: {str(e)}")
+        yield line({'type': 'error', 'success': False, 'error': str(e)})
+
+def compress_results(results_filepath):
+    """Start pre-compressing a results CSV for /api/download-results"""
+    if DOWNLOAD_COMPRESSION:
+        compress_in_background(results_filepath)
+
+def store_results(results, filepath, results_filepath, streamed=False):
+    """Start persisting a run's full results for /api/results (a frame, or a results CSV path).
+
+    Returns the run id at once; the rows are written in the background and
+    the run is listed as ``pending`` until they are.
+    """
+    if results_store is None:
+        return None
+    metadata = {'source': filepath, 'results_file': results_filepath, 'streamed': streamed}
+    try:
+        return results_store.save_in_background(results, metadata, PREDICT_CHUNK_ROWS)
+    except Exception as e:
+        # The prediction itself succeeded; only server-side browsing is lost
+        print(f"Results store error: {str(e)}")
+        return None
+
+def is_model_trained(model=None):
+    model = model_registry.active.model if model is None else model
+    return model.is_trained()
+
+def model_name(value):
+    """Registry name from a request value (None for the active model)"""
+    if not value:
+        return None
+    name = secure_filename(str(value))
+    if not name:
+        raise ValueError(f'Invalid model name: {value}')
+    return name
+
+def model_path(name):
+    return 'models' if name in (None, DEFAULT_MODEL_NAME) else os.path.join('models', name)
+
+def is_saved_model(path):
+    """Whether ``path`` is a folder holding a saved model (its current bundle or older pickles)"""
+    if not os.path.isdir(path):
+        return False
+    return os.path.isfile(model_files(path)[0]) or os.path.isfile(os.path.join(path, 'rf_model.pkl'))
+
+def load_snapshot(name):
+    """Registry loader: read a saved model from disk into a new snapshot"""
+    path = model_path(name)
+    model = FraudDetectionModel()
+    model.load(path)
+    if not is_model_trained(model):
+        raise RuntimeError(f"No usable model bundle in {path}")
+    return ModelSnapshot(name or DEFAULT_MODEL_NAME, model, bundle_version(model, path), path)
+
+def resolve_model(value=None):
+    """Model a request scores against: the named snapshot, or the active one.
+
+    Callers keep the returned model for the whole request, so an activation
+    that happens meanwhile never changes the model under them.
+    """
+    name = model_name(value)
+    snapshot = model_registry.get(name) if name else model_registry.active
+    return snapshot.model
+
+def swap_model(model, version=None):
+    """Register ``model`` (trained into models/) as the active snapshot in one swap.
+
+    Requests already running keep the snapshot they started with.
+    """
+    return model_registry.put(ModelSnapshot(DEFAULT_MODEL_NAME, model, version, 'models'), activate=True)
+
+def bundle_version(model, path):
+    """Version label for a model loaded from disk: its folder and bundle checksum"""
+    if model.bundle_checksum:
+        return f"{os.path.basename(os.path.normpath(path))}@{model.bundle_checksum[:12]}"
+    # Per-object pickles from older saves carry no checksum; use their save time
+    features_path = os.path.join(path, 'features.pkl')
+    if not os.path.exists(features_path):
+        return 'unknown'
+    saved = datetime.fromtimestamp(os.path.getmtime(features_path)).strftime('%Y%m%d%H%M%S')
+    return f"{os.path.basename(os.path.normpath(path))}@{saved}"
+
+def install_trained_model(job, training_stats, filepath, staging_path):
+    """Training job completion: promote the staged bundle, load it and swap it in.
+
+    The staged files have new versioned names, so they move in beside the
+    live model without replacing anything; models/ is only pointed at them
+    once they load, so a bad bundle never goes live.
+    """
+    job.report('installing', 0.95)
+    pointer = read_pointer(staging_path)
+    if pointer is None:
+        raise RuntimeError('Trained model bundle could not be loaded')
+    promote_directory(staging_path, 'models', exclude=(POINTER_FILENAME,))
+    model = FraudDetectionModel()
+    model.load('models', pointer)
+    if not is_model_trained(model):
+        prune_model_files('models')
+        raise RuntimeError('Trained model bundle could not be loaded')
+    publish_model_files('models', pointer)
+    version = datetime.now().strftime('%Y%m%d%H%M%S')
+    swap_model(model, version)
+    # Stage timings were measured in the job process; record them here
+    for stage, seconds in (training_stats.get('stage_seconds') or {}).items():
+        MODEL_STAGE_SECONDS.labels('train', stage).observe(seconds)
+
+    entry = {
+        'id': version,
+        'timestamp': datetime.now().isoformat(),
+        'mode': training_stats.get('mode', 'full'),
+        'samples_trained': training_stats.get('samples_trained'),
+        'fraud_ratio': training_stats.get('fraud_ratio'),
+        'rf_score': training_stats.get('rf_score'),
+        'xgb_score': training_stats.get('xgb_score'),
+        'filepath': filepath,
+        'job_id': job.id,
+        'feature_importance': training_stats.get('feature_importance', {}),
+        'params': training_stats.get('params'),
+        'sampling': training_stats.get('sampling')
+    }
+    if entry['mode'] == 'delta':
+        entry['new_trees'] = training_stats.get('new_trees')
+        entry['total_trees'] = training_stats.get('total_trees')
+    append_training_history(entry)
+    return training_stats
+
+def save_tuning_results(job, results, filepath):
+    """Tuning job completion: keep the report so the chosen params can be reused"""
+    save_json_file(TUNING_RESULTS_FILE, dict(results, job_id=job.id, filepath=filepath,
+                                             timestamp=datetime.now().isoformat()))
+    return results
+
+def sampling_options(data):
+    """Negative downsampling keywords for a full training run (None = keep every row)"""
+    value = data.get('negative_rate')
+    if value is None:
+        negative_rate = TRAIN_NEGATIVE_RATE
+    else:
+        # An explicit 0 is an error, not a request for the default rate
+        try:
+            if isinstance(value, bool):
+                raise TypeError
+            negative_rate = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'negative_rate must be a number, got {value!r}')
+    if not 0 < negative_rate <= 1:
+        raise ValueError(f'negative_rate must be in (0, 1], got {negative_rate}')
+    if negative_rate == 1:
+        return None
+    sampling = {'negative_rate': negative_rate}
+    if data.get('strata'):
+        if not isinstance(data['strata'], list):
+            raise ValueError('strata must be a list of column names')
+        sampling['strata'] = [str(col) for col in data['strata']]
+    return sampling
+
+def tuning_options(data):
+    """search_hyperparameters keywords from a mode=tune request body"""
+    options = {'workers': TUNING_WORKERS or None}
+    for key, cast in (('n_candidates', int), ('eta', int), ('min_rows', int),
+                      ('min_rows_per_second', float), ('workers', int), ('seed', int)):
+        if data.get(key) is not None:
+            options[key] = cast(data[key])
+    if data.get('metric'):
+        options['metric'] = str(data['metric'])
+    return options
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -404,6 +843,11 @@ def health():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint (text exposition format)"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/sample-data', methods=['GET'])
 def get_sample_data():
     """Generate and return sample data"""
@@ -438,17 +882,18 @@ def get_sample_data():
 def generate_case_sample():
     """Generate a synthetic case using the trained model"""
     try:
-        if not is_model_trained():
+        payload = request.get_json(silent=True) or {}
+        model = resolve_model(payload.get('model'))
+        if not is_model_trained(model):
             return jsonify({'success': False, 'error': 'Model not trained yet. Train the model before generating sample cases.'}), 400
 
-        payload = request.get_json(silent=True) or {}
         sample_size = int(payload.get('sample_size', 200))
         sample_size = max(10, min(sample_size, 1000))
         random_state = payload.get('random_state')
         preferred_risk = (payload.get('risk_level') or '').strip().lower()
 
         df = processor.generate_sample_data(sample_size, random_state)
-        predictions = fraud_model.predict(df)
+        predictions = model.predict(df)
 
         if predictions.empty:
             return jsonify({'success': False, 'error': 'Unable to generate sample predictions.'}), 400
@@ -516,30 +961,16 @@ def validate_csv():
         if not allowed_file(file.filename):
             return jsonify({'success': False, 'error': 'Only CSV files allowed'}), 400
         
-        # Read file content
-        content = file.read()
-        
-        # Check if file is empty
-        if len(content) == 0:
-            return jsonify({'success': False, 'error': 'File is empty'}), 400
+        filename = secure_filename(file.filename or 'uploaded_file.csv')
+        filepath = os.path.join(UPLOAD_FOLDER, filename)
         
-        # Decode content
+        # Spool to disk block by block; only a bounded sample is parsed
         try:
-            decoded_content = content.decode('utf-8')
-        except UnicodeDecodeError:
-            return jsonify({'success': False, 'error': 'File encoding not supported. Please use UTF-8 encoded CSV files.'}), 400
-        
-        validation_result = processor.validate_csv(decoded_content)
+            validation_result = spool_csv(file.stream, filepath, sample_rows=VALIDATE_SAMPLE_ROWS)
+        except CsvUploadError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         if validation_result['success']:
-            # Save file
-            filename = secure_filename(file.filename or 'uploaded_file.csv')
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            
-            # Write file to disk
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(decoded_content)
-            
             validation_result['filepath'] = filepath
         
         return jsonify(validation_result)
@@ -550,7 +981,13 @@ def validate_csv():
 
 @app.route('/api/train', methods=['POST'])
 def train_model():
-    """Train fraud detection model"""
+    """Start a background training job (pass wait=true to block until it finishes).
+
+    ``mode: "incremental"`` warm-starts a copy of the live model on the file
+    instead of retraining from scratch, and is recorded as a delta run.
+    ``mode: "tune"`` runs a hyperparameter search and leaves the live model
+    alone; its ``params`` can be sent back with a full run.
+    """
     try:
         data = request.get_json() if request.is_json else {}
         filepath = data.get('filepath') if isinstance(data, dict) else None
@@ -559,42 +996,233 @@ def train_model():
         if not filepath or not os.path.exists(filepath):
             return jsonify({'success': False, 'error': 'Invalid filepath'}), 400
         
-        # Load data
-        df = pd.read_csv(filepath)
+        mode = data.get('mode') or 'full'
+        if mode == 'tune':
+            job = job_manager.submit(
+                'train', tune_hyperparameters_job, filepath, fraud_column, tuning_options(data), feature_cache,
+                process=True,
+                on_result=lambda job, results: save_tuning_results(job, results, filepath)
+            )
+            if not is_truthy(data.get('wait')):
+                return jsonify({'success': True, 'job_id': job.id, 'job': job.to_dict()}), 202
+            job.wait()
+            if job.status != 'completed':
+                return jsonify({'success': False, 'job_id': job.id, 'error': job.error or f'Tuning {job.status}'}), 400
+            return jsonify({'success': True, 'job_id': job.id, 'tuning': job.result})
+        
+        incremental = mode == 'incremental'
+        base_model = model_registry.active.model
+        if incremental and not is_model_trained(base_model):
+            return jsonify({'success': False, 'error': 'Incremental training needs a trained model'}), 400
         
-        print(f"Training with {len(df)} samples...")
-        training_stats = fraud_model.train(df, fraud_column)
-
-        # Save model
-        fraud_model.save('models')
-
-        training_entry = {
-            'id': datetime.now().strftime('%Y%m%d%H%M%S'),
-            'timestamp': datetime.now().isoformat(),
-            'samples_trained': training_stats.get('samples_trained'),
-            'fraud_ratio': training_stats.get('fraud_ratio'),
-            'rf_score': training_stats.get('rf_score'),
-            'xgb_score': training_stats.get('xgb_score'),
-            'filepath': filepath,
-            'feature_importance': training_stats.get('feature_importance', {})
-        }
-        append_training_history(training_entry)
-
+        # The job trains in its own process; the live model is swapped only on success
+        staging_path = os.path.join(MODEL_STAGING_FOLDER, uuid.uuid4().hex[:12])
+        if incremental:
+            new_trees = max(1, int(data.get('new_trees') or INCREMENTAL_NEW_TREES))
+            task = (train_incremental_bundle, base_model, filepath, fraud_column, staging_path, new_trees, feature_cache)
+        else:
+            task = (train_model_bundle, filepath, fraud_column, staging_path,
+                    validate_params(data.get('params')), sampling_options(data), feature_cache)
+        job = job_manager.submit(
+            'train', *task,
+            process=True,
+            on_result=lambda job, stats: install_trained_model(job, stats, filepath, staging_path),
+            cleanup=lambda: shutil.rmtree(staging_path, ignore_errors=True)
+        )
+        
+        if not is_truthy(data.get('wait')):
+            return jsonify({'success': True, 'job_id': job.id, 'job': job.to_dict()}), 202
+        
+        job.wait()
+        if job.status != 'completed':
+            return jsonify({'success': False, 'job_id': job.id, 'error': job.error or f'Training {job.status}'}), 400
         return jsonify({
             'success': True,
             'message': 'Model trained successfully',
-            'stats': training_stats
+            'job_id': job.id,
+            'stats': job.result
         })
     
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """List recent background jobs (without their results)"""
+    jobs = job_manager.list(request.args.get('kind'))
+    return jsonify({'success': True, 'jobs': [job.to_dict(include_result=False) for job in jobs]})
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Poll a job's status, stage and progress; includes the result once completed"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Request cancellation of a queued or running job"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    return jsonify({'success': True, 'job': job.to_dict(include_result=False)})
+
+def run_prediction(model, filepath, options, progress=None):
+    """Score a CSV and build the /api/predict response (used inline and by predict jobs)"""
+    progress = progress or (lambda stage, fraction=None, **details: None)
+    workers = max(1, int(options.get('workers') or PREDICT_WORKERS))
+    result_format = result_format_option(options.get('format'))
+    if should_stream_predictions(options.get('stream')):
+        chunk_size = int(options.get('chunk_size') or PREDICT_CHUNK_ROWS)
+        return run_streaming_prediction(model, filepath, max(1, chunk_size), workers, progress, result_format)
+    
+    # Load data (a file already parsed for training or an earlier prediction comes from the cache)
+    progress('loading', 0.0)
+    df = feature_cache.read_frame(filepath) if feature_cache is not None else pd.read_csv(filepath)
+    
+    print(f"Predicting on {len(df)} transactions...")
+    progress('scoring', 0.1, rows=len(df))
+    if workers > 1 and len(df) > 1:
+        with ScoringPool(model, workers) as pool:
+            results_df = pool.predict(df)
+    else:
+        results_df = model.predict(df)
+    
+    # Calculate statistics
+    # Add required columns if they don't exist
+    required_cols = ['is_fraud_predicted', 'is_anomaly', 'ensemble_fraud_probability', 'risk_level', 'merchant_category']
+    for col in required_cols:
+        if col not in results_df.columns:
+            if col == 'is_fraud_predicted':
+                results_df[col] = 0
+            elif col == 'is_anomaly':
+                results_df[col] = 0
+            elif col == 'ensemble_fraud_probability':
+                results_df[col] = 0.0
+            elif col == 'risk_level':
+                results_df[col] = 'Low'
+            elif col == 'merchant_category':
+                results_df[col] = 'unknown'
+    
+    progress('aggregating', 0.6)
+    stats = processor.get_statistics(results_df)
+    insights = build_prediction_insights(results_df)
+
+    alert_rules = get_alert_rules()
+    custom_alerts = []
+    watchlist_hits = []
+    thresholds = alert_rules.get('thresholds', {})
+    amount_limit = float(thresholds.get('amount_limit', 0) or 0)
+    critical_threshold = float(thresholds.get('critical_probability', 0.85))
+    high_threshold = float(thresholds.get('high_probability', 0.65))
+    watch_customers = set(str(x) for x in alert_rules.get('watchlist', {}).get('customers', []))
+    watch_merchants = set(str(x) for x in alert_rules.get('watchlist', {}).get('merchants', []))
+
+    for _, row in results_df.iterrows():
+        probability = float(row.get('ensemble_fraud_probability', 0))
+        amount_val = float(row.get('amount', 0))
+        customer_id = str(row.get('customer_id', '')).strip()
+        merchant_id = str(row.get('merchant_id', '')).strip()
+        risk_level = row.get('risk_level', 'Low')
+
+        if amount_limit and amount_val >= amount_limit:
+            custom_alerts.append({
+                'type': 'amount',
+                'message': f'Transaction amount ${amount_val:,.2f} exceeds watch threshold',
+                'customer_id': customer_id,
+                'merchant_id': merchant_id,
+                'risk_level': risk_level,
+                'probability': probability
+            })
+
+        if probability >= critical_threshold:
+            custom_alerts.append({
+                'type': 'critical_probability',
+                'message': f'Critical probability ({probability:.2%}) detected',
+                'customer_id': customer_id,
+                'merchant_id': merchant_id,
+                'risk_level': 'Critical',
+                'probability': probability
+            })
+        elif probability >= high_threshold:
+            custom_alerts.append({
+                'type': 'high_probability',
+                'message': f'High probability ({probability:.2%}) detected',
+                'customer_id': customer_id,
+                'merchant_id': merchant_id,
+                'risk_level': 'High',
+                'probability': probability
+            })
+
+        watch_hit = False
+        if customer_id and customer_id in watch_customers:
+            watch_hit = True
+        if merchant_id and merchant_id in watch_merchants:
+            watch_hit = True
+        if watch_hit:
+            watchlist_hits.append({
+                'customer_id': customer_id,
+                'merchant_id': merchant_id,
+                'amount': amount_val,
+                'risk_level': risk_level,
+                'probability': probability
+            })
+
+    alert_summary = summarize_alerts(custom_alerts, watchlist_hits)
+
+    # Save results
+    progress('saving', 0.8)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    results_filepath = os.path.join(UPLOAD_FOLDER, f'predictions_{timestamp}.csv')
+    results_df.to_csv(results_filepath, index=False)
+    compress_results(results_filepath)
+    run_id = store_results(results_df, filepath, results_filepath)
+    
+    # Pre-aggregate heatmap data (date -> fraud counts) to support full date range
+    heatmap_data = []
+    if 'timestamp' in results_df.columns:
+        try:
+            temp_df = results_df.copy()
+            temp_df['timestamp'] = pd.to_datetime(temp_df['timestamp'], errors='coerce')
+            temp_df['date'] = temp_df['timestamp'].dt.date.astype(str)
+            prob_col = 'ensemble_fraud_probability' if 'ensemble_fraud_probability' in temp_df.columns else 'fraud_probability'
+            if prob_col in temp_df.columns:
+                temp_df['is_fraud_flag'] = temp_df[prob_col] > 0.5
+            else:
+                temp_df['is_fraud_flag'] = False
+            grouped = temp_df.groupby('date').agg(
+                count=('date', 'size'),
+                fraud_count=('is_fraud_flag', 'sum'),
+                total_amount=('amount', 'sum') if 'amount' in temp_df.columns else ('date', 'size')
+            ).reset_index()
+            heatmap_data = grouped.to_dict(orient='records')
+        except Exception as e:
+            print(f"Heatmap aggregation error: {e}")
+    
+    return {
+        'success': True,
+        'run_id': run_id,
+        'statistics': stats,
+        'insights': insights,
+        # Only the returned rows are converted for JSON
+        'results': rows_for_json(results_df.head(500), result_format),
+        'total_results': len(results_df),
+        'results_file': results_filepath,
+        'alert_rules': alert_rules,
+        'custom_alerts': custom_alerts[:100],
+        'watchlist_hits': watchlist_hits[:100],
+        'alert_summary': alert_summary,
+        'heatmap_data': heatmap_data
+    }
+
 @app.route('/api/predict', methods=['POST'])
 def predict():
     """Predict fraud on new transactions"""
     try:
         # Check if we have a file or filepath
         filepath = None
+        options = {}
         if 'file' in request.files:
             file = request.files['file']
             
@@ -605,166 +1233,165 @@ def predict():
             filename = secure_filename(file.filename or 'prediction_file.csv')
             filepath = os.path.join(UPLOAD_FOLDER, filename)
             file.save(filepath)
+            options = request.form
         elif request.is_json:
             data = request.get_json()
             filepath = data.get('filepath') if isinstance(data, dict) else None
+            options = data if isinstance(data, dict) else {}
             
             if not filepath or not os.path.exists(filepath):
                 return jsonify({'success': False, 'error': 'Invalid filepath'}), 400
         else:
             return jsonify({'success': False, 'error': 'No file or filepath provided'}), 400
         
-        # Load data
-        df = pd.read_csv(filepath)
-        
-        print(f"Predicting on {len(df)} transactions...")
-        results_df = fraud_model.predict(df)
-        
-        # Calculate statistics
-        # Add required columns if they don't exist
-        required_cols = ['is_fraud_predicted', 'is_anomaly', 'ensemble_fraud_probability', 'risk_level', 'merchant_category']
-        for col in required_cols:
-            if col not in results_df.columns:
-                if col == 'is_fraud_predicted':
-                    results_df[col] = 0
-                elif col == 'is_anomaly':
-                    results_df[col] = 0
-                elif col == 'ensemble_fraud_probability':
-                    results_df[col] = 0.0
-                elif col == 'risk_level':
-                    results_df[col] = 'Low'
-                elif col == 'merchant_category':
-                    results_df[col] = 'unknown'
+        # Resolved once here: an async job keeps this snapshot even if another is activated
+        model = resolve_model(options.get('model'))
+        if options.get('response') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', ''):
+            if not is_model_trained(model):
+                return jsonify({'success': False, 'error': 'Models not trained yet. Please train the model first.'}), 400
+            # Rejected here so a bad request gets a 400 rather than an error record
+            result_format_option(options.get('format'))
+            options = options.to_dict() if hasattr(options, 'to_dict') else dict(options)
+            return Response(stream_with_context(ndjson_prediction(model, filepath, options)),
+                            mimetype='application/x-ndjson')
+        if is_truthy(options.get('async')):
+            options = options.to_dict() if hasattr(options, 'to_dict') else dict(options)
+            job = job_manager.submit('predict', lambda report: run_prediction(model, filepath, options, report))
+            return jsonify({'success': True, 'job_id': job.id, 'job': job.to_dict()}), 202
         
-        stats = processor.get_statistics(results_df)
-        insights = build_prediction_insights(results_df)
+        return jsonify(run_prediction(model, filepath, options))
+    
+    except Exception as e:
+        print(f"Prediction error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 400
 
-        alert_rules = get_alert_rules()
-        custom_alerts = []
-        watchlist_hits = []
-        thresholds = alert_rules.get('thresholds', {})
-        amount_limit = float(thresholds.get('amount_limit', 0) or 0)
-        critical_threshold = float(thresholds.get('critical_probability', 0.85))
-        high_threshold = float(thresholds.get('high_probability', 0.65))
-        watch_customers = set(str(x) for x in alert_rules.get('watchlist', {}).get('customers', []))
-        watch_merchants = set(str(x) for x in alert_rules.get('watchlist', {}).get('merchants', []))
-
-        for _, row in results_df.iterrows():
-            probability = float(row.get('ensemble_fraud_probability', 0))
-            amount_val = float(row.get('amount', 0))
-            customer_id = str(row.get('customer_id', '')).strip()
-            merchant_id = str(row.get('merchant_id', '')).strip()
-            risk_level = row.get('risk_level', 'Low')
-
-            if amount_limit and amount_val >= amount_limit:
-                custom_alerts.append({
-                    'type': 'amount',
-                    'message': f'Transaction amount ${amount_val:,.2f} exceeds watch threshold',
-                    'customer_id': customer_id,
-                    'merchant_id': merchant_id,
-                    'risk_level': risk_level,
-                    'probability': probability
-                })
-
-            if probability >= critical_threshold:
-                custom_alerts.append({
-                    'type': 'critical_probability',
-                    'message': f'Critical probability ({probability:.2%}) detected',
-                    'customer_id': customer_id,
-                    'merchant_id': merchant_id,
-                    'risk_level': 'Critical',
-                    'probability': probability
-                })
-            elif probability >= high_threshold:
-                custom_alerts.append({
-                    'type': 'high_probability',
-                    'message': f'High probability ({probability:.2%}) detected',
-                    'customer_id': customer_id,
-                    'merchant_id': merchant_id,
-                    'risk_level': 'High',
-                    'probability': probability
-                })
-
-            watch_hit = False
-            if customer_id and customer_id in watch_customers:
-                watch_hit = True
-            if merchant_id and merchant_id in watch_merchants:
-                watch_hit = True
-            if watch_hit:
-                watchlist_hits.append({
-                    'customer_id': customer_id,
-                    'merchant_id': merchant_id,
-                    'amount': amount_val,
-                    'risk_level': risk_level,
-                    'probability': probability
-                })
-
-        alert_summary = summarize_alerts(custom_alerts, watchlist_hits)
-
-        # Prepare response
-        results_for_json = results_df.copy()
-        
-        # Convert to JSON-serializable format
-        for col in results_for_json.columns:
-            if results_for_json[col].dtype == 'object':
-                try:
-                    results_for_json[col] = results_for_json[col].astype(str)
-                except:
-                    pass
-        
-        # Save results
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        results_filepath = os.path.join(UPLOAD_FOLDER, f'predictions_{timestamp}.csv')
-        results_df.to_csv(results_filepath, index=False)
+@app.route('/api/score', methods=['POST'])
+def score_transactions():
+    """Score one transaction (or a small list) from JSON without a CSV round-trip.
+
+    A ``model`` query argument scores against that saved model instead of the active one.
+    """
+    try:
+        model = resolve_model(request.args.get('model'))
+        if not is_model_trained(model):
+            return jsonify({'success': False, 'error': 'Model not trained yet'}), 400
         
-        # Pre-aggregate heatmap data (date -> fraud counts) to support full date range
-        heatmap_data = []
-        if 'timestamp' in results_df.columns:
-            try:
-                temp_df = results_df.copy()
-                temp_df['timestamp'] = pd.to_datetime(temp_df['timestamp'], errors='coerce')
-                temp_df['date'] = temp_df['timestamp'].dt.date.astype(str)
-                prob_col = 'ensemble_fraud_probability' if 'ensemble_fraud_probability' in temp_df.columns else 'fraud_probability'
-                if prob_col in temp_df.columns:
-                    temp_df['is_fraud_flag'] = temp_df[prob_col] > 0.5
-                else:
-                    temp_df['is_fraud_flag'] = False
-                grouped = temp_df.groupby('date').agg(
-                    count=('date', 'size'),
-                    fraud_count=('is_fraud_flag', 'sum'),
-                    total_amount=('amount', 'sum') if 'amount' in temp_df.columns else ('date', 'size')
-                ).reset_index()
-                heatmap_data = grouped.to_dict(orient='records')
-            except Exception as e:
-                print(f"Heatmap aggregation error: {e}")
+        data = request.get_json(silent=True)
+        single = isinstance(data, dict) and 'transactions' not in data
+        transactions = [data] if single else (data.get('transactions') if isinstance(data, dict) else data)
+        if not isinstance(transactions, list) or not transactions:
+            return jsonify({'success': False, 'error': 'Provide a transaction object or a transactions list'}), 400
+        if len(transactions) > MAX_SCORE_TRANSACTIONS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_SCORE_TRANSACTIONS} transactions per request; use /api/predict for batches'
+            }), 400
+        if not all(isinstance(txn, dict) for txn in transactions):
+            return jsonify({'success': False, 'error': 'Each transaction must be a JSON object'}), 400
         
-        return jsonify({
+        started = time.perf_counter()
+        if score_batcher is not None:
+            results = score_batcher.score(transactions, model)
+        else:
+            results = model.score_transactions(transactions)
+        response = {
             'success': True,
-            'statistics': stats,
-            'insights': insights,
-            'results': results_for_json.head(500).to_dict(orient='records'),
-            'total_results': len(results_df),
-            'results_file': results_filepath,
-            'alert_rules': alert_rules,
-            'custom_alerts': custom_alerts[:100],
-            'watchlist_hits': watchlist_hits[:100],
-            'alert_summary': alert_summary,
-            'heatmap_data': heatmap_data
-        })
+            'results': results,
+            'count': len(results),
+            'latency_ms': round((time.perf_counter() - started) * 1000, 3)
+        }
+        if single:
+            response['result'] = results[0]
+        return jsonify(response)
     
     except Exception as e:
-        print(f"Prediction error: {str(e)}")
+        print(f"Scoring error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/score/stats', methods=['GET'])
+def score_stats():
+    """Report micro-batching queue depth and batch sizes for /api/score"""
+    if score_batcher is None:
+        return jsonify({'success': True, 'micro_batching': False})
+    return jsonify({'success': True, 'micro_batching': True, **score_batcher.stats()})
+
+@app.route('/api/results', methods=['GET'])
+def list_results():
+    """Stored prediction runs, newest first, each with a pending/complete/failed ``status``"""
+    if results_store is None:
+        return jsonify({'success': True, 'runs': []})
+    return jsonify({'success': True, 'runs': results_store.runs()})
+
+@app.route('/api/results/<run_id>', methods=['GET'])
+def get_results(run_id):
+    """Filtered, sorted, cursor-paginated rows of a stored prediction run.
+
+    Query parameters: any of EQUALITY_FILTERS (comma-separated values match
+    any), RANGE_FILTERS bounds, ``sort``/``order``, ``limit``, ``cursor``
+    (the previous page's ``next_cursor``), ``count=true`` for the total
+    number of matching rows and ``format=columnar`` for the compact format.
+    """
+    try:
+        if results_store is None:
+            return jsonify({'success': False, 'error': 'Results store is disabled'}), 404
+        args = request.args
+        result_format = result_format_option(args.get('format'))
+        filters = {name: args[name].split(',') for name in EQUALITY_FILTERS if args.get(name)}
+        filters.update({name: args[name] for name in RANGE_FILTERS if args.get(name)})
+        order = args.get('order')
+        if order not in (None, 'asc', 'desc'):
+            raise ValueError(f'Invalid order: {order}')
+        page = results_store.query(
+            secure_filename(run_id), filters,
+            sort=args.get('sort'),
+            descending=None if order is None else order == 'desc',
+            limit=min(int(args.get('limit', 100)), RESULTS_PAGE_MAX),
+            cursor=args.get('cursor'),
+            count=is_truthy(args.get('count', False))
+        )
+        if page is None:
+            return jsonify({'success': False, 'error': 'Run not found'}), 404
+        if result_format == 'columnar':
+            page['results'] = columns_for_json(pd.DataFrame(page['results'], columns=['_row'] + page['run']['columns']))
+        return jsonify({'success': True, **page})
+    except ResultsNotReady as e:
+        # 409 until the background write finishes; /api/results shows the status
+        return jsonify({'success': False, 'error': str(e), 'run': e.run}), 409
+    except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/api/download-results/<filename>', methods=['GET'])
 def download_results(filename):
-    """Download prediction results"""
+    """Download prediction results.
+
+    Served from the copies compressed at write time: with ``Content-Encoding``
+    when the client's Accept-Encoding allows it, or as a ``.gz``/``.zst``
+    file with ``?compression=gzip|zstd``. Range requests resume partial
+    downloads and ETag/If-None-Match revalidation answers 304.
+    """
     try:
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        if not os.path.exists(filepath):
+        filepath = os.path.join(UPLOAD_FOLDER, secure_filename(filename))
+        if not os.path.isfile(filepath):
             return jsonify({'error': 'File not found'}), 404
         
-        return send_file(filepath, as_attachment=True)
+        variants = compressed_variants(filepath)
+        compression = request.args.get('compression')
+        if compression:
+            if compression not in ENCODINGS:
+                return jsonify({'error': f'Unknown compression: {compression}'}), 400
+            if compression not in variants:
+                return jsonify({'error': f'No {compression} copy of {filename} (yet)'}), 404
+            suffix, mimetype = ENCODINGS[compression]
+            return send_file(variants[compression], mimetype=mimetype, as_attachment=True,
+                             download_name=os.path.basename(filepath) + suffix, conditional=True)
+        
+        encoding = negotiate(variants, request.accept_encodings)
+        response = send_file(variants.get(encoding, filepath), mimetype='text/csv', as_attachment=True,
+                             download_name=os.path.basename(filepath), conditional=True)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
@@ -773,20 +1400,26 @@ def save_model():
     """Save trained models to a named version"""
     try:
         data = request.get_json() if request.is_json else {}
-        name = (data or {}).get('name')
+        name = model_name((data or {}).get('name'))
         if not name:
             return jsonify({'success': False, 'error': 'Model name is required'}), 400
-        path = os.path.join('models', secure_filename(str(name)))
-        fraud_model.save(path)
+        if name == DEFAULT_MODEL_NAME:
+            return jsonify({'success': False, 'error': f'"{DEFAULT_MODEL_NAME}" is reserved for the trained model'}), 400
+        path = model_path(name)
+        model_registry.active.model.save(path)
+        # A resident copy of an older save under this name is now stale; reload on next use
+        model_registry.discard(name)
         return jsonify({'success': True, 'message': f'Models saved to {path}'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
 @app.route('/api/model-info', methods=['GET'])
 def model_info():
-    """Get model information"""
+    """Get model information (the active model, or ?model=<name>)"""
     try:
-        if fraud_model.feature_names is None:
+        name = model_name(request.args.get('model'))
+        snapshot = model_registry.get(name) if name else model_registry.active
+        if snapshot.model.feature_names is None:
             return jsonify({
                 'trained': False,
                 'message': 'Model not trained yet'
@@ -794,8 +1427,10 @@ def model_info():
         
         return jsonify({
             'trained': True,
-            'features': fraud_model.feature_names,
-            'num_features': len(fraud_model.feature_names),
+            'name': snapshot.name,
+            'version': snapshot.version,
+            'features': snapshot.model.feature_names,
+            'num_features': len(snapshot.model.feature_names),
             'model_type': 'Ensemble (Random Forest + XGBoost + Isolation Forest)'
         })
     except Exception as e:
@@ -803,22 +1438,60 @@ def model_info():
 
 @app.route('/api/load-model', methods=['POST'])
 def load_model():
-    """Load previously saved models from disk"""
+    """Load a saved model from disk and make it active (``activate: false`` only keeps it resident)"""
     try:
-        data = request.get_json() if request.is_json else {}
-        name = (data or {}).get('name')
-        path = os.path.join('models', name) if name else 'models'
-        fraud_model.load(path)
+        data = (request.get_json() if request.is_json else {}) or {}
+        # Always read from disk into a new snapshot, so a rejected bundle leaves the active one in place
+        snapshot = load_snapshot(model_name(data.get('name')))
+        activate = data.get('activate') is None or is_truthy(data.get('activate'))
+        model_registry.put(snapshot, activate=activate)
         return jsonify({
             'success': True,
-            'message': f"Models loaded from {path}",
+            'message': f"Models loaded from {snapshot.path}",
             'trained': True,
-            'features': fraud_model.feature_names or [],
-            'num_features': len(fraud_model.feature_names or [])
+            'active': activate,
+            'model': snapshot.to_dict(),
+            'features': snapshot.model.feature_names or [],
+            'num_features': len(snapshot.model.feature_names or [])
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+@app.route('/api/models', methods=['GET'])
+def list_models():
+    """Saved model names, the resident snapshots and the active one"""
+    saved = sorted(name for name in os.listdir('models') if is_saved_model(os.path.join('models', name)))
+    return jsonify({
+        'success': True,
+        'active': model_registry.active.to_dict(),
+        'resident': [snapshot.to_dict() for snapshot in model_registry.list()],
+        'saved': saved,
+        'registry': model_registry.stats()
+    })
+
+@app.route('/api/feature-store/ingest', methods=['POST'])
+def ingest_feature_store():
+    """Fold a CSV's transactions into a model's feature store (once per file content).
+
+    Prediction never updates the store, so newly seen merchants/customers
+    only reach the aggregates through here or through training. The change
+    is in memory; /api/save-model persists it.
+    """
+    try:
+        data = request.get_json() if request.is_json else {}
+        filepath = data.get('filepath')
+        if not filepath or not os.path.exists(filepath):
+            return jsonify({'success': False, 'error': 'Invalid filepath'}), 400
+        model = resolve_model(data.get('model'))
+        if not is_model_trained(model):
+            return jsonify({'success': False, 'error': 'Model not trained yet'}), 400
+        df = feature_cache.read_frame(filepath) if feature_cache is not None else pd.read_csv(filepath)
+        source = feature_cache.content_hash(filepath) if feature_cache is not None else file_sha256(filepath)
+        ingested = model.ingest_feature_store(df, source)
+        return jsonify({'success': True, 'ingested': ingested, 'rows': len(df) if ingested else 0, 'source': source})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
 @app.route('/api/alert-rules', methods=['GET', 'POST'])
 def alert_rules():
     if request.method == 'GET':
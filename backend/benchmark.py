@@ -0,0 +1,217 @@
+"""Stage-level benchmarks for the training and scoring pipeline.
+
+Generates sample data with a fixed seed at each size, then times every
+stage separately (best of ``--repeat`` runs) and records its peak traced
+memory from an untimed warm-up run. Results are written as JSON; with
+``--baseline`` the run is compared against an earlier results file and
+exits with status 1 if any stage regressed.
+
+    python benchmark.py                              # 1k, 100k and 1M rows
+    python benchmark.py --sizes 1000,100000 --output benchmarks/today.json
+    python benchmark.py --save-baseline              # record benchmarks/baseline.json
+    python benchmark.py --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sklearn
+import xgboost as xgb
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+from data_processor import DataProcessor
+from ml_models import FraudDetectionModel, FEATURE_PIPELINE_VERSION, random_forest_classifier, xgboost_classifier
+
+BENCHMARK_FORMAT = 1
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+DEFAULT_SIZES = [1000, 100000, 1000000]
+# A stage regresses when it is this much slower/larger than the baseline and
+# the difference is above the noise floor
+TIME_TOLERANCE = 0.20
+MEMORY_TOLERANCE = 0.20
+MIN_SECONDS_DELTA = 0.005
+MIN_MB_DELTA = 1.0
+
+
+def measure(setup, run, repeat, max_seconds):
+    """Time ``run(*setup())``: one traced warm-up run for peak memory, then timed runs.
+
+    Timed runs stop early once they add up to ``max_seconds`` (at least one
+    always runs). Returns the last result and the stage measurements.
+    """
+    args = setup()
+    tracemalloc.start()
+    baseline_bytes = tracemalloc.get_traced_memory()[0]
+    run(*args)
+    peak_bytes = tracemalloc.get_traced_memory()[1] - baseline_bytes
+    tracemalloc.stop()
+
+    timings, result = [], None
+    for _ in range(max(1, repeat)):
+        args = setup()
+        start = time.perf_counter()
+        result = run(*args)
+        timings.append(time.perf_counter() - start)
+        if sum(timings) >= max_seconds:
+            break
+    return result, {
+        'seconds': min(timings),
+        'median_seconds': float(np.median(timings)),
+        'runs': len(timings),
+        'peak_mb': peak_bytes / (1024 * 1024)
+    }
+
+
+def benchmark_size(n_rows, seed, repeat, max_seconds):
+    """Run every stage on ``n_rows`` generated rows; returns {stage: measurements}"""
+    # build_prediction_insights lives in the Flask app module
+    from backend_app import build_prediction_insights
+
+    df = DataProcessor.generate_sample_data(n_rows, random_state=seed)
+    results = {}
+
+    def stage(name, setup, run):
+        result, results[name] = measure(setup, run, repeat, max_seconds)
+        stats = results[name]
+        print(f"  {name:<28} {stats['seconds'] * 1000:10.1f} ms  {stats['peak_mb']:8.1f} MB  ({stats['runs']} runs)")
+        return result
+
+    def fresh_model():
+        model = FraudDetectionModel(feature_store_updates=False, parallel_training=False)
+        model.reset_feature_pipeline()
+        return (model,)
+
+    def prepare(model):
+        return model, model.prepare_features(df, update_store=True)
+
+    model, df_processed = stage('prepare_features', fresh_model, prepare)
+    X = stage('extract_feature_matrix', lambda: (), lambda: model.extract_feature_matrix(df_processed))
+    model.scaler, X_scaled = stage(
+        'scaling', lambda: (StandardScaler(),), lambda scaler: (scaler, scaler.fit_transform(X))
+    )
+    y = pd.to_numeric(df_processed['is_fraud'], errors='coerce').fillna(0).values
+    X_train, X_test, y_train, y_test = model.holdout_split(X_scaled, y)
+
+    model.rf_model = stage(
+        'fit_random_forest', lambda: (random_forest_classifier(),),
+        lambda rf: rf.fit(X_train, y_train)
+    )
+    model.xgb_model = stage(
+        'fit_xgboost', lambda: (xgboost_classifier(base_score=model.base_score(y_train)),),
+        lambda booster: booster.fit(X_train, y_train)
+    )
+    model.isolation_forest = stage(
+        'fit_isolation_forest',
+        lambda: (IsolationForest(contamination=max(0.05, min(0.3, float(y.mean()) * 2)), random_state=42, n_jobs=-1),),
+        lambda iso: iso.fit(X_scaled)
+    )
+    stage('predict_random_forest', lambda: (), lambda: model.rf_model.predict_proba(X_test))
+    stage('predict_xgboost', lambda: (), lambda: model.xgb_model.predict_proba(X_test))
+    stage('predict_isolation_forest', lambda: (), lambda: model.isolation_forest.score_samples(X_test))
+
+    model.compile_inference(X_test)
+    results_df = stage('predict_end_to_end', lambda: (), lambda: model.predict(df))
+    stage('get_statistics', lambda: (), lambda: DataProcessor.get_statistics(results_df))
+    stage('build_prediction_insights', lambda: (), lambda: build_prediction_insights(results_df))
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scikit-learn': sklearn.__version__,
+        'xgboost': xgb.__version__,
+        'feature_pipeline_version': FEATURE_PIPELINE_VERSION
+    }
+
+
+def compare(current, baseline, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """List stages that got slower or larger than the baseline beyond tolerance and noise"""
+    regressions = []
+    for size, stages in current['results'].items():
+        for name, stats in stages.items():
+            before = baseline.get('results', {}).get(size, {}).get(name)
+            if before is None:
+                continue
+            for metric, tolerance, floor in (('seconds', time_tolerance, MIN_SECONDS_DELTA),
+                                             ('peak_mb', memory_tolerance, MIN_MB_DELTA)):
+                old, new = before[metric], stats[metric]
+                if new - old > floor and new > old * (1 + tolerance):
+                    regressions.append({
+                        'size': size,
+                        'stage': name,
+                        'metric': metric,
+                        'baseline': old,
+                        'current': new,
+                        'ratio': new / old if old else float('inf')
+                    })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Stage-level benchmarks for ml_models and data_processor')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='comma-separated row counts (default: 1000,100000,1000000)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage (best is reported)')
+    parser.add_argument('--max-stage-seconds', type=float, default=10.0,
+                        help='stop repeating a stage once its timed runs add up to this')
+    parser.add_argument('--output', default=os.path.join(BENCHMARK_DIR, 'results.json'))
+    parser.add_argument('--baseline', help='results file to compare against')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help=f"also write the results to {os.path.join(BENCHMARK_DIR, 'baseline.json')}")
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    warnings.filterwarnings('ignore')
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    report = {
+        'format': BENCHMARK_FORMAT,
+        'created_at': datetime.now().isoformat(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'environment': environment(),
+        'results': {}
+    }
+    for n_rows in sizes:
+        print(f"{n_rows} rows")
+        report['results'][str(n_rows)] = benchmark_size(n_rows, args.seed, args.repeat, args.max_stage_seconds)
+
+    outputs = [args.output] + ([os.path.join(BENCHMARK_DIR, 'baseline.json')] if args.save_baseline else [])
+    for path in outputs:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('environment') != report['environment']:
+            print("Warning: baseline was recorded in a different environment")
+        regressions = compare(report, baseline, args.time_tolerance, args.memory_tolerance)
+        for item in regressions:
+            print(f"REGRESSION {item['size']:>8} rows  {item['stage']:<28} {item['metric']:<8} "
+                  f"{item['baseline']:.4f} -> {item['current']:.4f} ({item['ratio']:.2f}x)")
+        if regressions:
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+COLUMNAR_FORMAT = 1
+MANIFEST_FILENAME = 'columns.json'
+
+
+def write_columns(path, df):
+    """Store ``df`` in ``path`` as one ``.npy`` file per column plus a manifest.
+
+    Numeric, boolean and datetime columns are saved as their raw arrays.
+    Text columns are dictionary-encoded: integer codes plus the distinct
+    values as a fixed-width unicode array, so nothing needs unpickling to
+    read them. Columns holding anything else fall back to a pickle.
+    """
+    os.makedirs(path, exist_ok=True)
+    columns = []
+    for index, name in enumerate(df.columns):
+        series = df[name]
+        spec = {'name': str(name), 'dtype': str(series.dtype), 'file': f'c{index}.npy'}
+        values = series.to_numpy()
+        if values.dtype.kind in 'biufcmM':
+            spec['kind'] = 'array'
+            np.save(os.path.join(path, spec['file']), values)
+        else:
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            uniques = np.asarray(uniques, dtype=object)
+            if all(isinstance(value, str) for value in uniques):
+                spec.update(kind='text', values_file=f'c{index}_values.npy')
+                code_dtype = np.int32 if len(uniques) < np.iinfo(np.int32).max else np.int64
+                np.save(os.path.join(path, spec['file']), codes.astype(code_dtype))
+                np.save(os.path.join(path, spec['values_file']), uniques.astype(str) if len(uniques) else np.array([], dtype='U1'))
+            else:
+                spec.update(kind='pickle', file=f'c{index}.pkl')
+                with open(os.path.join(path, spec['file']), 'wb') as f:
+                    pickle.dump(series, f, protocol=pickle.HIGHEST_PROTOCOL)
+        columns.append(spec)
+    with open(os.path.join(path, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump({'format': COLUMNAR_FORMAT, 'rows': len(df), 'columns': columns}, f)
+
+
+class UnsupportedColumn(ValueError):
+    """A chunk ColumnWriter cannot append (see ColumnWriter)"""
+
+
+class ColumnWriter:
+    """Build the layout of write_columns from a frame read in chunks.
+
+    Numeric, boolean and datetime chunks are appended to raw files that get
+    their ``.npy`` header on ``close``; numeric chunks of different dtypes
+    (an integer column that only has missing values further down) are
+    promoted to a common one, as parsing the file whole would. Text columns
+    share one dictionary across chunks. Columns that would need the pickle
+    fallback, or that change kind between chunks, raise UnsupportedColumn.
+    """
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.columns = None
+        self.rows = 0
+
+    def append(self, df):
+        if self.columns is None:
+            self.columns = [self._start(index, name, df[name]) for index, name in enumerate(df.columns)]
+        elif [column['spec']['name'] for column in self.columns] != [str(name) for name in df.columns]:
+            raise UnsupportedColumn('Chunks have different columns')
+        for column, name in zip(self.columns, df.columns):
+            self._append(column, df[name])
+        self.rows += len(df)
+        return self
+
+    def _start(self, index, name, series):
+        spec = {'name': str(name), 'dtype': str(series.dtype), 'file': f'c{index}.npy'}
+        if series.to_numpy().dtype.kind in 'biufcmM':
+            spec['kind'] = 'array'
+            return {'spec': spec, 'raw': os.path.join(self.path, f'c{index}.raw'), 'parts': [], 'missing': True}
+        spec.update(kind='text', values_file=f'c{index}_values.npy')
+        return {'spec': spec, 'raw': os.path.join(self.path, f'c{index}.raw'), 'parts': [], 'codes': {}}
+
+    def _append(self, column, series):
+        spec = column['spec']
+        values = series.to_numpy()
+        if spec['kind'] == 'array' and values.dtype.kind not in 'biufcmM' and column['missing']:
+            self._to_text(column, series)
+        if spec['kind'] == 'array':
+            first = column['parts'][0][0] if column['parts'] else values.dtype
+            if values.dtype != first and not (values.dtype.kind in 'iuf' and first.kind in 'iuf'):
+                raise UnsupportedColumn(f"Column {spec['name']} changes from {first} to {values.dtype}")
+            column['missing'] = column['missing'] and values.dtype.kind == 'f' and bool(series.isna().all())
+        elif values.dtype.kind in 'biufcmM':
+            # A chunk with nothing but missing values parses as floats
+            if not series.isna().all():
+                raise UnsupportedColumn(f"Column {spec['name']} changes from text to {values.dtype}")
+            values = np.full(len(values), -1, dtype=np.int32)
+        else:
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            if not all(isinstance(value, str) for value in uniques):
+                raise UnsupportedColumn(f"Column {spec['name']} holds values that are not text")
+            known = column['codes']
+            mapping = np.array([known.setdefault(value, len(known)) for value in uniques], dtype=np.int32)
+            values = np.where(codes >= 0, mapping[codes] if len(mapping) else -1, -1).astype(np.int32)
+        column['parts'].append((values.dtype, len(values)))
+        with open(column['raw'], 'ab') as f:
+            np.ascontiguousarray(values).tofile(f)
+
+    def _to_text(self, column, series):
+        """Turn a column that was all missing so far (parsed as floats) into a text column"""
+        spec = column['spec']
+        spec.update(kind='text', dtype=str(series.dtype), values_file=f"{spec['file'][:-4]}_values.npy")
+        column['codes'] = {}
+        with open(column['raw'], 'wb') as f:
+            for index, (_, rows) in enumerate(column['parts']):
+                column['parts'][index] = (np.dtype(np.int32), rows)
+                np.full(rows, -1, dtype=np.int32).tofile(f)
+
+    def close(self):
+        """Write the ``.npy`` files and the manifest; the frame cannot grow afterwards"""
+        if self.columns is None:
+            raise UnsupportedColumn('No chunks were written')
+        for column in self.columns:
+            spec = column['spec']
+            dtypes = {part_dtype for part_dtype, _ in column['parts']}
+            dtype = np.result_type(*dtypes)
+            if spec['kind'] == 'array' and len(dtypes) > 1:
+                spec['dtype'] = str(dtype)
+            if spec['kind'] == 'text':
+                uniques = np.array(list(column['codes']), dtype=str) if column['codes'] else np.array([], dtype='U1')
+                np.save(os.path.join(self.path, spec['values_file']), uniques)
+            with open(column['raw'], 'rb') as raw, open(os.path.join(self.path, spec['file']), 'wb') as out:
+                header = {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': (self.rows,)}
+                np.lib.format.write_array_header_1_0(out, header)
+                for part_dtype, rows in column['parts']:
+                    np.fromfile(raw, dtype=part_dtype, count=rows).astype(dtype, copy=False).tofile(out)
+            os.remove(column['raw'])
+        columns = [column['spec'] for column in self.columns]
+        with open(os.path.join(self.path, MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump({'format': COLUMNAR_FORMAT, 'rows': self.rows, 'columns': columns}, f)
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != COLUMNAR_FORMAT:
+        raise ValueError(f"Columnar format {manifest.get('format')} in {path}, expected {COLUMNAR_FORMAT}")
+    return manifest
+
+
+def _select(manifest, columns):
+    if columns is None:
+        return manifest['columns']
+    wanted = set(columns)
+    return [spec for spec in manifest['columns'] if spec['name'] in wanted]
+
+
+def _open_column(path, spec):
+    """Map (or load) one stored column; slicing the result happens in ``_column``"""
+    file_path = os.path.join(path, spec['file'])
+    if spec['kind'] == 'array':
+        # Copy-on-write mapping: reads come straight from the page cache and
+        # in-place edits to the frame only copy the pages they touch
+        return np.load(file_path, mmap_mode='c').view(np.ndarray)
+    if spec['kind'] == 'text':
+        uniques = np.load(os.path.join(path, spec['values_file'])).astype(object)
+        # Code -1 (missing) picks the trailing NaN
+        return np.load(file_path, mmap_mode='c').view(np.ndarray), np.append(uniques, np.nan)
+    with open(file_path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _column(spec, handle, rows=slice(None)):
+    if spec['kind'] == 'array':
+        return handle[rows]
+    if spec['kind'] == 'text':
+        codes, uniques = handle
+        series = pd.Series(uniques[codes[rows]], copy=False)
+        return series.astype(spec['dtype']) if str(series.dtype) != spec['dtype'] else series
+    return handle.iloc[rows].reset_index(drop=True)
+
+
+def _frame(specs, handles, rows=slice(None)):
+    data = {spec['name']: _column(spec, handle, rows) for spec, handle in zip(specs, handles)}
+    return pd.DataFrame(data, columns=list(data), copy=False)
+
+
+def read_columns(path, columns=None):
+    """Load a stored frame, optionally only the named ``columns`` (unknown names are skipped)"""
+    specs = _select(read_manifest(path), columns)
+    return _frame(specs, [_open_column(path, spec) for spec in specs])
+
+
+def iter_column_chunks(path, chunk_rows, columns=None):
+    """Yield a stored frame in ``chunk_rows``-row pieces, like ``pd.read_csv(chunksize=...)``.
+
+    Every column is mapped before the first chunk, so the files can be
+    deleted (cache eviction) while the chunks are still being read.
+    """
+    manifest = read_manifest(path)
+    specs = _select(manifest, columns)
+    handles = [_open_column(path, spec) for spec in specs]
+    for start in range(0, manifest['rows'], chunk_rows):
+        chunk = _frame(specs, handles, slice(start, start + chunk_rows))
+        chunk.index = pd.RangeIndex(start, start + len(chunk))
+        yield chunk
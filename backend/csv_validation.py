@@ -0,0 +1,185 @@
+import codecs
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+BLOCK_BYTES = 1 << 20
+SAMPLE_ROWS = 10000
+PREVIEW_ROWS = 3
+
+NEWLINE, CARRIAGE_RETURN, QUOTE, DELIMITER = ord('\n'), ord('\r'), ord('"'), ord(',')
+# Bytes that do not make a line non-blank (pandas skips whitespace-only lines)
+BLANK = b' \t\r\n'
+BLANK_BYTES = np.frombuffer(BLANK, dtype=np.uint8)
+# A quote only opens a quoted field right after one of these (or at the start)
+FIELD_START_BYTES = (DELIMITER, NEWLINE, CARRIAGE_RETURN)
+
+
+class CsvUploadError(ValueError):
+    """An upload that cannot be stored (empty or not UTF-8); the request is at fault"""
+
+
+class RecordCounter:
+    """Counts CSV records in a byte stream fed one block at a time.
+
+    Follows the pandas C tokenizer: a quote opens a quoted field only at
+    the start of a field (elsewhere it is literal), ``""`` inside a quoted
+    field is an escaped quote, newlines inside quoted fields do not end a
+    record, ``\r``, ``\n`` and ``\r\n`` all end one, and blank or
+    whitespace-only lines are not records. Blocks without quotes or blank
+    lines (the usual case) are counted with ``bytes.count``; the rest go
+    through a vectorised scan that only walks quotes one by one when a
+    stray quote sits inside an unquoted field.
+    """
+
+    def __init__(self):
+        self.records = 0
+        self.in_quotes = False
+        # Whether the current (unterminated) record has any content yet
+        self.pending = False
+        # The byte before the current block, and whether it closed a quoted field
+        self.last_byte = NEWLINE
+        self.after_close = False
+
+    def feed(self, block):
+        if not block:
+            return
+        if not self.in_quotes and b'"' not in block and self.last_byte != CARRIAGE_RETURN:
+            lines = block.replace(b'\r\n', b'\n') if b'\r' in block else block
+            if (b'\r' not in lines and b'\n\n' not in lines and b'\n ' not in lines and b'\n\t' not in lines
+                    and (self.pending or lines[:1] not in (b'\n', b' ', b'\t'))):
+                newlines = lines.count(b'\n')
+                if newlines:
+                    self.records += newlines
+                    self.pending = bool(lines[lines.rindex(b'\n') + 1:].strip(b' \t'))
+                else:
+                    self.pending = self.pending or bool(lines.strip(b' \t'))
+                self.last_byte, self.after_close = block[-1], False
+                return
+        self._scan(np.frombuffer(block, dtype=np.uint8))
+
+    def _quote_toggles(self, data, quotes):
+        """Which quotes open or close a quoted field (the rest are literal)"""
+        if len(quotes) == 0:
+            return np.zeros(0, dtype=bool)
+        # Assume every quote toggles, then check that each one opening a field
+        # sits at a field start; that holds for well-formed CSV
+        opening = (np.arange(len(quotes)) + self.in_quotes) % 2 == 0
+        previous = np.where(quotes > 0, data[quotes - 1], self.last_byte)
+        adjacent = np.zeros(len(quotes), dtype=bool)
+        adjacent[1:] = quotes[1:] == quotes[:-1] + 1
+        if quotes[0] == 0:
+            adjacent[0] = self.after_close
+        valid = np.isin(previous, FIELD_START_BYTES) | adjacent
+        if valid[opening].all():
+            return np.ones(len(quotes), dtype=bool)
+
+        # Stray quotes inside unquoted fields: walk the quotes one by one
+        toggles = np.zeros(len(quotes), dtype=bool)
+        inside, closed_at = self.in_quotes, (-1 if self.after_close else None)
+        for i, position in enumerate(quotes.tolist()):
+            if inside:
+                inside, closed_at = False, position
+                toggles[i] = True
+            elif previous[i] in FIELD_START_BYTES or closed_at == position - 1:
+                # A quote right after a closing quote is an escaped ("") quote
+                inside = True
+                toggles[i] = True
+        return toggles
+
+    def _scan(self, data):
+        quotes = np.flatnonzero(data == QUOTE)
+        toggles = quotes[self._quote_toggles(data, quotes)]
+        breaks = np.flatnonzero((data == NEWLINE) | (data == CARRIAGE_RETURN))
+        # A line break after an odd number of toggling quotes is inside a quoted field
+        inside = (np.searchsorted(toggles, breaks) + self.in_quotes) % 2 == 1
+        previous = np.where(breaks > 0, data[breaks - 1], self.last_byte)
+        # \r ends a record on its own; the \n of a \r\n pair then adds nothing
+        ends = breaks[~inside & ((data[breaks] == CARRIAGE_RETURN) | (previous != CARRIAGE_RETURN))]
+        if len(ends):
+            nonblank = self._nonblank(data, ends)
+            nonblank[0] |= self.pending
+            self.records += int(np.count_nonzero(nonblank))
+            self.pending = bool(data[ends[-1] + 1:].tobytes().strip(BLANK))
+        else:
+            self.pending = self.pending or bool(data.tobytes().strip(BLANK))
+        self.in_quotes = (len(toggles) + self.in_quotes) % 2 == 1
+        self.last_byte = int(data[-1])
+        self.after_close = bool(len(toggles) and toggles[-1] == len(data) - 1 and not self.in_quotes)
+
+    def _nonblank(self, data, ends):
+        """Whether each record ending at ``ends`` has anything but whitespace"""
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        # Skip the \n of a \r\n pair that ended the record before
+        before = np.where(starts > 0, data[starts - 1], self.last_byte)
+        starts += (data[np.minimum(starts, len(data) - 1)] == NEWLINE) & (before == CARRIAGE_RETURN)
+        nonblank = (ends > starts) & ~np.isin(data[np.minimum(starts, len(data) - 1)], BLANK_BYTES)
+        # Records starting with whitespace (rare) need every byte checked
+        maybe = np.flatnonzero((ends > starts) & ~nonblank)
+        if len(maybe):
+            content = np.concatenate(([0], np.cumsum(~np.isin(data, BLANK_BYTES))))
+            nonblank[maybe] = content[ends[maybe]] > content[starts[maybe]]
+        return nonblank
+
+    def total(self):
+        """Records seen, counting a final record that has no trailing newline"""
+        return self.records + int(self.pending)
+
+
+def spool_csv(stream, filepath, block_bytes=BLOCK_BYTES, sample_rows=SAMPLE_ROWS):
+    """Copy an uploaded CSV to ``filepath`` block by block and describe it.
+
+    Each block is checked as UTF-8 and scanned for records on its way to
+    disk, so memory stays at one block however large the upload is. The
+    header, dtypes and preview come from parsing only the first
+    ``sample_rows`` rows; the row count comes from the byte scan. The file
+    is written next to ``filepath`` and only renamed into place once it
+    validates, so a rejected upload never replaces a good one.
+
+    Raises CsvUploadError for empty or non-UTF-8 uploads; CSV parse errors
+    are reported in the returned ``{'success': False, 'error': ...}``.
+    """
+    counter = RecordCounter()
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    size = 0
+    tmp_path = f'{filepath}.part-{uuid.uuid4().hex[:8]}'
+    try:
+        with open(tmp_path, 'wb') as f:
+            while True:
+                block = stream.read(block_bytes)
+                if not block:
+                    break
+                try:
+                    decoder.decode(block)
+                except UnicodeDecodeError:
+                    raise CsvUploadError('File encoding not supported. Please use UTF-8 encoded CSV files.')
+                counter.feed(block)
+                f.write(block)
+                size += len(block)
+            try:
+                decoder.decode(b'', final=True)
+            except UnicodeDecodeError:
+                raise CsvUploadError('File encoding not supported. Please use UTF-8 encoded CSV files.')
+        if size == 0:
+            raise CsvUploadError('File is empty')
+
+        try:
+            sample = pd.read_csv(tmp_path, nrows=sample_rows)
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+        os.replace(tmp_path, filepath)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {
+        'success': True,
+        'rows': max(counter.total() - 1, 0),
+        'columns': list(sample.columns),
+        'dtypes': sample.dtypes.astype(str).to_dict(),
+        'sample': sample.head(PREVIEW_ROWS).to_dict(orient='records'),
+        'dtype_sample_rows': len(sample),
+        'bytes': size
+    }
@@ -5,6 +5,15 @@ import json
 import uuid
 
 class DataProcessor:
+    AMOUNT_BAND_BINS = [-1, 500, 2000, 5000, 10000, float('inf')]
+    AMOUNT_BAND_LABELS = [
+        'Micro (<₹500)',
+        'Small (₹500-2k)',
+        'Medium (₹2k-5k)',
+        'Large (₹5k-10k)',
+        'Ultra (₹10k+)' 
+    ]
+
     @staticmethod
     def validate_csv(file_content):
         """Validate and parse CSV file"""
@@ -112,17 +121,13 @@ class DataProcessor:
             df_amount['amount'] = pd.to_numeric(df_amount['amount'], errors='coerce').fillna(0)
             df_amount['is_fraud_predicted'] = pd.to_numeric(df_amount['is_fraud_predicted'], errors='coerce').fillna(0)
 
-            bins = [-1, 500, 2000, 5000, 10000, float('inf')]
-            labels = [
-                'Micro (<₹500)',
-                'Small (₹500-2k)',
-                'Medium (₹2k-5k)',
-                'Large (₹5k-10k)',
-                'Ultra (₹10k+)' 
-            ]
-            df_amount['amount_band'] = pd.cut(df_amount['amount'], bins=bins, labels=labels)
+            df_amount['amount_band'] = pd.cut(
+                df_amount['amount'],
+                bins=DataProcessor.AMOUNT_BAND_BINS,
+                labels=DataProcessor.AMOUNT_BAND_LABELS
+            )
 
-            band_group = df_amount.groupby('amount_band')['is_fraud_predicted'].agg(['count', 'sum']).reset_index()
+            band_group = df_amount.groupby('amount_band', observed=False)['is_fraud_predicted'].agg(['count', 'sum']).reset_index()
             band_group['fraud_rate'] = band_group.apply(
                 lambda row: round((row['sum'] / row['count']) * 100, 2) if row['count'] > 0 else 0,
                 axis=1
@@ -0,0 +1,88 @@
+import gzip
+import os
+import shutil
+import threading
+import uuid
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+COPY_BLOCK_BYTES = 1 << 20
+# Content-Encoding -> (file suffix, media type when downloaded as a file), best first
+ENCODINGS = {
+    'zstd': ('.zst', 'application/zstd'),
+    'gzip': ('.gz', 'application/gzip')
+}
+
+
+def supported_encodings():
+    """Encodings this process can produce (zstd needs the optional zstandard package)"""
+    return [encoding for encoding in ENCODINGS if encoding != 'zstd' or zstandard is not None]
+
+
+def _compress(src, dst, encoding):
+    if encoding == 'gzip':
+        # mtime=0 keeps the output identical for identical input
+        with gzip.GzipFile(dst, 'wb', compresslevel=GZIP_LEVEL, mtime=0) as out:
+            shutil.copyfileobj(src, out, COPY_BLOCK_BYTES)
+    else:
+        with open(dst, 'wb') as out:
+            zstandard.ZstdCompressor(level=ZSTD_LEVEL).copy_stream(src, out, read_size=COPY_BLOCK_BYTES)
+
+
+def compress_file(path):
+    """Write ``path.gz`` (and ``path.zst`` when zstandard is installed) beside ``path``.
+
+    Each copy is written under a temporary name and renamed into place,
+    so a download never sees a partial file. Returns the encodings written.
+    """
+    written = []
+    for encoding in supported_encodings():
+        target = path + ENCODINGS[encoding][0]
+        tmp_path = f'{target}.tmp-{uuid.uuid4().hex[:8]}'
+        try:
+            with open(path, 'rb') as src:
+                _compress(src, tmp_path, encoding)
+            os.replace(tmp_path, target)
+            written.append(encoding)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return written
+
+
+def compress_in_background(path):
+    """compress_file on a daemon thread; downloads use the raw file until it is done"""
+    def run():
+        try:
+            compress_file(path)
+        except Exception as e:
+            print(f"Compression error for {path}: {str(e)}")
+
+    thread = threading.Thread(target=run, name=f'compress-{os.path.basename(path)}', daemon=True)
+    thread.start()
+    return thread
+
+
+def compressed_variants(path):
+    """Encoding -> path of each up-to-date compressed copy of ``path``"""
+    source_mtime = os.path.getmtime(path)
+    variants = {}
+    for encoding, (suffix, _) in ENCODINGS.items():
+        candidate = path + suffix
+        # A copy older than the file was made from a previous version of it
+        if os.path.exists(candidate) and os.path.getmtime(candidate) >= source_mtime:
+            variants[encoding] = candidate
+    return variants
+
+
+def negotiate(variants, accept_encodings):
+    """Best available encoding the client accepts (werkzeug ``request.accept_encodings``), or None"""
+    for encoding in ENCODINGS:
+        if encoding in variants and accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+
+class CategoryVocabulary:
+    """Frozen value -> integer code mapping learned at training time.
+
+    Known values map to ``position + offset`` in the sorted vocabulary and
+    every unseen value maps to ``unknown_code`` row by row. New vocabularies
+    reserve code 0 for unknowns; vocabularies converted from a legacy
+    LabelEncoder keep its codes (offset 0) so older models score unchanged.
+    """
+
+    def __init__(self, categories, offset=1, unknown_code=0):
+        self.index = pd.Index(np.asarray(categories, dtype=object))
+        self.offset = int(offset)
+        self.unknown_code = int(unknown_code)
+        self._lookup = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lookup'] = None
+        return state
+
+    @property
+    def classes_(self):
+        return self.index.values
+
+    @classmethod
+    def fit(cls, values):
+        return cls(np.sort(pd.unique(_as_strings(values))))
+
+    @classmethod
+    def from_label_encoder(cls, encoder):
+        return cls([str(value) for value in encoder.classes_], offset=0, unknown_code=0)
+
+    def extend(self, values):
+        """Return a vocabulary with unseen values appended; existing codes are unchanged"""
+        uniques = pd.unique(_as_strings(values))
+        new_values = uniques[self.index.get_indexer(uniques) < 0]
+        if len(new_values) == 0:
+            return self
+        categories = np.concatenate([np.asarray(self.index, dtype=object), np.sort(new_values)])
+        return CategoryVocabulary(categories, self.offset, self.unknown_code)
+
+    def transform(self, values):
+        """Encode a column: factorize once, then look up only the distinct values"""
+        if not isinstance(values, (pd.Series, pd.Index)):
+            values = np.asarray(values, dtype=object)
+        codes, uniques = pd.factorize(values, use_na_sentinel=False)
+        positions = self.index.get_indexer(_as_strings(uniques))
+        return np.where(positions >= 0, positions + self.offset, self.unknown_code)[codes]
+
+    def encode(self, value):
+        """Encode a single value (dict lookup, for per-transaction scoring)"""
+        if self._lookup is None:
+            self._lookup = {value: code + self.offset for code, value in enumerate(self.index)}
+        return self._lookup.get(str(value), self.unknown_code)
+
+
+class HashedCategory:
+    """Stateless encoder for high-cardinality columns: stable hash modulo ``n_buckets``.
+
+    Numeric columns are hashed as float64 so ids read from CSV and JSON agree;
+    anything else is hashed as its string form.
+    """
+
+    def __init__(self, n_buckets=1024):
+        self.n_buckets = int(n_buckets)
+
+    def transform(self, values):
+        values = np.asarray(values)
+        if values.dtype.kind in 'biuf':
+            values = values.astype(np.float64)
+        else:
+            values = _as_strings(values)
+        return (pd.util.hash_array(values) % np.uint64(self.n_buckets)).astype(np.int64)
+
+    def encode(self, value):
+        return int(self.transform(np.array([value]))[0])
+
+
+def _as_strings(values):
+    """String form of a column, as ``Series.astype(str)`` would produce it"""
+    return pd.Series(values, copy=False).astype(str).values.astype(object)
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+
+from columnar import ColumnWriter, UnsupportedColumn, iter_column_chunks, read_columns, write_columns
+
+
+def file_sha256(filepath, block_bytes=1 << 20):
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_bytes), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class FeatureMatrixCache:
+    """Size-bounded, content-addressed cache of ingest results under one folder.
+
+    Parsed uploads are kept as memory-mapped columnar copies (see columnar.py)
+    and engineered training matrices as ``.npy`` files.
+
+    Each entry is a directory named by a key derived from the uploaded
+    file's SHA-256 plus the settings that shaped it. Entries are written
+    to a temporary directory and renamed into place, so readers in other
+    processes (training jobs run in their own) only ever see complete
+    entries. A hit refreshes the entry's mtime; once the folder grows past
+    ``max_bytes`` the least recently used entries are deleted.
+    """
+
+    HASH_CHUNK_BYTES = 1 << 20
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._hashes = {}
+        os.makedirs(root, exist_ok=True)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def content_hash(self, filepath):
+        """SHA-256 of a file, remembered per (path, size, mtime)"""
+        stat = os.stat(filepath)
+        signature = (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._hashes.get(signature)
+        if digest is None:
+            digest = file_sha256(filepath, self.HASH_CHUNK_BYTES)
+            with self._lock:
+                if len(self._hashes) >= 1024:
+                    self._hashes.clear()
+                self._hashes[signature] = digest
+        return digest
+
+    def key(self, filepath, kind, **settings):
+        """Entry key for ``filepath``'s content, the entry kind and its settings"""
+        settings_json = json.dumps(settings, sort_keys=True, default=str)
+        suffix = hashlib.sha256(settings_json.encode('utf-8')).hexdigest()[:16]
+        return f'{kind}-{self.content_hash(filepath)[:32]}-{suffix}'
+
+    def get(self, key):
+        """Directory of a complete entry (marked as just used), or None"""
+        path = os.path.join(self.root, key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    @contextmanager
+    def write(self, key):
+        """Yield a scratch directory that becomes entry ``key`` if the block succeeds"""
+        tmp_path = os.path.join(self.root, f'.tmp-{key}-{uuid.uuid4().hex[:8]}')
+        os.makedirs(tmp_path)
+        try:
+            yield tmp_path
+            path = os.path.join(self.root, key)
+            try:
+                os.replace(tmp_path, path)
+            except OSError:
+                # Another process stored the same entry first; keep theirs
+                pass
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        self.evict(keep=key)
+
+    def store_frame(self, filepath, df):
+        """Record ``df`` (already parsed from ``filepath``) as that file's columnar copy"""
+        with self.write(self.key(filepath, 'columns')) as tmp_path:
+            write_columns(tmp_path, df)
+
+    def read_frame(self, filepath, columns=None):
+        """``pd.read_csv(filepath)``, served from a memory-mapped columnar copy after the first read.
+
+        ``columns`` limits the result to those columns (names the file lacks
+        are skipped); only the selected columns are read from the copy.
+        """
+        path = self.get(self.key(filepath, 'columns'))
+        if path is not None:
+            try:
+                return read_columns(path, columns)
+            except (OSError, ValueError) as e:
+                print(f"Columnar copy of {filepath} unusable, re-parsing: {str(e)}")
+        df = pd.read_csv(filepath)
+        self.store_frame(filepath, df)
+        return df if columns is None else df[[col for col in df.columns if col in set(columns)]]
+
+    def stream_frame(self, filepath, chunk_rows):
+        """``pd.read_csv(filepath, chunksize=chunk_rows)``, recording the chunks as the file's columnar copy.
+
+        The copy becomes an entry once the last chunk has been read; a caller
+        that stops early leaves none behind. A file whose columns the chunked
+        writer cannot store (see ColumnWriter) is still read through, uncached.
+        """
+        chunks = pd.read_csv(filepath, chunksize=chunk_rows)
+        unread = None
+        try:
+            with self.write(self.key(filepath, 'columns')) as tmp_path:
+                writer = ColumnWriter(tmp_path)
+                for unread in chunks:
+                    writer.append(unread)
+                    chunk, unread = unread, None
+                    yield chunk
+                writer.close()
+        except UnsupportedColumn as e:
+            print(f"No columnar copy of {filepath}: {str(e)}")
+            if unread is not None:
+                yield unread
+            yield from chunks
+
+    def frame_chunks(self, filepath, chunk_rows, columns=None):
+        """``chunk_rows``-row frames (of ``columns``) from the columnar copy, or None when there is none yet.
+
+        Streaming callers fall back to ``pd.read_csv(chunksize=...)`` rather
+        than parse a large file whole just to cache it.
+        """
+        path = self.get(self.key(filepath, 'columns'))
+        return iter_column_chunks(path, chunk_rows, columns) if path is not None else None
+
+    def entries(self):
+        """(mtime, bytes, key) for every complete entry, oldest first"""
+        entries = []
+        for key in os.listdir(self.root):
+            path = os.path.join(self.root, key)
+            if key.startswith('.tmp-') or not os.path.isdir(path):
+                continue
+            try:
+                size = sum(
+                    os.path.getsize(os.path.join(folder, name))
+                    for folder, _, names in os.walk(path) for name in names
+                )
+                entries.append((os.path.getmtime(path), size, key))
+            except OSError:
+                continue
+        return sorted(entries)
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the cache fits in ``max_bytes``"""
+        with self._lock:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in entries:
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                # Renamed aside first: an entry still memory-mapped somewhere
+                # (Windows refuses the rename) stays whole instead of half-deleted
+                retired = os.path.join(self.root, f'.tmp-evict-{key}-{uuid.uuid4().hex[:8]}')
+                try:
+                    os.rename(os.path.join(self.root, key), retired)
+                except OSError:
+                    continue
+                shutil.rmtree(retired, ignore_errors=True)
+                total -= size
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'max_bytes': self.max_bytes
+        }
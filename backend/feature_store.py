@@ -0,0 +1,466 @@
+import copy
+import json
+import os
+import threading
+import time
+import numpy as np
+
+FEATURE_STORE_FORMAT = 3
+
+
+def _save_array(path, array):
+    """np.save to a fresh file: stores are saved to a new directory each time
+    (see ml_models save), so a file a loaded store has mapped is never rewritten"""
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} exists; save the feature store to a new directory")
+    np.save(path, array)
+
+
+class HashIndex:
+    """Open-addressing (linear probing) hash table mapping int64 keys to row ids.
+
+    ``keys[row]`` holds the key stored at each row and ``table`` holds row ids
+    (-1 for empty slots). Both are plain arrays, so the index can be saved
+    with ``np.save`` and memory-mapped back without being rebuilt.
+    """
+
+    EMPTY = -1
+    MAX_LOAD = 0.5
+
+    def __init__(self, keys=None, table=None):
+        self.keys = np.empty(0, dtype=np.int64) if keys is None else keys
+        self.table = self._build(self.keys) if table is None else table
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def _slots(keys, mask):
+        # Fibonacci hashing: multiply, then take the high bits
+        hashed = keys.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+        return ((hashed >> np.uint64(32)) & np.uint64(mask)).astype(np.intp)
+
+    def _build(self, keys):
+        capacity = 16
+        while capacity * self.MAX_LOAD < len(keys):
+            capacity *= 2
+        self.table = np.full(capacity, self.EMPTY, dtype=np.int64)
+        self._place(np.arange(len(keys), dtype=np.intp))
+        return self.table
+
+    def _place(self, rows):
+        mask = len(self.table) - 1
+        positions = self._slots(self.keys[rows], mask)
+        while len(rows):
+            free = np.flatnonzero(self.table[positions] == self.EMPTY)
+            # Several new keys may probe the same free slot; the first one wins
+            _, first = np.unique(positions[free], return_index=True)
+            winners = free[first]
+            self.table[positions[winners]] = rows[winners]
+            placed = np.zeros(len(rows), dtype=bool)
+            placed[winners] = True
+            rows = rows[~placed]
+            positions = (positions[~placed] + 1) & mask
+
+    def lookup(self, query):
+        """Return the row id of every query key, -1 for unknown keys"""
+        query = np.asarray(query, dtype=np.int64)
+        result = np.full(len(query), -1, dtype=np.intp)
+        if len(self.keys) == 0:
+            return result
+        mask = len(self.table) - 1
+        active = np.arange(len(query), dtype=np.intp)
+        positions = self._slots(query, mask)
+        while len(active):
+            rows = self.table[positions]
+            empty = rows == self.EMPTY
+            found = ~empty & (self.keys[np.where(empty, 0, rows)] == query[active])
+            result[active[found]] = rows[found]
+            probing = ~(empty | found)
+            active = active[probing]
+            positions = (positions[probing] + 1) & mask
+        return result
+
+    def insert(self, new_keys):
+        """Append keys that are not in the index yet (must be unique)"""
+        start = len(self.keys)
+        self.keys = np.concatenate([self.keys, np.asarray(new_keys, dtype=np.int64)])
+        if len(self.keys) > len(self.table) * self.MAX_LOAD:
+            self._build(self.keys)
+        else:
+            self._place(np.arange(start, len(self.keys), dtype=np.intp))
+
+
+class EntityAggregates:
+    """Running count / mean / M2 of transaction amounts per entity id"""
+
+    ARRAYS = ('count', 'mean', 'm2')
+
+    def __init__(self, index=None, count=None, mean=None, m2=None):
+        self.index = HashIndex() if index is None else index
+        self.count = np.zeros(0) if count is None else count
+        self.mean = np.zeros(0) if mean is None else mean
+        self.m2 = np.zeros(0) if m2 is None else m2
+
+    def __len__(self):
+        return len(self.index)
+
+    def update(self, keys, amounts):
+        """Fold a batch into the running statistics (Chan et al. parallel update)"""
+        keys = np.asarray(keys, dtype=np.int64)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        if len(keys) == 0:
+            return
+        rows = self.index.lookup(keys)
+        missing = rows < 0
+        if missing.any():
+            new_keys = np.unique(keys[missing])
+            self.index.insert(new_keys)
+            grow = np.zeros(len(new_keys))
+            self.count = np.concatenate([self.count, grow])
+            self.mean = np.concatenate([self.mean, grow])
+            self.m2 = np.concatenate([self.m2, grow])
+            rows[missing] = self.index.lookup(keys[missing])
+
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        batch_count = np.bincount(inverse).astype(np.float64)
+        batch_mean = np.bincount(inverse, weights=amounts) / batch_count
+        batch_m2 = np.bincount(inverse, weights=(amounts - batch_mean[inverse]) ** 2)
+
+        old_count = self.count[unique_rows]
+        old_mean = self.mean[unique_rows]
+        total = old_count + batch_count
+        delta = batch_mean - old_mean
+        self.mean[unique_rows] = old_mean + delta * batch_count / total
+        self.m2[unique_rows] = self.m2[unique_rows] + batch_m2 + delta ** 2 * old_count * batch_count / total
+        self.count[unique_rows] = total
+
+    def lookup(self, keys):
+        """Return (count, mean, sample std) per key; unknown keys get 0 / NaN / NaN"""
+        rows = self.index.lookup(np.asarray(keys, dtype=np.int64))
+        if len(self) == 0:
+            unknown = np.full(len(rows), np.nan)
+            return np.zeros(len(rows)), unknown, unknown.copy()
+        known = rows >= 0
+        safe_rows = np.where(known, rows, 0)
+        count = np.where(known, self.count[safe_rows], 0.0)
+        mean = np.where(known, self.mean[safe_rows], np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            std = np.where(count > 1, np.sqrt(self.m2[safe_rows] / (count - 1)), np.nan)
+        return count, mean, std
+
+    def save(self, path, prefix):
+        _save_array(os.path.join(path, f'{prefix}_keys.npy'), self.index.keys)
+        _save_array(os.path.join(path, f'{prefix}_table.npy'), self.index.table)
+        for name in self.ARRAYS:
+            _save_array(os.path.join(path, f'{prefix}_{name}.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, path, prefix, mmap_mode=None):
+        def read(name):
+            return np.load(os.path.join(path, f'{prefix}_{name}.npy'), mmap_mode=mmap_mode)
+        index = HashIndex(read('keys'), read('table'))
+        return cls(index, *(read(name) for name in cls.ARRAYS))
+
+
+class VelocityWindows:
+    """Per-customer transaction count and amount sum over sliding time windows.
+
+    Every customer's events (epoch seconds and amount, in time order) sit in
+    one segment of the flat ``times``/``amounts`` arrays, bounded by
+    ``offsets`` and addressed through a ``HashIndex``. Events older than the
+    widest window before the watermark (the latest event time seen) are
+    dropped, along with customers left without any, so the store holds
+    exactly what the windows need: counts and sums are exact, match a
+    pandas time-based rolling window, and do not depend on how a stream is
+    cut into batches (for rows no older than the watermark). Events more
+    than ``FUTURE_ALLOWANCE`` seconds ahead of the wall clock are stored but
+    do not move the watermark, so one mis-dated row cannot evict everyone.
+    """
+
+    WINDOWS = (('1h', 3600), ('24h', 86400), ('7d', 7 * 86400))
+    ARRAYS = ('times', 'amounts', 'offsets')
+    NO_TIME = np.iinfo(np.int64).min
+    FUTURE_ALLOWANCE = 86400
+
+    def __init__(self, index=None, times=None, amounts=None, offsets=None, watermark=NO_TIME):
+        self.index = HashIndex() if index is None else index
+        self.times = np.zeros(0, dtype=np.int64) if times is None else times
+        self.amounts = np.zeros(0) if amounts is None else amounts
+        self.offsets = np.zeros(1, dtype=np.int64) if offsets is None else offsets
+        self.watermark = int(watermark)
+
+    def __len__(self):
+        return len(self.index)
+
+    @classmethod
+    def feature_names(cls):
+        return [f'velocity_{kind}_{label}' for label, _ in cls.WINDOWS for kind in ('count', 'amount')]
+
+    def _events(self, rows):
+        """Positions in ``times``/``amounts`` of every event of ``rows``, row by row"""
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        ends = np.cumsum(lengths)
+        return np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1] if len(ends) else 0)
+
+    def transform(self, customer_ids, timestamps, amounts, update=True):
+        """Return windowed counts/sums per row, optionally folding the rows in.
+
+        ``timestamps`` are epoch seconds; rows with ``NO_TIME`` get NaN features
+        and are not stored.
+        """
+        keys = np.asarray(customer_ids, dtype=np.int64)
+        times = np.asarray(timestamps, dtype=np.int64)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        features = {name: np.full(len(keys), np.nan) for name in self.feature_names()}
+        rows_in = np.flatnonzero(times != self.NO_TIME)
+        if len(rows_in) == 0:
+            return features
+
+        # Stored history of every customer in the batch, then the batch itself
+        group_keys, batch_group = np.unique(keys[rows_in], return_inverse=True)
+        stored_rows = self.index.lookup(group_keys)
+        stored_groups = np.flatnonzero(stored_rows >= 0)
+        rows = stored_rows[stored_groups]
+        history = self._events(rows)
+        history_lengths = self.offsets[rows + 1] - self.offsets[rows]
+        group = np.concatenate([np.repeat(stored_groups, history_lengths), batch_group])
+        event_time = np.concatenate([self.times[history], times[rows_in]])
+        event_amount = np.concatenate([self.amounts[history], amounts[rows_in]])
+        n_history = len(history)
+
+        order = np.lexsort((np.arange(len(group)), event_time, group))
+        group, event_time, event_amount = group[order], event_time[order], event_amount[order]
+        position = np.arange(len(order))
+        amount_sums = np.concatenate([[0.0], np.cumsum(event_amount)])
+
+        # One sorted int64 key per event: customer-major, then time
+        widest = self.WINDOWS[-1][1]
+        base = event_time.min() - widest
+        sort_key = group * (event_time.max() - base + 1) + (event_time - base)
+        is_batch = order >= n_history
+        batch_position = position[is_batch]
+        target = rows_in[order[is_batch] - n_history]
+        for label, seconds in self.WINDOWS:
+            start = np.searchsorted(sort_key, sort_key[batch_position] - seconds, side='right')
+            features[f'velocity_count_{label}'][target] = batch_position + 1 - start
+            features[f'velocity_amount_{label}'][target] = amount_sums[batch_position + 1] - amount_sums[start]
+
+        if update:
+            plausible = times[rows_in][times[rows_in] <= self.horizon()]
+            if len(plausible):
+                self.watermark = max(self.watermark, int(plausible.max()))
+            self._store(group_keys, stored_rows, group, event_time, event_amount)
+        return features
+
+    def _store(self, group_keys, stored_rows, group, event_time, event_amount):
+        """Rebuild the segments: the batch's customers get their merged, sorted
+        events, everyone else keeps theirs, then out-of-window events go"""
+        n_rows = len(self.index)
+        untouched = np.ones(n_rows, dtype=bool)
+        untouched[stored_rows[stored_rows >= 0]] = False
+        untouched = np.flatnonzero(untouched)
+        kept = self._events(untouched)
+        row_keys = np.concatenate([self.index.keys[untouched], group_keys])
+        lengths = np.concatenate([self.offsets[untouched + 1] - self.offsets[untouched],
+                                  np.bincount(group, minlength=len(group_keys))])
+        times = np.concatenate([self.times[kept], event_time])
+        amounts = np.concatenate([self.amounts[kept], event_amount])
+
+        if self.watermark != self.NO_TIME:
+            live_events = times > self.watermark - self.WINDOWS[-1][1]
+            if not live_events.all():
+                row_of_event = np.repeat(np.arange(len(row_keys)), lengths)
+                lengths = np.bincount(row_of_event[live_events], minlength=len(row_keys))
+                times, amounts = times[live_events], amounts[live_events]
+                live_rows = lengths > 0
+                row_keys, lengths = row_keys[live_rows], lengths[live_rows]
+
+        self.index = HashIndex(row_keys)
+        self.times, self.amounts = times, amounts
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+    def segments(self, keys):
+        """(keys, times, amounts, lengths) of the stored customers among ``keys``"""
+        rows = self.index.lookup(keys)
+        rows = rows[rows >= 0]
+        events = self._events(rows)
+        return self.index.keys[rows], self.times[events], self.amounts[events], self.offsets[rows + 1] - self.offsets[rows]
+
+    def add_segments(self, keys, times, amounts, lengths):
+        """Append customers that are not stored yet, with their (time-ordered) events"""
+        if len(keys) == 0:
+            return
+        self.index.insert(keys)
+        self.times = np.concatenate([self.times, times])
+        self.amounts = np.concatenate([self.amounts, amounts])
+        self.offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(lengths)]).astype(np.int64)
+
+    @classmethod
+    def horizon(cls):
+        """Latest event time (epoch seconds) allowed to advance the watermark"""
+        return int(time.time()) + cls.FUTURE_ALLOWANCE
+
+    def save(self, path, prefix):
+        _save_array(os.path.join(path, f'{prefix}_keys.npy'), self.index.keys)
+        _save_array(os.path.join(path, f'{prefix}_table.npy'), self.index.table)
+        for name in self.ARRAYS:
+            _save_array(os.path.join(path, f'{prefix}_{name}.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, path, prefix, watermark, mmap_mode=None):
+        def read(name):
+            return np.load(os.path.join(path, f'{prefix}_{name}.npy'), mmap_mode=mmap_mode)
+        index = HashIndex(read('keys'), read('table'))
+        # Stores saved before the horizon check may carry a future watermark
+        watermark = min(int(watermark), cls.horizon())
+        return cls(index, *(read(name) for name in cls.ARRAYS), watermark=watermark)
+
+    @classmethod
+    def load_ring_buffers(cls, path, prefix, capacity, watermark):
+        """Convert the fixed-width rows of a format 2 store (at most
+        ``capacity`` events per customer) into segments"""
+        def read(name):
+            return np.load(os.path.join(path, f'{prefix}_{name}.npy'))
+        lengths = read('lengths')
+        filled = np.arange(int(capacity)) < lengths[:, None]
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        watermark = min(int(watermark), cls.horizon())
+        return cls(HashIndex(read('keys'), read('table')), read('times')[filled], read('amounts')[filled],
+                   offsets, watermark=watermark)
+
+
+class VelocityStream:
+    """Velocity features for a file scored chunk by chunk, leaving the store as it is.
+
+    Chunks are folded, in file order, into a private VelocityWindows that
+    copies a customer's stored history the first time the customer shows
+    up, so every row counts the store's events plus the file's earlier
+    rows. For a file in time order that equals ``velocity_features`` of the
+    whole file; the state is the file's events inside the widest window.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.windows = VelocityWindows()
+        self.seeded = HashIndex()
+
+    def transform(self, customer_ids, timestamps, amounts):
+        keys = np.asarray(customer_ids, dtype=np.int64)
+        new_keys = np.unique(keys)
+        new_keys = new_keys[self.seeded.lookup(new_keys) < 0]
+        if len(new_keys):
+            self.seeded.insert(new_keys)
+            with self.store._lock:
+                history = self.store.velocity.segments(new_keys)
+            self.windows.add_segments(*history)
+        return self.windows.transform(keys, timestamps, amounts)
+
+
+class EntityFeatureStore:
+    """Per-merchant and per-customer aggregates built at training time.
+
+    Replaces the per-batch groupby/merge in ``prepare_features`` with O(1)
+    hash lookups per row. Scoring only reads it; rows are folded in by
+    training and by explicit ingests, each recorded in ``sources`` (file
+    content hashes) so the same file is never counted twice.
+    Customer velocity over 1h/24h/7d windows is kept in ``velocity``.
+    """
+
+    def __init__(self, merchants=None, customers=None, velocity=None, sources=None):
+        self.merchants = EntityAggregates() if merchants is None else merchants
+        self.customers = EntityAggregates() if customers is None else customers
+        self.velocity = VelocityWindows() if velocity is None else velocity
+        self.sources = set(sources or ())
+        self._lock = threading.Lock()
+
+    def claim_source(self, source):
+        """Record ``source`` as ingested; False when it already was"""
+        with self._lock:
+            if source in self.sources:
+                return False
+            self.sources.add(source)
+            return True
+
+    def release_source(self, source):
+        """Undo claim_source after a failed ingest"""
+        with self._lock:
+            self.sources.discard(source)
+
+    def __getstate__(self):
+        # Snapshot under the lock so a concurrent transform can't tear the arrays
+        with self._lock:
+            state = copy.deepcopy({key: value for key, value in self.__dict__.items() if key != '_lock'})
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def transform(self, amounts, merchant_ids=None, customer_ids=None, update=True, timestamps=None):
+        """Optionally fold a batch in, then return its per-row aggregate features.
+
+        Windowed velocity features are added when both ``customer_ids`` and
+        ``timestamps`` (epoch seconds) are given.
+        """
+        features = {}
+        with self._lock:
+            if customer_ids is not None and timestamps is not None:
+                features.update(self.velocity.transform(customer_ids, timestamps, amounts, update))
+            if update:
+                if merchant_ids is not None:
+                    self.merchants.update(merchant_ids, amounts)
+                if customer_ids is not None:
+                    self.customers.update(customer_ids, amounts)
+            if merchant_ids is not None:
+                count, mean, std = self.merchants.lookup(merchant_ids)
+                features['merchant_avg_amount'] = mean
+                features['merchant_std_amount'] = std
+                features['merchant_count'] = count
+            if customer_ids is not None:
+                features['transaction_velocity'] = self.customers.lookup(customer_ids)[0]
+        return features
+
+    def velocity_features(self, customer_ids, timestamps, amounts):
+        """Windowed velocity features for a batch without folding it in"""
+        with self._lock:
+            return self.velocity.transform(customer_ids, timestamps, amounts, update=False)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            self.merchants.save(path, 'merchant')
+            self.customers.save(path, 'customer')
+            self.velocity.save(path, 'velocity')
+            meta = {
+                'format': FEATURE_STORE_FORMAT,
+                'merchants': len(self.merchants),
+                'customers': len(self.customers),
+                'velocity_customers': len(self.velocity),
+                'velocity_watermark': self.velocity.watermark,
+                'sources': sorted(self.sources)
+            }
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap_mode='c'):
+        """Load a saved store; ``mmap_mode='c'`` maps the arrays copy-on-write"""
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format') not in (1, 2, FEATURE_STORE_FORMAT):
+            raise ValueError(f"Unsupported feature store format: {meta.get('format')}")
+        velocity = None
+        if meta['format'] == 2:
+            velocity = VelocityWindows.load_ring_buffers(
+                path, 'velocity', meta['velocity_capacity'], meta['velocity_watermark']
+            )
+        elif meta['format'] >= 3:
+            velocity = VelocityWindows.load(path, 'velocity', meta['velocity_watermark'], mmap_mode)
+        return cls(
+            EntityAggregates.load(path, 'merchant', mmap_mode),
+            EntityAggregates.load(path, 'customer', mmap_mode),
+            velocity,
+            meta.get('sources')
+        )
@@ -0,0 +1,343 @@
+import itertools
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+
+from inference_engine import CompiledRandomForest, CompiledXGBoost
+from ml_models import (
+    FraudDetectionModel, RF_PARAMS, XGB_PARAMS, random_forest_classifier, xgboost_classifier
+)
+
+# Grid sampled per member; the current defaults are always one of the candidates
+SEARCH_SPACE = {
+    'random_forest': {
+        'n_estimators': [25, 50, 100, 200],
+        'max_depth': [6, 10, 14, 20],
+        'min_samples_leaf': [1, 2, 5]
+    },
+    'xgboost': {
+        'n_estimators': [25, 50, 100, 200],
+        'max_depth': [3, 5, 7],
+        'learning_rate': [0.05, 0.15, 0.3]
+    }
+}
+DEFAULT_PARAMS = {'random_forest': RF_PARAMS, 'xgboost': XGB_PARAMS}
+# (type, low, high) accepted for each override: ints in [low, high], floats in (low, high]
+PARAM_LIMITS = {
+    'random_forest': {
+        'n_estimators': (int, 1, 1000),
+        'max_depth': (int, 1, 50),
+        'min_samples_split': (int, 2, 10000),
+        'min_samples_leaf': (int, 1, 10000)
+    },
+    'xgboost': {
+        'n_estimators': (int, 1, 1000),
+        'max_depth': (int, 1, 16),
+        'learning_rate': (float, 0.0, 1.0),
+        'subsample': (float, 0.0, 1.0),
+        'colsample_bytree': (float, 0.0, 1.0)
+    }
+}
+METRICS = ('roc_auc', 'accuracy')
+# Scoring throughput is timed over at least this long per candidate
+TIMING_SECONDS = 0.2
+TIMING_ROWS = 8192
+LATENCY_SAMPLES = 50
+
+
+def check_param(member, name, value):
+    """``value`` as the type PARAM_LIMITS gives ``member``'s ``name``, or ValueError if it is out of range"""
+    kind, low, high = PARAM_LIMITS[member][name]
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"params.{member}.{name} must be a number, got {value!r}")
+    if kind is int:
+        if value != int(value):
+            raise ValueError(f"params.{member}.{name} must be a whole number, got {value!r}")
+        value = int(value)
+        if not low <= value <= high:
+            raise ValueError(f"params.{member}.{name} must be between {low} and {high}, got {value}")
+    else:
+        value = float(value)
+        if not low < value <= high:
+            raise ValueError(f"params.{member}.{name} must be in ({low}, {high}], got {value}")
+    return value
+
+
+def validate_params(params):
+    """Check a ``{member: {param: value}}`` override before it reaches a training job.
+
+    Names must be known and values within PARAM_LIMITS; returns the
+    overrides with whole-number floats (``100.0``) cast to int.
+    """
+    if params is None:
+        return None
+    if not isinstance(params, dict):
+        raise ValueError('params must be an object keyed by model')
+    checked = {}
+    for member, overrides in params.items():
+        if member not in DEFAULT_PARAMS:
+            raise ValueError(f"Unknown model in params: {member}")
+        if not isinstance(overrides, dict):
+            raise ValueError(f"params.{member} must be an object")
+        unknown = set(overrides) - set(DEFAULT_PARAMS[member])
+        if unknown:
+            raise ValueError(f"Unsupported {member} params: {', '.join(sorted(unknown))}")
+        checked[member] = {name: check_param(member, name, value) for name, value in overrides.items()}
+    return checked
+
+
+def sample_candidates(space, n_candidates, rng, defaults):
+    """Up to ``n_candidates`` distinct grid points, starting with the defaults"""
+    keys = sorted(space)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+    default = {key: defaults[key] for key in keys}
+    rest = [point for point in grid if point != default]
+    picked = rng.choice(len(rest), size=min(len(rest), max(0, n_candidates - 1)), replace=False)
+    return [default] + [rest[i] for i in sorted(picked)]
+
+
+def stratified_order(y, rng):
+    """Row order whose every prefix keeps the class balance of ``y``"""
+    key = np.empty(len(y))
+    for label in np.unique(y):
+        rows = np.flatnonzero(y == label)
+        rng.shuffle(rows)
+        key[rows] = (np.arange(len(rows)) + 0.5) / len(rows)
+    return np.argsort(key, kind='stable')
+
+
+def rung_rows(n_train, n_candidates, eta, min_rows):
+    """Training rows per rung: the last rung uses everything, each earlier one 1/eta as much"""
+    rungs = 1
+    while eta ** rungs <= n_candidates and n_train / eta ** rungs >= min_rows:
+        rungs += 1
+    return [int(math.ceil(n_train / eta ** (rungs - 1 - i))) for i in range(rungs)]
+
+
+def expected_trials(n_candidates, rungs, eta):
+    """Trials run for one member when exactly ceil(n / eta) survive each rung"""
+    total = 0
+    for _ in rungs:
+        total += n_candidates
+        n_candidates = math.ceil(n_candidates / eta)
+    return total
+
+
+def trial_score(trial, metric):
+    """Ranking score of a trial (accuracy when ROC AUC is undefined)"""
+    score = trial.get(metric)
+    return trial['accuracy'] if score is None else score
+
+
+def _dominates(a, b, metric):
+    score_a, score_b = trial_score(a, metric), trial_score(b, metric)
+    return score_a >= score_b and a['rows_per_second'] >= b['rows_per_second'] and \
+        (score_a > score_b or a['rows_per_second'] > b['rows_per_second'])
+
+
+def pareto_front(trials, metric):
+    """Trials no other trial beats on both score and rows/second, best score first"""
+    front = [t for t in trials if not any(_dominates(other, t, metric) for other in trials)]
+    return sorted(front, key=lambda t: -trial_score(t, metric))
+
+
+def promote(trials, keep, metric):
+    """Survivors of a rung: whole Pareto fronts in order, filled up to ``keep``.
+
+    The first front always survives even when larger than ``keep``, so fast
+    but slightly less accurate configurations reach the full-data rung.
+    """
+    remaining, survivors = list(trials), []
+    while remaining and len(survivors) < keep:
+        front = pareto_front(remaining, metric)
+        if survivors:
+            front = front[:keep - len(survivors)]
+        survivors.extend(front)
+        remaining = [t for t in remaining if t not in front]
+    return survivors
+
+
+def select_trial(front, metric, min_rows_per_second=None):
+    """Best-scoring trial on the front that meets the throughput budget (None if none do)"""
+    eligible = [t for t in front if min_rows_per_second is None or t['rows_per_second'] >= min_rows_per_second]
+    return max(eligible, key=lambda t: trial_score(t, metric)) if eligible else None
+
+
+def _rows_per_second(predict, X):
+    rows, start = 0, time.perf_counter()
+    while True:
+        predict(X)
+        rows += len(X)
+        elapsed = time.perf_counter() - start
+        if elapsed >= TIMING_SECONDS:
+            return rows / elapsed
+
+
+def _row_latency_ms(predict, X):
+    timings = []
+    for i in range(min(LATENCY_SAMPLES, len(X))):
+        row = X[i:i + 1]
+        start = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def _run_trial(data_dir, member, params, n_rows, base_score):
+    """Pool task: fit one candidate on the first ``n_rows`` training rows and measure it.
+
+    The matrices are memory-mapped from ``data_dir``, so every worker shares
+    the one copy written by the search. Each trial is single-threaded;
+    ``rows_per_second`` is batch predict_proba throughput on one core and
+    ``row_latency_ms`` the median single-row latency of the compiled engine
+    used by /api/score.
+    """
+    X_train = np.load(os.path.join(data_dir, 'X_train.npy'), mmap_mode='r')
+    y_train = np.load(os.path.join(data_dir, 'y_train.npy'), mmap_mode='r')
+    X_test = np.load(os.path.join(data_dir, 'X_test.npy'), mmap_mode='r')
+    y_test = np.load(os.path.join(data_dir, 'y_test.npy'))
+
+    if member == 'random_forest':
+        estimator = random_forest_classifier(params, n_jobs=1)
+    else:
+        estimator = xgboost_classifier(params, base_score, n_jobs=1)
+    start = time.perf_counter()
+    estimator.fit(X_train[:n_rows], y_train[:n_rows])
+    fit_seconds = time.perf_counter() - start
+
+    X_timing = np.ascontiguousarray(X_test[:TIMING_ROWS])
+    proba = estimator.predict_proba(X_test)[:, 1]
+    compiled = CompiledRandomForest(estimator) if member == 'random_forest' else CompiledXGBoost(estimator)
+    return {
+        'member': member,
+        'params': params,
+        'rows': int(n_rows),
+        'accuracy': float(estimator.score(X_test, y_test)),
+        'roc_auc': float(roc_auc_score(y_test, proba)) if len(np.unique(y_test)) > 1 else None,
+        'fit_seconds': fit_seconds,
+        'rows_per_second': _rows_per_second(estimator.predict_proba, X_timing),
+        'row_latency_ms': _row_latency_ms(compiled.predict_proba, X_timing)
+    }
+
+
+def search_hyperparameters(source, fraud_label_col='is_fraud', n_candidates=12, eta=3, min_rows=2000,
+                           metric='roc_auc', min_rows_per_second=None, workers=None, seed=42,
+                           space=None, progress=None, cache=None):
+    """Successive-halving search over RandomForest and XGBoost parameters.
+
+    ``source`` is a DataFrame or a CSV path (whose feature matrix may come
+    from ``cache``). Features are built and scaled once; the train/validation matrices are
+    written as .npy files and memory-mapped by a process pool. Each member
+    samples ``n_candidates`` configurations, every rung fits the survivors
+    on ``eta`` times more training rows, and survivors are chosen by Pareto
+    rank on (``metric``, rows/second). Returns every trial, each member's
+    full-data Pareto front and the configuration selected under
+    ``min_rows_per_second`` (``params`` can be passed straight to training).
+    """
+    progress = progress or (lambda stage, fraction=None, **details: None)
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of: {', '.join(METRICS)}")
+    eta = max(2, int(eta))
+    space = space or SEARCH_SPACE
+    rng = np.random.default_rng(seed)
+
+    progress('features', 0.05)
+    started = time.perf_counter()
+    model = FraudDetectionModel()
+    if isinstance(source, pd.DataFrame):
+        X_scaled, y, _ = model.fit_training_matrix(source, fraud_label_col)
+    else:
+        X_scaled, y, _ = model.fit_training_file(source, fraud_label_col, cache=cache)
+    if len(np.unique(y)) < 2:
+        raise ValueError('Hyperparameter search needs both classes in the label column')
+    X_train, X_test, y_train, y_test = model.holdout_split(X_scaled, y)
+    feature_seconds = time.perf_counter() - started
+
+    candidates = {
+        member: sample_candidates(space[member], n_candidates, rng, DEFAULT_PARAMS[member])
+        for member in space
+    }
+    rungs = rung_rows(len(y_train), max(len(c) for c in candidates.values()), eta, min_rows)
+    total_trials = sum(expected_trials(len(c), rungs, eta) for c in candidates.values())
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    base_score = FraudDetectionModel.base_score(y_train)
+
+    data_dir = tempfile.mkdtemp(prefix='hyperparameter-search-')
+    trials = []
+    try:
+        order = stratified_order(np.asarray(y_train), rng)
+        np.save(os.path.join(data_dir, 'X_train.npy'), np.asarray(X_train)[order])
+        np.save(os.path.join(data_dir, 'y_train.npy'), np.asarray(y_train)[order])
+        np.save(os.path.join(data_dir, 'X_test.npy'), np.asarray(X_test))
+        np.save(os.path.join(data_dir, 'y_test.npy'), np.asarray(y_test))
+
+        alive = {member: list(enumerate(c)) for member, c in candidates.items()}
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            for rung, n_rows in enumerate(rungs):
+                pending = {
+                    pool.submit(_run_trial, data_dir, member, params, n_rows, base_score): (member, candidate)
+                    for member, entries in alive.items() for candidate, params in entries
+                }
+                rung_trials = {member: [] for member in alive}
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        member, candidate = pending.pop(future)
+                        trial = future.result()
+                        trial.update({'candidate': candidate, 'rung': rung})
+                        rung_trials[member].append(trial)
+                        trials.append(trial)
+                    progress('tuning', 0.1 + 0.85 * min(1.0, len(trials) / total_trials),
+                             rung=rung, rung_rows=n_rows, trials_done=len(trials))
+                print(f"Rung {rung} ({n_rows} rows): {sum(len(t) for t in rung_trials.values())} trials")
+                if rung < len(rungs) - 1:
+                    for member, member_trials in rung_trials.items():
+                        survivors = promote(member_trials, math.ceil(len(member_trials) / eta), metric)
+                        alive[member] = [(t['candidate'], t['params']) for t in survivors]
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    members = {}
+    for member in candidates:
+        final = [t for t in trials if t['member'] == member and t['rung'] == len(rungs) - 1]
+        front = pareto_front(final, metric)
+        selected = select_trial(front, metric, min_rows_per_second)
+        members[member] = {
+            'trials': sorted((t for t in trials if t['member'] == member), key=lambda t: (t['candidate'], t['rung'])),
+            'pareto_front': front,
+            'selected': selected
+        }
+    return {
+        'mode': 'tune',
+        'metric': metric,
+        'samples': int(len(y)),
+        'train_rows': int(len(y_train)),
+        'validation_rows': int(len(y_test)),
+        'eta': eta,
+        'rung_rows': rungs,
+        'workers': workers,
+        'min_rows_per_second': min_rows_per_second,
+        'feature_seconds': feature_seconds,
+        'search_seconds': time.perf_counter() - started,
+        'members': members,
+        'params': {
+            member: result['selected']['params']
+            for member, result in members.items() if result['selected'] is not None
+        }
+    }
+
+
+def tune_hyperparameters_job(report, filepath, fraud_label_col, options, cache=None):
+    """Job task: run the search on a CSV; ``options`` are search_hyperparameters keywords"""
+    report('loading', 0.0)
+    print(f"Hyperparameter search on {filepath}...")
+    return search_hyperparameters(filepath, fraud_label_col, progress=report, cache=cache, **options)
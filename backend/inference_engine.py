@@ -0,0 +1,328 @@
+import json
+import numpy as np
+
+
+def average_path_length(n_samples):
+    """Average path length of an unsuccessful BST search (isolation tree normaliser)"""
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    result = np.zeros(n_samples.shape)
+    mask_2 = n_samples == 2
+    mask_many = n_samples > 2
+    result[mask_2] = 1.0
+    result[mask_many] = (
+        2.0 * (np.log(n_samples[mask_many] - 1.0) + np.euler_gamma)
+        - 2.0 * (n_samples[mask_many] - 1.0) / n_samples[mask_many]
+    )
+    return result
+
+
+class CompiledTreeEnsemble:
+    """Flat, array-backed node table for a whole tree ensemble.
+
+    Every tree is appended to the same contiguous arrays with sibling nodes
+    stored next to each other, so routing a row is ``left + (x > threshold)``.
+    Leaves point back at themselves with an infinite threshold, which lets a
+    batch be routed level by level for ``max_depth`` steps without masking.
+    """
+
+    ARRAYS = ('feature', 'threshold', 'left', 'value', 'roots', 'default_left')
+
+    def __init__(self, feature, threshold, left, value, roots, max_depth, default_left):
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold)
+        self.left = np.ascontiguousarray(left, dtype=np.intp)
+        self.value = np.ascontiguousarray(value)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.max_depth = int(max_depth)
+        self.default_left = np.ascontiguousarray(default_left, dtype=bool)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def arrays(self):
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    def apply(self, X):
+        """Return the leaf reached in every tree, shape (n_trees, n_samples)"""
+        n_samples, n_features = X.shape
+        x_flat = X.ravel()
+        has_missing = np.isnan(x_flat).any()
+        row_offsets = np.arange(n_samples, dtype=np.intp) * n_features
+        nodes = np.repeat(self.roots[:, None], n_samples, axis=1)
+        for _ in range(self.max_depth):
+            values = x_flat[row_offsets + self.feature[nodes]]
+            go_right = values > self.threshold[nodes]
+            if has_missing:
+                go_right |= np.isnan(values) & ~self.default_left[nodes]
+            nodes = self.left[nodes] + go_right
+        return nodes
+
+    def accumulate(self, X, block_size=1024):
+        """Sum leaf values across trees in tree order, shape (n_samples, n_outputs)"""
+        n_samples = X.shape[0]
+        out = np.zeros((n_samples, self.value.shape[1]), dtype=self.value.dtype)
+        for start in range(0, n_samples, block_size):
+            stop = min(start + block_size, n_samples)
+            leaves = self.apply(X[start:stop])
+            block = out[start:stop]
+            for tree_leaves in leaves:
+                block += self.value[tree_leaves]
+        return out
+
+    @classmethod
+    def from_trees(cls, trees, threshold_dtype):
+        """Concatenate trees given as dicts of per-node arrays.
+
+        Each tree provides ``left``/``right`` child ids (-1 for leaves),
+        ``feature``, ``threshold`` (rows with ``x <= threshold`` go left),
+        ``default_left`` and per-node ``value`` rows. Nodes are renumbered
+        breadth-first so that every right child directly follows its sibling.
+        """
+        features, thresholds, lefts, values, roots, defaults = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for tree in trees:
+            left, right = tree['left'], tree['right']
+            order = [0]
+            depth = [0]
+            first_child = [0]
+            for position, node in enumerate(order):
+                if left[node] != -1:
+                    first_child[position] = len(order)
+                    order.extend([left[node], right[node]])
+                    depth.extend([depth[position] + 1] * 2)
+                    first_child.extend([0, 0])
+            order = np.asarray(order, dtype=np.intp)
+            is_leaf = left[order] == -1
+            first_child = np.where(is_leaf, np.arange(len(order)), first_child)
+            features.append(np.where(is_leaf, 0, tree['feature'][order]))
+            thresholds.append(np.where(is_leaf, np.inf, tree['threshold'][order]).astype(threshold_dtype))
+            lefts.append(first_child + offset)
+            defaults.append(np.where(is_leaf, True, tree['default_left'][order]))
+            values.append(tree['value'][order])
+            roots.append(offset)
+            max_depth = max(max_depth, max(depth))
+            offset += len(order)
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts),
+            np.concatenate(values), roots, max_depth, np.concatenate(defaults)
+        )
+
+    @classmethod
+    def from_sklearn_trees(cls, trees, leaf_values, feature_maps=None):
+        """Concatenate fitted sklearn ``Tree`` objects into one table"""
+        tables = []
+        for tree_idx, tree in enumerate(trees):
+            feature = np.maximum(tree.feature, 0)
+            if feature_maps is not None:
+                feature = np.asarray(feature_maps[tree_idx])[feature]
+            missing_left = getattr(tree, 'missing_go_to_left', None)
+            tables.append({
+                'left': tree.children_left,
+                'right': tree.children_right,
+                'feature': feature,
+                'threshold': tree.threshold,
+                'default_left': (np.zeros(tree.node_count, dtype=bool) if missing_left is None
+                                 else missing_left.astype(bool)),
+                'value': leaf_values[tree_idx],
+            })
+        return cls.from_trees(tables, np.float64)
+
+
+class CompiledRandomForest:
+    """Array-backed replacement for ``RandomForestClassifier.predict_proba``"""
+
+    def __init__(self, model):
+        leaf_values = []
+        for estimator in model.estimators_:
+            proba = estimator.tree_.value[:, 0, :model.n_classes_].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, None]
+            normalizer[normalizer == 0.0] = 1.0
+            leaf_values.append(proba / normalizer)
+        self.classes_ = model.classes_
+        self.ensemble = CompiledTreeEnsemble.from_sklearn_trees(
+            [estimator.tree_ for estimator in model.estimators_], leaf_values
+        )
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        return self.ensemble.accumulate(X) / self.ensemble.n_trees
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+class CompiledXGBoost:
+    """Array-backed replacement for a binary ``XGBClassifier``"""
+
+    def __init__(self, model):
+        booster_json = json.loads(model.get_booster().save_raw('json'))
+        learner = booster_json['learner']
+        objective = learner['objective']['name']
+        if objective != 'binary:logistic':
+            raise ValueError(f"Unsupported XGBoost objective: {objective}")
+        gbm = learner['gradient_booster']
+        if gbm.get('name') != 'gbtree':
+            raise ValueError(f"Unsupported XGBoost booster: {gbm.get('name')}")
+
+        base_score = float(str(learner['learner_model_param']['base_score']).strip('[]'))
+        base_score = np.float32(base_score)
+        self.base_margin = np.float32(-np.log(np.float32(1.0) / base_score - np.float32(1.0)))
+        self.n_classes_ = 2
+
+        tables = []
+        for tree in gbm['model']['trees']:
+            if any(tree.get('split_type', [])):
+                raise ValueError("Categorical XGBoost splits are not supported")
+            left = np.asarray(tree['left_children'], dtype=np.intp)
+            conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+            tables.append({
+                'left': left,
+                'right': np.asarray(tree['right_children'], dtype=np.intp),
+                'feature': np.asarray(tree['split_indices'], dtype=np.intp),
+                # XGBoost sends ``x < condition`` left; for float32 inputs that is
+                # ``x <=`` the next float32 below the condition
+                'threshold': np.nextafter(conditions, np.float32(-np.inf)),
+                'default_left': np.asarray(tree['default_left'], dtype=bool),
+                'value': np.where(left == -1, conditions, np.float32(0.0))[:, None],
+            })
+        self.ensemble = CompiledTreeEnsemble.from_trees(tables, np.float32)
+
+    def predict_margin(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        margin = np.full(X.shape[0], self.base_margin, dtype=np.float32)
+        margin += self.ensemble.accumulate(X)[:, 0]
+        return margin
+
+    def predict_proba(self, X):
+        positive = np.float32(1.0) / (np.float32(1.0) + np.exp(-self.predict_margin(X)))
+        return np.column_stack([np.float32(1.0) - positive, positive])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] > 0.5).astype(int)
+
+
+class CompiledIsolationForest:
+    """Array-backed replacement for ``IsolationForest.score_samples``/``predict``"""
+
+    def __init__(self, model):
+        n_features = model.n_features_in_
+        subsample_features = getattr(model, '_max_features', n_features) != n_features
+        leaf_values = []
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            depths = tree.compute_node_depths().astype(np.float64)
+            path_lengths = average_path_length(tree.n_node_samples)
+            leaf_values.append((depths + path_lengths - 1.0)[:, None])
+        self.offset_ = float(model.offset_)
+        self.denominator = len(model.estimators_) * float(average_path_length([model.max_samples_])[0])
+        self.ensemble = CompiledTreeEnsemble.from_sklearn_trees(
+            [estimator.tree_ for estimator in model.estimators_],
+            leaf_values,
+            feature_maps=model.estimators_features_ if subsample_features else None
+        )
+
+    def score_samples(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        depths = self.ensemble.accumulate(X)[:, 0]
+        if self.denominator == 0:
+            return -np.ones_like(depths)
+        return -(2 ** (-depths / self.denominator))
+
+    def predict(self, X):
+        is_inlier = np.ones(X.shape[0], dtype=int)
+        is_inlier[self.score_samples(X) - self.offset_ < 0] = -1
+        return is_inlier
+
+
+class InferenceEngine:
+    """Compiled versions of the three fitted ensemble members.
+
+    The engine removes the per-call validation and thread-dispatch overhead of
+    the estimator APIs, which dominates small and mid-sized batches. Above
+    ``MAX_BATCH_ROWS`` the native sklearn/XGBoost loops are faster again, so
+    callers should fall back to the fitted objects for large batches.
+    """
+
+    PROBE_ROWS = 512
+    TOLERANCE = 1e-6
+    MAX_BATCH_ROWS = 2048
+
+    def __init__(self, rf_model, xgb_model, isolation_forest):
+        self.rf = CompiledRandomForest(rf_model)
+        self.xgb = CompiledXGBoost(xgb_model)
+        self.isolation_forest = CompiledIsolationForest(isolation_forest)
+
+    def to_arrays(self):
+        """Node tables and scalars for storage in a model bundle.
+
+        Returns ``(arrays, metadata)``: arrays keyed ``<member>.<name>`` and
+        JSON-serialisable metadata; ``from_arrays`` reverses it.
+        """
+        arrays, metadata = {}, {}
+        for member in ('rf', 'xgb', 'isolation_forest'):
+            ensemble = getattr(self, member).ensemble
+            arrays.update({f'{member}.{name}': array for name, array in ensemble.arrays().items()})
+            metadata[member] = {'max_depth': ensemble.max_depth}
+        arrays['rf.classes_'] = self.rf.classes_
+        metadata['xgb']['base_margin'] = float(self.xgb.base_margin)
+        metadata['isolation_forest'].update(offset_=self.isolation_forest.offset_,
+                                            denominator=self.isolation_forest.denominator)
+        return arrays, metadata
+
+    @classmethod
+    def from_arrays(cls, arrays, metadata):
+        """Rebuild an engine from ``to_arrays`` output without re-verifying it.
+
+        The arrays are used as given, so views into a memory-mapped bundle
+        stay shared rather than being copied.
+        """
+        def restore(member_cls, member):
+            compiled = member_cls.__new__(member_cls)
+            compiled.ensemble = CompiledTreeEnsemble(
+                max_depth=metadata[member]['max_depth'],
+                **{name: arrays[f'{member}.{name}'] for name in CompiledTreeEnsemble.ARRAYS}
+            )
+            return compiled
+
+        engine = cls.__new__(cls)
+        engine.rf = restore(CompiledRandomForest, 'rf')
+        engine.rf.classes_ = arrays['rf.classes_']
+        engine.xgb = restore(CompiledXGBoost, 'xgb')
+        engine.xgb.base_margin = np.float32(metadata['xgb']['base_margin'])
+        engine.xgb.n_classes_ = 2
+        engine.isolation_forest = restore(CompiledIsolationForest, 'isolation_forest')
+        engine.isolation_forest.offset_ = float(metadata['isolation_forest']['offset_'])
+        engine.isolation_forest.denominator = float(metadata['isolation_forest']['denominator'])
+        return engine
+
+    @classmethod
+    def compile(cls, model, probe=None):
+        """Compile a trained FraudDetectionModel, or return None if unsupported.
+
+        The engine is checked against the object APIs on ``probe`` rows (random
+        standardised rows when none are given) and is discarded on any mismatch.
+        """
+        try:
+            engine = cls(model.rf_model, model.xgb_model, model.isolation_forest)
+            if probe is None:
+                rng = np.random.default_rng(0)
+                probe = rng.standard_normal((cls.PROBE_ROWS, model.rf_model.n_features_in_))
+            engine.verify(model, np.asarray(probe)[:cls.PROBE_ROWS])
+            return engine
+        except Exception as e:
+            print(f"Compiled inference disabled: {str(e)}")
+            return None
+
+    def verify(self, model, X):
+        checks = [
+            ('Random Forest', model.rf_model.predict_proba(X), self.rf.predict_proba(X)),
+            ('XGBoost', model.xgb_model.predict_proba(X), self.xgb.predict_proba(X)),
+            ('Isolation Forest', model.isolation_forest.score_samples(X), self.isolation_forest.score_samples(X)),
+        ]
+        for name, expected, actual in checks:
+            if expected.shape != actual.shape or not np.allclose(expected, actual, rtol=0, atol=self.TOLERANCE):
+                raise ValueError(f"{name} compiled output does not match the fitted model")
+        if not np.array_equal(model.isolation_forest.predict(X), self.isolation_forest.predict(X)):
+            raise ValueError("Isolation Forest compiled labels do not match the fitted model")
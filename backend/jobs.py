@@ -0,0 +1,223 @@
+import multiprocessing
+import os
+import queue
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+FINISHED_STATES = ('completed', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """Raised inside a job at its next progress report once it has been cancelled"""
+
+
+class Job:
+    """Status, progress and result of one background job"""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = 'queued'
+        self.stage = None
+        self.progress = 0.0
+        self.details = {}
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.process = None
+        self.cancel_requested = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def report(self, stage, progress=None, **details):
+        """Record progress; raises JobCancelled if the job has been cancelled"""
+        if self.cancel_requested.is_set():
+            raise JobCancelled()
+        self.stage = stage
+        if progress is not None:
+            self.progress = float(progress)
+        self.details.update(details)
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def to_dict(self, include_result=True):
+        job = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'details': self.details,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+        if include_result:
+            job['result'] = self.result
+        return job
+
+
+def _process_main(messages, target, args):
+    """Entry point of a job process: run ``target(report, *args)`` and post the outcome"""
+    def report(stage, progress=None, **details):
+        messages.put(('progress', (stage, progress, details)))
+
+    try:
+        messages.put(('result', target(report, *args)))
+    except Exception as e:
+        messages.put(('error', str(e)))
+
+
+class JobManager:
+    """Runs training/prediction work off the request threads.
+
+    Every job gets a monitor thread. Thread jobs call ``target(report, *args)``
+    in that thread and stop at their next ``report`` once cancelled. Process
+    jobs run the same call in a freshly spawned process, relay its progress
+    messages, and are terminated on cancellation. ``concurrency`` limits how
+    many jobs of a kind run at once; the rest wait as ``queued``.
+    """
+
+    POLL_SECONDS = 0.2
+
+    def __init__(self, concurrency=None, max_jobs=100):
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._slots = {kind: threading.BoundedSemaphore(limit) for kind, limit in (concurrency or {}).items()}
+
+    def submit(self, kind, target, *args, process=False, on_result=None, cleanup=None):
+        """Start a job; ``on_result(job, result)`` runs in this process before completion"""
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        threading.Thread(
+            target=self._run, args=(job, target, args, process, on_result, cleanup),
+            name=f'job-{job.id}', daemon=True
+        ).start()
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, kind=None):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job for job in reversed(jobs) if kind is None or job.kind == kind]
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel_requested.set()
+            if job.process is not None and job.process.is_alive():
+                job.process.terminate()
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[job_id]
+
+    def _run(self, job, target, args, process, on_result, cleanup):
+        slot = self._slots.get(job.kind)
+        acquired = False
+        try:
+            while slot is not None and not acquired:
+                if job.cancel_requested.is_set():
+                    raise JobCancelled()
+                acquired = slot.acquire(timeout=self.POLL_SECONDS)
+            if job.cancel_requested.is_set():
+                raise JobCancelled()
+            job.status = 'running'
+            job.started_at = datetime.now().isoformat()
+            result = self._run_process(job, target, args) if process else target(job.report, *args)
+            if on_result is not None:
+                result = on_result(job, result)
+            self._finish(job, 'completed', result=result)
+        except JobCancelled:
+            self._finish(job, 'cancelled')
+        except Exception as e:
+            print(f"Job {job.id} ({job.kind}) failed: {str(e)}")
+            self._finish(job, 'failed', error=str(e))
+        finally:
+            if acquired:
+                slot.release()
+            if cleanup is not None:
+                cleanup()
+
+    def _run_process(self, job, target, args):
+        # Spawn rather than fork: the serving process has live threads and locks
+        context = multiprocessing.get_context('spawn')
+        messages = context.Queue()
+        job.process = context.Process(target=_process_main, args=(messages, target, args))
+        job.process.start()
+        try:
+            while True:
+                try:
+                    kind, payload = messages.get(timeout=self.POLL_SECONDS)
+                except queue.Empty:
+                    if job.cancel_requested.is_set():
+                        raise JobCancelled()
+                    if not job.process.is_alive() and messages.empty():
+                        raise RuntimeError(f"Job process exited with code {job.process.exitcode}")
+                    continue
+                if kind == 'progress':
+                    stage, progress, details = payload
+                    job.report(stage, progress, **details)
+                elif kind == 'result':
+                    return payload
+                else:
+                    raise RuntimeError(payload)
+        finally:
+            if job.process.is_alive():
+                job.process.terminate()
+            job.process.join(timeout=5)
+
+    def _finish(self, job, status, result=None, error=None):
+        job.result = result
+        job.error = error
+        job.status = status
+        if status == 'completed':
+            job.progress = 1.0
+        job.finished_at = datetime.now().isoformat()
+        job._done.set()
+
+
+def promote_directory(src, dst, exclude=()):
+    """Move every entry of ``src`` (but ``exclude``) into ``dst``, replacing existing files atomically.
+
+    Directories are swapped by renaming the old one aside first, so readers
+    never see a half-written directory; ``src`` is removed afterwards. On
+    Windows nothing that is memory-mapped can be replaced, so model folders
+    use new versioned names (see model_bundle.model_files) and only ever
+    add entries here.
+    """
+    os.makedirs(dst, exist_ok=True)
+    for name in os.listdir(src):
+        if name in exclude:
+            continue
+        source = os.path.join(src, name)
+        target = os.path.join(dst, name)
+        if os.path.isdir(source):
+            retired = None
+            if os.path.exists(target):
+                retired = f'{target}.old-{uuid.uuid4().hex[:8]}'
+                os.replace(target, retired)
+            os.replace(source, target)
+            if retired is not None:
+                shutil.rmtree(retired, ignore_errors=True)
+        else:
+            os.replace(source, target)
+    shutil.rmtree(src, ignore_errors=True)
@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from metrics import MODEL_STAGE_SECONDS
+
+
+class MicroBatcher:
+    """Coalesces concurrent /api/score requests into one scoring call.
+
+    Requests arriving within ``max_wait_ms`` of the first queued one (or
+    until ``max_batch_rows`` rows are waiting) are scored as a single matrix
+    by one background thread. Features are still built per request, so every
+    caller gets exactly the rows it would have got when scored alone. With
+    ``max_wait_ms=0`` the thread only batches what queued up while the
+    previous batch was being scored. Each request is scored by the model it
+    was submitted with (``self.model`` by default), and only requests for
+    the same model share a batch, so swapping models never mixes versions.
+    """
+
+    def __init__(self, model, max_wait_ms=2.0, max_batch_rows=256):
+        self.model = model
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.max_batch_rows = max(1, int(max_batch_rows))
+        self._queue = deque()
+        self._queued_rows = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stats = {'batches': 0, 'requests': 0, 'rows': 0, 'max_batch_rows_seen': 0}
+
+    def score(self, transactions, model=None):
+        """Queue a list of transaction dicts and block until its results are ready"""
+        return self.submit(transactions, model).result()
+
+    def submit(self, transactions, model=None):
+        model = self.model if model is None else model
+        future = Future()
+        with self._condition:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='score-batcher', daemon=True)
+                self._thread.start()
+            self._queue.append((transactions, future, time.perf_counter(), model))
+            self._queued_rows += len(transactions)
+            self._condition.notify()
+        return future
+
+    def stats(self):
+        """Queue depth and batch counters for monitoring"""
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update({
+                'queue_depth': len(self._queue),
+                'queued_rows': self._queued_rows,
+                'max_wait_ms': self.max_wait * 1000,
+                'max_batch_rows': self.max_batch_rows,
+                'avg_batch_rows': stats['rows'] / stats['batches'] if stats['batches'] else 0.0
+            })
+        return stats
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+            deadline = self._queue[0][2] + self.max_wait
+            while self._queued_rows < self.max_batch_rows:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            # Take whole requests for the first request's model up to max_batch_rows (always at least one)
+            model = self._queue[0][3]
+            batch, rows = [], 0
+            while self._queue and self._queue[0][3] is model and \
+                    (not batch or rows + len(self._queue[0][0]) <= self.max_batch_rows):
+                transactions, future, _, _ = self._queue.popleft()
+                batch.append((transactions, future))
+                rows += len(transactions)
+            self._queued_rows -= rows
+            self._stats['batches'] += 1
+            self._stats['requests'] += len(batch)
+            self._stats['rows'] += rows
+            self._stats['max_batch_rows_seen'] = max(self._stats['max_batch_rows_seen'], rows)
+        return model, batch
+
+    def _run(self):
+        while True:
+            model, batch = self._next_batch()
+            try:
+                self._score_batch(model, batch)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _score_batch(self, model, batch):
+        if model.feature_store is None:
+            # No pandas-free feature path for this model; score requests one by one
+            for transactions, future in batch:
+                self._resolve(future, model.score_transactions, transactions)
+            return
+
+        started = time.perf_counter()
+        matrices, accepted = [], []
+        for transactions, future in batch:
+            try:
+                matrices.append(model.transaction_features(transactions))
+                accepted.append((transactions, future))
+            except Exception as e:
+                future.set_exception(e)
+        if not accepted:
+            return
+        features_done = time.perf_counter()
+        scores = model.score_matrix(np.vstack(matrices))
+        inference_done = time.perf_counter()
+        offset = 0
+        for transactions, future in accepted:
+            self._resolve(future, model.transaction_results, transactions, scores, offset)
+            offset += len(transactions)
+        MODEL_STAGE_SECONDS.labels('score', 'features').observe(features_done - started)
+        MODEL_STAGE_SECONDS.labels('score', 'inference').observe(inference_done - features_done)
+        MODEL_STAGE_SECONDS.labels('score', 'results').observe(time.perf_counter() - inference_done)
+
+    @staticmethod
+    def _resolve(future, fn, *args):
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
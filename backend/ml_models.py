@@ -3,22 +3,380 @@ import pandas as pd
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.ensemble import RandomForestClassifier, IsolationForest
 from sklearn.model_selection import train_test_split
+from scipy.optimize import brentq
 import xgboost as xgb
 import joblib
+import json
 import os
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from inference_engine import InferenceEngine
+from feature_store import EntityAggregates, EntityFeatureStore, VelocityStream, VelocityWindows
+from feature_cache import file_sha256
+from encoders import CategoryVocabulary, HashedCategory
+from metrics import MODEL_STAGE_SECONDS, ROWS_SCORED, SCORING_ROWS_PER_SECOND
+from model_bundle import BundleError, ModelBundle, model_files, new_model_files, publish_model_files, write_bundle
+
+# Result fields returned per transaction by score_transactions
+SCORE_FIELDS = [
+    'ensemble_fraud_probability', 'rf_fraud_probability', 'xgb_fraud_probability',
+    'is_fraud_predicted', 'risk_level', 'confidence_score', 'anomaly_score',
+    'is_anomaly', 'rf_prediction', 'xgb_prediction', 'iso_prediction',
+    'final_decision_label', 'agreement_state'
+]
+
+
+# Vocabulary-encoded low-cardinality columns and hash-bucketed high-cardinality ones
+CATEGORICAL_COLUMNS = ['merchant_category', 'transaction_type']
+HASHED_COLUMNS = {'location': 1024, 'merchant_id': 1024}
+
+# Default member hyperparameters; train(params=...) overrides them per member
+RF_PARAMS = {
+    'n_estimators': 50,   # Reduced for faster prediction (was 150)
+    'max_depth': 10,      # Slightly reduced for speed
+    'min_samples_split': 5,
+    'min_samples_leaf': 2
+}
+XGB_PARAMS = {
+    'n_estimators': 50,     # Reduced for faster prediction (was 150)
+    'max_depth': 5,         # Reduced depth for speed
+    'learning_rate': 0.15,  # Slightly higher to compensate
+    'subsample': 0.8,
+    'colsample_bytree': 0.8
+}
+
+# Histogram children for the scoring hot path, bound once
+STAGE_TIMERS = {
+    (operation, stage): MODEL_STAGE_SECONDS.labels(operation, stage)
+    for operation, stages in (
+        ('predict', ('features', 'inference', 'results')),
+        ('score', ('features', 'inference', 'results')),
+        ('inference', ('random_forest', 'xgboost', 'isolation_forest', 'postprocess'))
+    )
+    for stage in stages
+}
+ROWS_SCORED_TOTAL = ROWS_SCORED.labels()
+LAST_ROWS_PER_SECOND = SCORING_ROWS_PER_SECOND.labels()
+
+# Bump when prepare_features/extract_feature_matrix change, so cached matrices are
+# rebuilt and model bundles saved by the older pipeline are rejected
+FEATURE_PIPELINE_VERSION = 1
+
+# Fitted ensemble members; loaded from a model bundle only when first used
+ESTIMATOR_ATTRIBUTES = ('rf_model', 'xgb_model', 'isolation_forest')
+
+# Negatives are downsampled within these strata ('day' is the calendar day of timestamp)
+NEGATIVE_STRATA = ['merchant_category', 'day']
+
+# Upload columns prepare_features reads; training loads only these, the label and the strata
+INPUT_COLUMNS = ['amount', 'timestamp', 'customer_id'] + CATEGORICAL_COLUMNS + list(HASHED_COLUMNS)
+# Columns the first pass over a file scored in chunks reads (see FileStatistics)
+BATCH_STAT_COLUMNS = ['amount', 'merchant_id', 'customer_id']
+
+
+def random_forest_classifier(params=None, n_jobs=-1):
+    """RandomForestClassifier with the default parameters updated by ``params``"""
+    return RandomForestClassifier(**{**RF_PARAMS, **(params or {})}, random_state=42, n_jobs=n_jobs)
+
+
+def xgboost_classifier(params=None, base_score=0.5, n_jobs=None):
+    """XGBClassifier with the default parameters updated by ``params``"""
+    return xgb.XGBClassifier(
+        **{**XGB_PARAMS, **(params or {})},
+        random_state=42,
+        eval_metric='logloss',
+        base_score=base_score,
+        n_jobs=n_jobs,
+        verbose=0
+    )
+
+
+def slice_batch_statistics(batch_stats, start, stop):
+    """``batch_stats`` for rows ``start:stop`` of the frame they were computed from"""
+    if not batch_stats or 'velocity' not in batch_stats:
+        return batch_stats
+    velocity = {name: values[start:stop] for name, values in batch_stats['velocity'].items()}
+    return {**batch_stats, 'velocity': velocity}
+
+
+def _batch_amounts(df):
+    return pd.to_numeric(df['amount'], errors='coerce').fillna(50)
+
+
+def _batch_ids(df, col):
+    return pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+
+class FileStatistics:
+    """batch_statistics of a file scored chunk by chunk, in memory bounded by
+    its entities (and velocity window) rather than its rows.
+
+    A first pass folds every chunk in with ``add`` (only BATCH_STAT_COLUMNS
+    are read): the amount mean/std via Chan's parallel update and, for a
+    model without a feature store, per-merchant amount stats and
+    per-customer counts the same way. The scoring pass then calls
+    ``for_chunk`` on each chunk, in file order, for its batch_stats; with a
+    feature store, velocity comes from a VelocityStream carrying the file's
+    earlier rows across chunks. The results equal batch_statistics of the
+    whole file (velocity too, for a file in time order).
+    """
+
+    def __init__(self, model):
+        self.feature_store = model.feature_store
+        self.velocity = VelocityStream(self.feature_store) if self.feature_store is not None else None
+        self.has_amount = False
+        self.count, self.mean, self.m2 = 0, 0.0, 0.0
+        self.merchants = EntityAggregates()
+        self.customers = EntityAggregates()
+        self.has_merchants = self.has_customers = False
+        self._statistics = None
+
+    def add(self, chunk):
+        """Fold one chunk of the first pass in; returns self"""
+        has_amount = 'amount' in chunk.columns
+        amounts = _batch_amounts(chunk).values.astype(np.float64) if has_amount else np.zeros(len(chunk))
+        if has_amount and len(amounts):
+            chunk_mean = amounts.mean()
+            chunk_m2 = float(((amounts - chunk_mean) ** 2).sum())
+            total = self.count + len(amounts)
+            delta = chunk_mean - self.mean
+            self.mean += delta * len(amounts) / total
+            self.m2 += chunk_m2 + delta ** 2 * self.count * len(amounts) / total
+            self.count = total
+        self.has_amount |= has_amount
+        self._statistics = None
+        if self.feature_store is None:
+            if has_amount and 'merchant_id' in chunk.columns:
+                self.has_merchants = True
+                self.merchants.update(_batch_ids(chunk, 'merchant_id').values, amounts)
+            if 'customer_id' in chunk.columns:
+                self.has_customers = True
+                self.customers.update(_batch_ids(chunk, 'customer_id').values, amounts)
+        return self
+
+    def statistics(self):
+        """The entity-level part of batch_stats (everything but velocity)"""
+        stats = {}
+        if self.has_amount:
+            stats['amount_mean'] = self.mean if self.count else np.nan
+            stats['amount_std'] = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+        if self.has_merchants:
+            count, mean, std = self.merchants.lookup(self.merchants.index.keys)
+            stats['merchant_stats'] = pd.DataFrame({
+                'merchant_id': self.merchants.index.keys,
+                'merchant_avg_amount': mean, 'merchant_std_amount': std,
+                'merchant_count': count.astype(np.int64)
+            })
+        if self.has_customers:
+            stats['customer_velocity'] = pd.DataFrame({
+                'customer_id': self.customers.index.keys,
+                'transaction_velocity': self.customers.lookup(self.customers.index.keys)[0].astype(np.int64)
+            })
+        return stats
+
+    def for_chunk(self, chunk):
+        """batch_stats for the next chunk of the scoring pass"""
+        if self._statistics is None:
+            self._statistics = self.statistics()
+        stats = dict(self._statistics)
+        if self.velocity is not None and {'amount', 'timestamp', 'customer_id'} <= set(chunk.columns):
+            stats['velocity'] = self.velocity.transform(
+                _batch_ids(chunk, 'customer_id').values,
+                _epoch_seconds(pd.to_datetime(chunk['timestamp'], errors='coerce')),
+                _batch_amounts(chunk).values
+            )
+        return stats
+
+
+def training_columns(fraud_label_col, strata=None):
+    return list(dict.fromkeys(INPUT_COLUMNS + [fraud_label_col] + list(strata or NEGATIVE_STRATA)))
+
+
+def stratum_codes(df, strata):
+    """Integer stratum per row from the ``strata`` columns; missing columns are skipped"""
+    keys = {}
+    for col in strata:
+        if col == 'day' and 'timestamp' in df.columns:
+            keys[col] = pd.to_datetime(df['timestamp'], errors='coerce').dt.normalize().values
+        elif col in df.columns:
+            keys[col] = df[col].values
+    if not keys:
+        return np.zeros(len(df), dtype=np.int64)
+    return pd.DataFrame(keys).groupby(list(keys), dropna=False, sort=False).ngroup().values
+
+
+def downsample_negatives(y, strata, negative_rate, seed=42):
+    """Keep every positive and a ``negative_rate`` stratified sample of the negatives.
+
+    Negatives are shuffled within strata, laid out stratum by stratum and
+    sampled systematically (every 1/negative_rate-th row from a random
+    start), so each stratum keeps its share to within one row however small
+    it is. Returns the kept row positions (in input order) and their sample
+    weights: 1 for positives and negatives / kept negatives for negatives,
+    so weighted counts match the full data.
+    """
+    rng = np.random.default_rng(seed)
+    y = np.asarray(y)
+    negatives = np.flatnonzero(y == 0)
+    order = np.lexsort((rng.random(len(negatives)), np.asarray(strata)[negatives]))
+    step = 1.0 / negative_rate
+    picks = (rng.random() * step + np.arange(int(np.ceil(len(negatives) * negative_rate))) * step).astype(np.int64)
+    kept_negatives = negatives[order[picks[picks < len(negatives)]]]
+
+    weights = np.ones(len(y))
+    weights[negatives] = len(negatives) / max(1, len(kept_negatives))
+    keep = np.sort(np.concatenate([np.flatnonzero(y != 0), kept_negatives]))
+    return keep, weights[keep]
+
+
+def shift_probability(proba, shift):
+    """Move probabilities by ``shift`` in logit space (0 and 1 stay put)"""
+    odds_ratio = np.exp(shift)
+    return proba * odds_ratio / (proba * odds_ratio + (1.0 - proba))
+
+
+def fit_probability_shift(proba, y, sample_weight=None):
+    """Logit shift that makes the weighted mean probability equal the weighted fraud rate"""
+    target = np.average(y, weights=sample_weight)
+    gap = lambda shift: np.average(shift_probability(proba, shift), weights=sample_weight) - target
+    if gap(-20.0) > 0 or gap(20.0) < 0:
+        return 0.0
+    return float(brentq(gap, -20.0, 20.0, xtol=1e-6))
+
+
+def _to_float(value, default):
+    """Coerce a JSON value to float the way pd.to_numeric(errors='coerce') + fillna would"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return default
+    return default if np.isnan(value) else value
+
+
+def _to_datetime(value, default):
+    """Parse an ISO-like timestamp string, falling back to pandas then ``default``"""
+    if value is None:
+        return default
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        pass
+    try:
+        parsed = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        return default
+    return default if pd.isna(parsed) else parsed
+
+
+def _epoch_seconds(timestamps):
+    """Epoch seconds of a timestamp Series (naive values read as UTC), NaT -> NO_TIME"""
+    if not pd.api.types.is_datetime64_any_dtype(timestamps):
+        timestamps = pd.to_datetime(timestamps, errors='coerce', utc=True)
+    if timestamps.dt.tz is not None:
+        timestamps = timestamps.dt.tz_convert('UTC').dt.tz_localize(None)
+    seconds = timestamps.values.astype('datetime64[s]').astype(np.int64)
+    seconds[timestamps.isna().values] = VelocityWindows.NO_TIME
+    return seconds
+
+
+def _epoch_second(timestamp):
+    """Epoch seconds of one datetime, matching _epoch_seconds"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - datetime(1970, 1, 1)) // timedelta(seconds=1)
+
+
+def _estimator_property(name):
+    """Ensemble member attribute, unpickled from the loaded bundle on first access.
+
+    Batches up to InferenceEngine.MAX_BATCH_ROWS are scored by the compiled
+    engine, whose arrays stay in the shared bundle mapping, so a process
+    that never sees a large batch never holds a private copy of the trees.
+    """
+    slot = f'_{name}'
+
+    def get(self):
+        value = self.__dict__.get(slot)
+        if value is None and name in self._deferred:
+            value = self._bundle.load_object(name)
+            self.__dict__[slot] = value
+            self._deferred.discard(name)
+        return value
+
+    def set(self, value):
+        self.__dict__[slot] = value
+        self._deferred.discard(name)
+
+    return property(get, set)
+
 
 class FraudDetectionModel:
-    def __init__(self):
+    rf_model = _estimator_property('rf_model')
+    xgb_model = _estimator_property('xgb_model')
+    isolation_forest = _estimator_property('isolation_forest')
+
+    def __init__(self, compiled_inference=True, feature_store_updates=False, parallel_training=True):
+        # Memory-mapped bundle the model was loaded from, and the estimators not yet read from it
+        self._bundle = None
+        self._deferred = set()
+        self.bundle_checksum = None
         self.rf_model = None
         self.xgb_model = None
         self.isolation_forest = None
         self.scaler = StandardScaler()
         self.label_encoders = {}
         self.feature_names = None
+        # Array-backed copies of the fitted ensembles, rebuilt after train/load
+        self.compiled_inference = compiled_inference
+        self.inference_engine = None
+        # Per-merchant/customer aggregates; None falls back to per-batch groupby
+        self.feature_store = None
+        # Whether /api/score transactions are folded into the store as they are
+        # scored; batch prediction only ever reads it (see ingest_feature_store)
+        self.feature_store_updates = feature_store_updates
+        # Fit RF, XGBoost and IsolationForest concurrently with a split of the cores
+        self.parallel_training = parallel_training
+        # Logit shifts for the RF/XGBoost probabilities after downsampled training
+        self.probability_shift = None
+
+    def __getstate__(self):
+        # The bundle mapping does not travel between processes; read what it still holds
+        for name in list(self._deferred):
+            getattr(self, name)
+        state = self.__dict__.copy()
+        state['_bundle'] = None
+        return state
+
+    def is_trained(self):
+        """Every ensemble member and the feature list are available (without loading deferred ones)"""
+        return self.feature_names is not None and all(
+            self.__dict__.get(f'_{name}') is not None or name in self._deferred
+            for name in ESTIMATOR_ATTRIBUTES
+        )
         
-    def prepare_features(self, df):
-        """Engineer features from transaction data"""
+    def batch_statistics(self, df):
+        """Batch-level inputs to prepare_features: the amount mean/std, and
+        either the windowed velocity features of every row (which count
+        earlier rows of the same batch) or, without a feature store, the
+        per-merchant stats and customer velocity.
+
+        Computed from ``df`` by default; passing each chunk of a file its
+        part of the file's statistics (``predict(chunk, batch_stats=...)``,
+        see FileStatistics and slice_batch_statistics) makes chunked and
+        sharded scoring match scoring the file in one go.
+        """
+        return FileStatistics(self).add(df).for_chunk(df)
+
+    def prepare_features(self, df, update_store=None, batch_stats=None):
+        """Engineer features from transaction data.
+
+        When a feature store is attached, merchant/customer aggregates are
+        looked up from it (after folding this batch in if ``update_store``,
+        which defaults to ``feature_store_updates``) instead of being
+        computed from the batch alone. ``batch_stats`` (see batch_statistics)
+        replaces the statistics otherwise taken from ``df`` itself.
+        """
         df = df.copy()
         
         # Basic validations
@@ -58,54 +416,108 @@ class FraudDetectionModel:
         amount_series = pd.to_numeric(df['amount'], errors='coerce')
         df['amount'] = amount_series.fillna(50)
         df['amount_log'] = np.log1p(df['amount'])
-        amount_std = df['amount'].std()
+        amount_mean = batch_stats.get('amount_mean') if batch_stats else None
+        if amount_mean is None:
+            amount_mean, amount_std = df['amount'].mean(), df['amount'].std()
+        else:
+            amount_std = batch_stats['amount_std']
         if amount_std == 0:
             amount_std = 1
-        df['amount_std'] = (df['amount'] - df['amount'].mean()) / amount_std
+        df['amount_std'] = (df['amount'] - amount_mean) / amount_std
         
-        # Categorical encoding
-        categorical_cols = ['merchant_category', 'transaction_type']
-        for col in categorical_cols:
+        # Categorical encoding; unseen values get the unknown code row by row
+        for col in CATEGORICAL_COLUMNS:
             if col not in self.label_encoders:
-                self.label_encoders[col] = LabelEncoder()
-                df[f'{col}_encoded'] = self.label_encoders[col].fit_transform(
-                    df[col].astype(str)
-                )
-            else:
-                try:
-                    df[f'{col}_encoded'] = self.label_encoders[col].transform(
-                        df[col].astype(str)
-                    )
-                except:
-                    df[f'{col}_encoded'] = 0
+                self.label_encoders[col] = CategoryVocabulary.fit(df[col])
+            df[f'{col}_encoded'] = self.label_encoders[col].transform(df[col])
         
-        # Statistical aggregations per merchant
-        if 'merchant_id' in df.columns:
+        # Entity ids are numeric keys for both the feature store and the groupby path
+        has_merchant = 'merchant_id' in df.columns
+        has_customer = 'customer_id' in df.columns
+        if has_merchant:
             merchant_id_series = pd.to_numeric(df['merchant_id'], errors='coerce')
             df['merchant_id'] = merchant_id_series.fillna(0)
-            # Remove duplicate lines
-            merchant_stats = df.groupby('merchant_id')['amount'].agg(
-                ['mean', 'std', 'count']
-            ).reset_index()
-            merchant_stats.columns = ['merchant_id', 'merchant_avg_amount', 
-                                      'merchant_std_amount', 'merchant_count']
-            df = df.merge(merchant_stats, on='merchant_id', how='left')
-            merchant_std = df['merchant_std_amount'].std()
-            if pd.isna(merchant_std) or merchant_std == 0:
-                merchant_std = 1
+        if has_customer:
+            customer_id_series = pd.to_numeric(df['customer_id'], errors='coerce')
+            df['customer_id'] = customer_id_series.fillna(0)
+        
+        # High-cardinality columns are hashed into a fixed number of buckets
+        for col in HASHED_COLUMNS:
+            if col in df.columns and col in self.label_encoders:
+                df[f'{col}_hashed'] = self.label_encoders[col].transform(df[col].values)
+        
+        if self.feature_store is not None:
+            # Per-merchant stats and customer velocity from the persisted store
+            if update_store is None:
+                update_store = self.feature_store_updates
+            velocity = batch_stats.get('velocity') if batch_stats and not update_store else None
+            aggregates = self.feature_store.transform(
+                df['amount'].values,
+                merchant_ids=df['merchant_id'].values if has_merchant else None,
+                customer_ids=df['customer_id'].values if has_customer else None,
+                update=update_store,
+                timestamps=_epoch_seconds(df['timestamp']) if 'timestamp' in df.columns and velocity is None else None
+            )
+            if velocity is not None and has_customer:
+                if any(len(values) != len(df) for values in velocity.values()):
+                    raise ValueError('batch_stats velocity does not match the batch; pass its slice')
+                aggregates.update(velocity)
+            for col, values in aggregates.items():
+                df[col] = values
+        else:
+            # Statistical aggregations per merchant
+            if has_merchant:
+                merchant_stats = batch_stats.get('merchant_stats') if batch_stats else None
+                if merchant_stats is None:
+                    merchant_stats = df.groupby('merchant_id')['amount'].agg(
+                        ['mean', 'std', 'count']
+                    ).reset_index()
+                    merchant_stats.columns = ['merchant_id', 'merchant_avg_amount', 
+                                              'merchant_std_amount', 'merchant_count']
+                df = df.merge(merchant_stats, on='merchant_id', how='left')
+            
+            # Velocity features
+            if has_customer:
+                customer_velocity = batch_stats.get('customer_velocity') if batch_stats else None
+                if customer_velocity is None:
+                    customer_velocity = df.groupby('customer_id').size().reset_index(name='transaction_velocity')
+                df = df.merge(customer_velocity, on='customer_id', how='left')
+        
+        if has_merchant:
             df['amount_deviation'] = np.abs(
                 (df['amount'] - df['merchant_avg_amount'].fillna(0)) / (df['merchant_std_amount'].fillna(1) + 1)
             )
         
-        # Velocity features
-        if 'customer_id' in df.columns:
-            customer_id_series = pd.to_numeric(df['customer_id'], errors='coerce')
-            df['customer_id'] = customer_id_series.fillna(0)
-            customer_velocity = df.groupby('customer_id').size().reset_index(name='transaction_velocity')
-            df = df.merge(customer_velocity, on='customer_id', how='left')
-        
         return df
     
+    def ingest_feature_store(self, df, source):
+        """Fold a batch into the feature store once per ``source`` (a file content hash).
+
+        Returns False, leaving the store untouched, when the store has no
+        entities to update or ``source`` was already ingested (or trained on).
+        """
+        if self.feature_store is None or 'amount' not in df.columns:
+            return False
+        if not self.feature_store.claim_source(source):
+            return False
+        try:
+            self._fold_into_feature_store(df)
+        except Exception:
+            self.feature_store.release_source(source)
+            raise
+        return True
+
+    def _fold_into_feature_store(self, df):
+        amounts = pd.to_numeric(df['amount'], errors='coerce').fillna(50).values
+        ids = {}
+        for col, key in (('merchant_id', 'merchant_ids'), ('customer_id', 'customer_ids')):
+            if col in df.columns:
+                ids[key] = pd.to_numeric(df[col], errors='coerce').fillna(0).values
+        if 'timestamp' in df.columns:
+            ids['timestamps'] = _epoch_seconds(pd.to_datetime(df['timestamp'], errors='coerce'))
+        if ids:
+            self.feature_store.transform(amounts, update=True, **ids)
+    
     def extract_feature_matrix(self, df):
         """Extract numeric features for modeling"""
         feature_cols = [
@@ -117,6 +529,8 @@ class FraudDetectionModel:
         # Add optional columns if they exist
         optional_cols = ['merchant_avg_amount', 'merchant_std_amount', 
                         'merchant_count', 'amount_deviation', 'transaction_velocity']
+        optional_cols.extend(VelocityWindows.feature_names())
+        optional_cols.extend(f'{col}_hashed' for col in HASHED_COLUMNS)
         feature_cols.extend([col for col in optional_cols if col in df.columns])
         
         self.feature_names = feature_cols
@@ -124,10 +538,24 @@ class FraudDetectionModel:
         
         return X
     
-    def train(self, df, fraud_label_col='is_fraud'):
-        """Train fraud detection models"""
+    def reset_feature_pipeline(self):
+        """Start from an empty feature store and unfitted encoders before fitting on a new training set"""
+        self.feature_store = EntityFeatureStore()
+        # Vocabularies are refitted on every training run
+        self.label_encoders = {col: HashedCategory(n_buckets) for col, n_buckets in HASHED_COLUMNS.items()}
+    
+    def fit_training_matrix(self, df, fraud_label_col='is_fraud', negative_rate=None, strata=None):
+        """Fit the feature store, encoders and scaler on ``df``.
+
+        With ``negative_rate`` below 1, features are still built from every
+        row (so the feature store sees the full history) but only the
+        positives and a stratified sample of negatives are kept. Returns the
+        scaled matrix, the labels and the sample weights (None when nothing
+        was sampled).
+        """
         print("Preparing features...")
-        df_processed = self.prepare_features(df)
+        self.reset_feature_pipeline()
+        df_processed = self.prepare_features(df, update_store=True)
         
         print("Extracting features...")
         X = self.extract_feature_matrix(df_processed)
@@ -136,97 +564,424 @@ class FraudDetectionModel:
             y = pd.to_numeric(df_processed[fraud_label_col], errors='coerce').fillna(0)
         else:
             y = np.zeros(len(df))
+        y = np.asarray(y)
+        
+        sample_count, fraud_ratio = len(X), float(np.mean(y)) if len(set(y)) > 1 else 0
+        weights = None
+        if negative_rate is not None and negative_rate < 1 and len(set(y)) > 1:
+            keep, weights = downsample_negatives(
+                y, stratum_codes(df_processed, strata or NEGATIVE_STRATA), negative_rate
+            )
+            print(f"Downsampled negatives: training on {len(keep)} of {sample_count} rows")
+            X, y = X.iloc[keep], y[keep]
         
         print("Scaling features...")
-        X_scaled = self.scaler.fit_transform(X)
+        X_scaled = self.scaler.fit(X, sample_weight=weights).transform(X)
         
         # Store training data statistics for later use
         self.training_stats = {
             'feature_count': X.shape[1],
-            'sample_count': len(X),
-            'fraud_ratio': float(y.mean()) if len(set(y)) > 1 else 0,
+            'sample_count': sample_count,
+            'rows_used': len(X),
+            'fraud_ratio': fraud_ratio,
             'feature_names': list(X.columns) if hasattr(X, 'columns') else []
         }
-        
-        if len(set(y)) > 1:  # If we have both classes
+        if weights is not None:
+            self.training_stats['sampling'] = {
+                'negative_rate': negative_rate,
+                'strata': list(strata or NEGATIVE_STRATA),
+                'rows_used': len(X)
+            }
+        return X_scaled, y, weights
+    
+    def fit_training_file(self, filepath, fraud_label_col='is_fraud', negative_rate=None, strata=None, cache=None):
+        """fit_training_matrix on a CSV, reusing a cached result for the same file and settings.
+
+        ``cache`` is a FeatureMatrixCache; a hit restores the fitted feature
+        store, encoders and scaler and memory-maps the matrix instead of
+        parsing and engineering the file again.
+        """
+        if cache is None:
+            matrix = self.fit_training_matrix(pd.read_csv(filepath), fraud_label_col, negative_rate, strata)
+            self.feature_store.sources.add(file_sha256(filepath))
+            return matrix
+        key = cache.key(
+            filepath, 'matrix', version=FEATURE_PIPELINE_VERSION, label=fraud_label_col,
+            negative_rate=negative_rate if negative_rate is not None and negative_rate < 1 else None,
+            strata=list(strata or NEGATIVE_STRATA)
+        )
+        path = cache.get(key)
+        if path is not None:
             try:
-                X_train, X_test, y_train, y_test = train_test_split(
-                    X_scaled, y, test_size=0.2, random_state=42, stratify=y
-                )
-            except:
-                X_train, X_test = X_scaled, X_scaled
-                y_train, y_test = y, y
-        else:
-            X_train, X_test = X_scaled, X_scaled
-            y_train, y_test = y, y
-        
-        print("Training Random Forest...")
-        self.rf_model = RandomForestClassifier(
-            n_estimators=50,   # Reduced for faster prediction (was 150)
-            max_depth=10,      # Slightly reduced for speed
-            min_samples_split=5,
-            min_samples_leaf=2,
-            random_state=42,
-            n_jobs=-1
+                matrix = self._restore_training_matrix(path)
+                self.training_stats['feature_cache'] = 'hit'
+                return matrix
+            except (OSError, ValueError, EOFError) as e:
+                print(f"Feature cache entry {key} unusable, rebuilding: {str(e)}")
+        
+        df = cache.read_frame(filepath, columns=training_columns(fraud_label_col, strata))
+        matrix = self.fit_training_matrix(df, fraud_label_col, negative_rate, strata)
+        # Ingesting the training file later must not count its rows again
+        self.feature_store.sources.add(cache.content_hash(filepath))
+        with cache.write(key) as tmp_path:
+            self._store_training_matrix(tmp_path, *matrix)
+        self.training_stats['feature_cache'] = 'miss'
+        return matrix
+    
+    def _store_training_matrix(self, path, X_scaled, y, weights):
+        np.save(os.path.join(path, 'X_scaled.npy'), np.asarray(X_scaled))
+        np.save(os.path.join(path, 'y.npy'), y)
+        if weights is not None:
+            np.save(os.path.join(path, 'weights.npy'), weights)
+        joblib.dump({
+            'scaler': self.scaler,
+            'label_encoders': self.label_encoders,
+            'feature_names': self.feature_names,
+            'training_stats': self.training_stats
+        }, os.path.join(path, 'state.pkl'))
+        self.feature_store.save(os.path.join(path, 'feature_store'))
+    
+    def _restore_training_matrix(self, path):
+        print(f"Using cached feature matrix {os.path.basename(path)}")
+        state = joblib.load(os.path.join(path, 'state.pkl'))
+        self.scaler = state['scaler']
+        self.label_encoders = state['label_encoders']
+        self.feature_names = state['feature_names']
+        self.training_stats = state['training_stats']
+        # Copy-on-write maps: the store can grow without touching the cache files
+        self.feature_store = EntityFeatureStore.load(os.path.join(path, 'feature_store'))
+        weights_path = os.path.join(path, 'weights.npy')
+        return (
+            np.load(os.path.join(path, 'X_scaled.npy'), mmap_mode='r'),
+            np.load(os.path.join(path, 'y.npy')),
+            np.load(weights_path) if os.path.exists(weights_path) else None
         )
-        self.rf_model.fit(X_train, y_train)
-        rf_score = self.rf_model.score(X_test, y_test) if len(set(y)) > 1 else 0
-        print(f"   Random Forest Score: {rf_score:.4f}")
+    
+    def train(self, df, fraud_label_col='is_fraud', progress=None, params=None, negative_rate=None, strata=None):
+        """Train fraud detection models.
+
+        ``progress(stage, fraction)`` is called as each stage starts.
+        ``params`` maps 'random_forest' / 'xgboost' to parameter overrides
+        (e.g. a configuration picked by hyperparameter_search).
+        ``negative_rate`` trains on all positives plus that fraction of the
+        negatives per ``strata`` (default NEGATIVE_STRATA); the sample
+        weights keep the fraud probabilities calibrated to the full data.
+        """
+        progress = progress or (lambda stage, fraction=None: None)
+        progress('features', 0.05)
+        started = time.perf_counter()
+        X_scaled, y, weights = self.fit_training_matrix(df, fraud_label_col, negative_rate, strata)
+        features_seconds = time.perf_counter() - started
+        stats = self.fit_models(X_scaled, y, weights, params, progress)
+        stats['stage_seconds']['features'] = features_seconds
+        return stats
+    
+    def train_file(self, filepath, fraud_label_col='is_fraud', progress=None, params=None,
+                   negative_rate=None, strata=None, cache=None):
+        """train() on a CSV, with the ingest stage served from ``cache`` when possible"""
+        progress = progress or (lambda stage, fraction=None: None)
+        progress('features', 0.05)
+        started = time.perf_counter()
+        X_scaled, y, weights = self.fit_training_file(filepath, fraud_label_col, negative_rate, strata, cache)
+        features_seconds = time.perf_counter() - started
+        stats = self.fit_models(X_scaled, y, weights, params, progress)
+        stats['stage_seconds']['features'] = features_seconds
+        return stats
+    
+    def fit_models(self, X_scaled, y, weights=None, params=None, progress=None):
+        """Fit the three ensemble members on a matrix from fit_training_matrix.
+
+        The returned stats include ``stage_seconds`` per member fit and for
+        compiling (members overlap when fitted concurrently).
+        """
+        progress = progress or (lambda stage, fraction=None: None)
+        params = params or {}
+        stage_seconds = {}
+        if weights is None:
+            X_train, X_test, y_train, y_test = self.holdout_split(X_scaled, y)
+            w_train = w_test = None
+            X_iso = X_scaled
+        else:
+            X_train, X_test, y_train, y_test, w_train, w_test = self.holdout_split(X_scaled, y, weights)
+            # IsolationForest ignores weights when subsampling; give it a
+            # weight-proportional resample so it sees the full-data mix
+            rows = np.random.default_rng(42).choice(len(weights), size=len(weights), p=weights / weights.sum())
+            X_iso = X_scaled[rows]
         
-        print("Training XGBoost...")
-        # Calculate base_score as the mean of target variable, clamped between 0.01 and 0.99
-        base_score = max(0.01, min(0.99, float(y.mean()))) if len(set(y)) > 1 else 0.5
-        self.xgb_model = xgb.XGBClassifier(
-            n_estimators=50,     # Reduced for faster prediction (was 150)
-            max_depth=5,         # Reduced depth for speed
-            learning_rate=0.15,  # Slightly higher to compensate
-            subsample=0.8,
-            colsample_bytree=0.8,
+        has_both_classes = len(set(y)) > 1
+        fraud_ratio = float(np.average(y, weights=weights))
+        rf_jobs, xgb_jobs, iso_jobs = self.training_core_split() if self.parallel_training else (-1, None, -1)
+        self.rf_model = random_forest_classifier(params.get('random_forest'), n_jobs=rf_jobs)
+        self.xgb_model = xgboost_classifier(params.get('xgboost'), self.base_score(y, weights), n_jobs=xgb_jobs)
+        self.isolation_forest = IsolationForest(
+            contamination=max(0.05, min(0.3, fraud_ratio * 2)) if has_both_classes else 0.1,  # Adaptive contamination
             random_state=42,
-            eval_metric='logloss',
-            base_score=base_score,
-            verbose=0
+            n_jobs=iso_jobs
         )
-        self.xgb_model.fit(X_train, y_train)
-        xgb_score = self.xgb_model.score(X_test, y_test) if len(set(y)) > 1 else 0
+        
+        def fit_random_forest():
+            started = time.perf_counter()
+            self.rf_model.fit(X_train, y_train, sample_weight=w_train)
+            stage_seconds['random_forest'] = time.perf_counter() - started
+            return self.rf_model.score(X_test, y_test, sample_weight=w_test) if has_both_classes else 0
+        
+        def fit_xgboost():
+            started = time.perf_counter()
+            self.xgb_model.fit(X_train, y_train, sample_weight=w_train)
+            stage_seconds['xgboost'] = time.perf_counter() - started
+            return self.xgb_model.score(X_test, y_test, sample_weight=w_test) if has_both_classes else 0
+        
+        def fit_isolation_forest():
+            started = time.perf_counter()
+            self.isolation_forest.fit(X_iso)
+            stage_seconds['isolation_forest'] = time.perf_counter() - started
+        
+        if self.parallel_training:
+            # The members only read X_scaled, and their fits release the GIL
+            print(f"Training Random Forest ({rf_jobs} cores), XGBoost ({xgb_jobs} cores) "
+                  f"and Isolation Forest ({iso_jobs} cores) concurrently...")
+            progress('ensemble', 0.2)
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                futures = [executor.submit(fit) for fit in (fit_random_forest, fit_xgboost, fit_isolation_forest)]
+                rf_score, xgb_score, _ = [future.result() for future in futures]
+        else:
+            print("Training Random Forest...")
+            progress('random_forest', 0.2)
+            rf_score = fit_random_forest()
+            print("Training XGBoost...")
+            progress('xgboost', 0.5)
+            xgb_score = fit_xgboost()
+            print("Training Isolation Forest (Anomaly Detection)...")
+            progress('isolation_forest', 0.7)
+            fit_isolation_forest()
+        print(f"   Random Forest Score: {rf_score:.4f}")
         print(f"   XGBoost Score: {xgb_score:.4f}")
         
-        print("Training Isolation Forest (Anomaly Detection)...")
-        self.isolation_forest = IsolationForest(
-            contamination=max(0.05, min(0.3, float(y.mean()) * 2)) if len(set(y)) > 1 else 0.1,  # Adaptive contamination
-            random_state=42,
-            n_jobs=-1
+        # Heavily reweighted negatives still leave some bias; recentre each
+        # member's probabilities on the (weighted) holdout fraud rate
+        self.probability_shift = None
+        if weights is not None and len(set(y_test)) > 1:
+            self.probability_shift = {
+                'rf': fit_probability_shift(self.rf_model.predict_proba(X_test)[:, 1], y_test, w_test),
+                'xgb': fit_probability_shift(self.xgb_model.predict_proba(X_test)[:, 1], y_test, w_test)
+            }
+            print(f"   Probability shifts: {self.probability_shift}")
+        
+        # Scoring uses every core again
+        self.rf_model.n_jobs = -1
+        self.isolation_forest.n_jobs = -1
+        self.xgb_model.set_params(n_jobs=None)
+        progress('compiling', 0.8)
+        started = time.perf_counter()
+        self.compile_inference(X_test)
+        stage_seconds['compiling'] = time.perf_counter() - started
+        
+        stats = {
+            'rf_score': float(rf_score),
+            'xgb_score': float(xgb_score),
+            'samples_trained': self.training_stats['sample_count'],
+            'fraud_ratio': self.training_stats['fraud_ratio'],
+            'feature_importance': self._feature_importance(self.feature_names),
+            'stage_seconds': stage_seconds,
+            'params': {
+                'random_forest': {key: self.rf_model.get_params()[key] for key in RF_PARAMS},
+                'xgboost': {key: self.xgb_model.get_params()[key] for key in XGB_PARAMS}
+            }
+        }
+        for key in ('sampling', 'feature_cache'):
+            if key in self.training_stats:
+                stats[key] = self.training_stats[key]
+        return stats
+    
+    def train_incremental(self, df, fraud_label_col='is_fraud', new_trees=10, progress=None, source=None):
+        """Warm-start the trained ensemble on newly labelled rows.
+
+        RandomForest and IsolationForest grow ``new_trees`` trees fitted on
+        the new rows, XGBoost continues boosting for as many rounds, and the
+        encoders, feature store and scaler are updated from running
+        statistics. Existing split thresholds are remapped onto the updated
+        scaler so the old trees see the same raw values as before. The model
+        grows with every delta run; retrain from scratch now and then.
+        ``source`` (the file's content hash) keeps a file already in the
+        feature store from being folded in again. A probability shift from
+        a downsampled training run is refitted on the delta holdout (or
+        cleared if that holdout has one class) whenever trees are added.
+        """
+        if not self.is_trained():
+            raise Exception("Models not trained yet. Please train the model first.")
+        progress = progress or (lambda stage, fraction=None: None)
+        
+        print("Preparing features...")
+        progress('features', 0.05)
+        for col in CATEGORICAL_COLUMNS:
+            if col in df.columns and col in self.label_encoders:
+                self.label_encoders[col] = self.label_encoders[col].extend(df[col])
+        feature_names = self.feature_names
+        update_store = self.feature_store is not None and (source is None or self.feature_store.claim_source(source))
+        df_processed = self.prepare_features(df, update_store=update_store)
+        X = self.extract_feature_matrix(df_processed).reindex(columns=feature_names, fill_value=0)
+        self.feature_names = feature_names
+        if fraud_label_col in df_processed.columns:
+            y = pd.to_numeric(df_processed[fraud_label_col], errors='coerce').fillna(0)
+        else:
+            y = np.zeros(len(df))
+        has_both_classes = len(set(y)) > 1
+        
+        print("Updating scaler...")
+        progress('scaling', 0.15)
+        old_mean, old_scale = self.scaler.mean_.copy(), self.scaler.scale_.copy()
+        self.scaler.partial_fit(X)
+        self.remap_split_thresholds(old_mean, old_scale)
+        X_scaled = self.scaler.transform(X)
+        X_train, X_test, y_train, y_test = self.holdout_split(X_scaled, y)
+        
+        rf_score = xgb_score = 0
+        if has_both_classes:
+            print(f"Adding {new_trees} Random Forest trees...")
+            progress('random_forest', 0.2)
+            self.rf_model.set_params(warm_start=True, n_estimators=len(self.rf_model.estimators_) + new_trees)
+            self.rf_model.fit(X_train, y_train)
+            rf_score = self.rf_model.score(X_test, y_test)
+            print(f"   Random Forest Score: {rf_score:.4f}")
+            
+            print(f"Continuing XGBoost for {new_trees} rounds...")
+            progress('xgboost', 0.5)
+            booster = self.xgb_model.get_booster()
+            self.xgb_model.set_params(n_estimators=new_trees)
+            self.xgb_model.fit(X_train, y_train, xgb_model=booster)
+            self.xgb_model.set_params(n_estimators=self.xgb_model.get_booster().num_boosted_rounds())
+            xgb_score = self.xgb_model.score(X_test, y_test)
+            print(f"   XGBoost Score: {xgb_score:.4f}")
+            
+            # The old shift was fitted to the trees before this run; refit it
+            # on the delta holdout, or drop it when that has a single class
+            if self.probability_shift is not None:
+                if len(set(y_test)) > 1:
+                    self.probability_shift = {
+                        'rf': fit_probability_shift(self.rf_model.predict_proba(X_test)[:, 1], y_test),
+                        'xgb': fit_probability_shift(self.xgb_model.predict_proba(X_test)[:, 1], y_test)
+                    }
+                    print(f"   Probability shifts: {self.probability_shift}")
+                else:
+                    self.probability_shift = None
+                    print("   One class in the delta holdout; probability shifts cleared")
+        else:
+            # Warm-started classifiers must keep seeing both classes
+            print("Only one class in the new rows; keeping the supervised models as they are")
+        
+        print(f"Adding {new_trees} Isolation Forest trees...")
+        progress('isolation_forest', 0.7)
+        self.isolation_forest.set_params(
+            warm_start=True, n_estimators=len(self.isolation_forest.estimators_) + new_trees
         )
         self.isolation_forest.fit(X_scaled)
+        progress('compiling', 0.8)
+        self.compile_inference(X_test)
+        
+        return {
+            'mode': 'delta',
+            'rf_score': float(rf_score),
+            'xgb_score': float(xgb_score),
+            'samples_trained': len(X),
+            'fraud_ratio': float(y.mean()) if has_both_classes else 0,
+            'supervised_updated': has_both_classes,
+            'new_trees': new_trees,
+            'total_trees': {
+                'random_forest': len(self.rf_model.estimators_),
+                'xgboost': self.xgb_model.get_booster().num_boosted_rounds(),
+                'isolation_forest': len(self.isolation_forest.estimators_)
+            },
+            'feature_importance': self._feature_importance(self.feature_names)
+        }
+    
+    def remap_split_thresholds(self, old_mean, old_scale):
+        """Rewrite every split threshold from the old scaler's units into the current one's.
+
+        Standard scaling is a positive affine map per feature, so a split
+        ``(x - m0) / s0 <= t`` is the same as ``(x - m1) / s1 <= t * s0 / s1 + (m0 - m1) / s1``.
+        """
+        slope = old_scale / self.scaler.scale_
+        shift = (old_mean - self.scaler.mean_) / self.scaler.scale_
+        
+        iso = self.isolation_forest
+        iso_subsampled = getattr(iso, '_max_features', iso.n_features_in_) != iso.n_features_in_
+        forests = [(estimator, None) for estimator in self.rf_model.estimators_]
+        forests += [
+            (estimator, np.asarray(features) if iso_subsampled else None)
+            for estimator, features in zip(iso.estimators_, iso.estimators_features_)
+        ]
+        for estimator, feature_map in forests:
+            tree = estimator.tree_
+            internal = tree.children_left != -1
+            features = tree.feature[internal]
+            if feature_map is not None:
+                features = feature_map[features]
+            thresholds = tree.threshold
+            thresholds[internal] = thresholds[internal] * slope[features] + shift[features]
         
-        # Calculate feature importances
-        rf_importance = self.rf_model.feature_importances_ if self.rf_model else np.zeros(X.shape[1])
-        xgb_importance = self.xgb_model.feature_importances_ if self.xgb_model else np.zeros(X.shape[1])
+        booster = self.xgb_model.get_booster()
+        model_json = json.loads(booster.save_raw('json'))
+        for tree in model_json['learner']['gradient_booster']['model']['trees']:
+            internal = np.asarray(tree['left_children']) != -1
+            features = np.asarray(tree['split_indices'])[internal]
+            conditions = np.asarray(tree['split_conditions'], dtype=np.float64)
+            conditions[internal] = conditions[internal] * slope[features] + shift[features]
+            tree['split_conditions'] = conditions.tolist()
+        booster.load_model(bytearray(json.dumps(model_json).encode('utf-8')))
+    
+    @staticmethod
+    def base_score(y, sample_weight=None):
+        """XGBoost base_score: the (weighted) fraud rate clamped to [0.01, 0.99], or 0.5 for one class"""
+        if len(set(y)) > 1:
+            return max(0.01, min(0.99, float(np.average(y, weights=sample_weight))))
+        return 0.5
+    
+    @staticmethod
+    def holdout_split(X_scaled, y, *arrays):
+        """Stratified 80/20 split of X, y and any row-aligned ``arrays``, or each one twice when that isn't possible"""
+        if len(set(y)) > 1:  # If we have both classes
+            try:
+                return train_test_split(X_scaled, y, *arrays, test_size=0.2, random_state=42, stratify=y)
+            except:
+                pass
+        return [part for array in (X_scaled, y) + arrays for part in (array, array)]
+    
+    def _feature_importance(self, feature_names):
+        """Average RF and XGBoost importances per feature name"""
+        rf_importance = self.rf_model.feature_importances_ if self.rf_model else np.zeros(len(feature_names))
+        xgb_importance = self.xgb_model.feature_importances_ if self.xgb_model else np.zeros(len(feature_names))
         
         # Combine importances
         combined_importance = (rf_importance + xgb_importance) / 2
         
         # Create feature importance dictionary
         feature_importance = {}
-        feature_names = list(X.columns) if hasattr(X, 'columns') else [f'feature_{i}' for i in range(X.shape[1])]
         for i, name in enumerate(feature_names):
             feature_importance[name] = float(combined_importance[i])
-        
-        return {
-            'rf_score': float(rf_score),
-            'xgb_score': float(xgb_score),
-            'samples_trained': len(X),
-            'fraud_ratio': float(y.mean()) if len(set(y)) > 1 else 0,
-            'feature_importance': feature_importance
-        }
+        return feature_importance
     
-    def predict(self, df):
-        """Predict fraud on new data"""
+    @staticmethod
+    def training_core_split(cores=None):
+        """Cores for (RF, XGBoost, IsolationForest) when fitted side by side.
+
+        The forest gets half, IsolationForest (256-row subsamples) an eighth,
+        and XGBoost the rest; each member gets at least one.
+        """
+        cores = cores or os.cpu_count() or 1
+        rf_jobs = max(1, cores // 2)
+        iso_jobs = max(1, cores // 8)
+        xgb_jobs = max(1, cores - rf_jobs - iso_jobs)
+        return rf_jobs, xgb_jobs, iso_jobs
+    
+    def predict(self, df, batch_stats=None):
+        """Predict fraud on new data (``batch_stats``: see batch_statistics)"""
         # Check if models are trained
-        if self.rf_model is None or self.xgb_model is None or self.isolation_forest is None:
+        if not self.is_trained():
             raise Exception("Models not trained yet. Please train the model first.")
         
-        df_processed = self.prepare_features(df)
+        started = time.perf_counter()
+        # Scoring never changes the feature store, so re-scoring a file gives the same results
+        df_processed = self.prepare_features(df, update_store=False, batch_stats=batch_stats)
         X = self.extract_feature_matrix(df_processed)
         
         # Ensure X has the same columns as training data
@@ -239,49 +994,175 @@ class FraudDetectionModel:
             X = X[self.feature_names]
         
         X_scaled = self.scaler.transform(X)
-        
+        features_done = time.perf_counter()
+        scores = self.score_matrix(X_scaled)
+        inference_done = time.perf_counter()
+
+        results_df = df.copy()
+        for col, values in scores.items():
+            results_df[col] = values
+
+        STAGE_TIMERS['predict', 'features'].observe(features_done - started)
+        STAGE_TIMERS['predict', 'inference'].observe(inference_done - features_done)
+        STAGE_TIMERS['predict', 'results'].observe(time.perf_counter() - inference_done)
+        return results_df
+    
+    def transaction_features(self, transactions, update_store=None):
+        """Build the scaled feature matrix for a few transaction dicts without pandas.
+
+        Mirrors ``prepare_features`` + ``extract_feature_matrix`` + the scaler,
+        writing each feature straight into a preallocated row. Requires a
+        feature store for the merchant/customer aggregates.
+        """
+        n_rows = len(transactions)
+        columns = {name: i for i, name in enumerate(self.feature_names)}
+        X = np.zeros((n_rows, len(columns)))
+        now = datetime.now()
+
+        amounts = np.array([_to_float(txn.get('amount'), 50.0) for txn in transactions])
+        timestamps = [_to_datetime(txn.get('timestamp'), now) for txn in transactions]
+        amount_std = amounts.std(ddof=1) if n_rows > 1 else 0.0
+        if amount_std == 0:
+            amount_std = 1
+        values = {
+            'amount': amounts,
+            'amount_log': np.log1p(amounts),
+            'amount_std': (amounts - amounts.mean()) / amount_std if n_rows > 1 else 0.0,
+            'hour': [ts.hour for ts in timestamps],
+            'day_of_week': [ts.weekday() for ts in timestamps],
+            'day_of_month': [ts.day for ts in timestamps],
+        }
+        for col in CATEGORICAL_COLUMNS:
+            encoder = self.label_encoders.get(col)
+            if encoder is not None:
+                values[f'{col}_encoded'] = [encoder.encode(txn.get(col)) for txn in transactions]
+
+        ids = {}
+        for col, key in (('merchant_id', 'merchant_ids'), ('customer_id', 'customer_ids')):
+            if any(col in txn for txn in transactions):
+                ids[key] = np.array([_to_float(txn.get(col), 0.0) for txn in transactions])
+        if update_store is None:
+            update_store = self.feature_store_updates
+        if 'customer_ids' in ids:
+            ids['timestamps'] = [_epoch_second(ts) for ts in timestamps]
+        values.update(self.feature_store.transform(amounts, update=update_store, **ids))
+        if 'location_hashed' in columns and 'location' in self.label_encoders:
+            encoder = self.label_encoders['location']
+            values['location_hashed'] = [
+                encoder.encode(txn['location']) if 'location' in txn else 0 for txn in transactions
+            ]
+        if 'merchant_id_hashed' in columns and 'merchant_ids' in ids:
+            values['merchant_id_hashed'] = self.label_encoders['merchant_id'].transform(ids['merchant_ids'])
+        if 'merchant_ids' in ids:
+            merchant_avg = np.nan_to_num(values['merchant_avg_amount'], nan=0.0)
+            merchant_std = np.nan_to_num(values['merchant_std_amount'], nan=1.0)
+            values['amount_deviation'] = np.abs((amounts - merchant_avg) / (merchant_std + 1))
+
+        for col, column_values in values.items():
+            if col in columns:
+                X[:, columns[col]] = column_values
+        X[np.isnan(X)] = 0
+        return (X - self.scaler.mean_) / self.scaler.scale_
+
+    def score_transactions(self, transactions):
+        """Score a small list of transaction dicts, returning one result dict each"""
+        if not self.is_trained():
+            raise Exception("Models not trained yet. Please train the model first.")
+
+        if self.feature_store is None:
+            # Models saved without a feature store need the batch groupby path
+            results_df = self.predict(pd.DataFrame(transactions))
+            scores = {col: results_df[col].values for col in SCORE_FIELDS}
+            return self.transaction_results(transactions, scores)
+
+        started = time.perf_counter()
+        X_scaled = self.transaction_features(transactions)
+        features_done = time.perf_counter()
+        scores = self.score_matrix(X_scaled)
+        inference_done = time.perf_counter()
+        results = self.transaction_results(transactions, scores)
+        STAGE_TIMERS['score', 'features'].observe(features_done - started)
+        STAGE_TIMERS['score', 'inference'].observe(inference_done - features_done)
+        STAGE_TIMERS['score', 'results'].observe(time.perf_counter() - inference_done)
+        return results
+
+    def transaction_results(self, transactions, scores, offset=0):
+        """Convert score_matrix rows ``offset:offset + len(transactions)`` to result dicts"""
+        results = []
+        for i, txn in enumerate(transactions, start=offset):
+            result = {'transaction_id': txn.get('transaction_id')}
+            for col in SCORE_FIELDS:
+                value = scores[col][i]
+                result[col] = value.item() if hasattr(value, 'item') else value
+            result['votes'] = {
+                'rf': result.pop('rf_prediction'),
+                'xgb': result.pop('xgb_prediction'),
+                'iso': result.pop('iso_prediction')
+            }
+            results.append(result)
+        return results
+    
+    def score_matrix(self, X_scaled):
+        """Score a scaled feature matrix with one traversal per model.
+
+        Hard labels are derived from the probabilities and anomaly scores
+        instead of calling predict() separately, and all post-processing is
+        vectorised. Returns the scoring columns in results order.
+        """
+        started = time.perf_counter()
+        n_rows = len(X_scaled)
+        rf_model, xgb_model, isolation_forest = self.scoring_models(n_rows)
+
         # Ensemble predictions with error handling
         try:
-            rf_pred = self.rf_model.predict(X_scaled)
+            rf_proba_full = rf_model.predict_proba(X_scaled)
+            rf_pred = rf_model.classes_.take(np.argmax(rf_proba_full, axis=1), axis=0)
             # Handle case where predict_proba might return single column
-            rf_proba_full = self.rf_model.predict_proba(X_scaled)
             if rf_proba_full.shape[1] > 1:
                 rf_proba = rf_proba_full[:, 1]
+                if self.probability_shift is not None:
+                    rf_proba = shift_probability(rf_proba, self.probability_shift['rf'])
             else:
                 # If only one class was predicted during training, use the single column
-                rf_proba = np.full(len(X_scaled), 0.5)  # Default to 0.5 probability
+                rf_proba = np.full(n_rows, 0.5)  # Default to 0.5 probability
         except Exception as e:
             print(f"RF prediction error: {str(e)}")
-            rf_pred = np.zeros(len(X_scaled))
-            rf_proba = np.full(len(X_scaled), 0.5)
+            rf_pred = np.zeros(n_rows)
+            rf_proba = np.full(n_rows, 0.5)
+        rf_done = time.perf_counter()
         
         try:
-            xgb_pred = self.xgb_model.predict(X_scaled)
+            xgb_proba_full = xgb_model.predict_proba(X_scaled)
             # Handle case where predict_proba might return single column
-            xgb_proba_full = self.xgb_model.predict_proba(X_scaled)
             if xgb_proba_full.shape[1] > 1:
                 xgb_proba = xgb_proba_full[:, 1]
+                if self.probability_shift is not None:
+                    xgb_proba = shift_probability(xgb_proba, self.probability_shift['xgb'])
+                xgb_pred = (xgb_proba > 0.5).astype(int)
             else:
                 # If only one class was predicted during training, use the single column
-                xgb_proba = np.full(len(X_scaled), 0.5)  # Default to 0.5 probability
+                xgb_proba = np.full(n_rows, 0.5)  # Default to 0.5 probability
+                xgb_pred = np.zeros(n_rows, dtype=int)
         except Exception as e:
             print(f"XGB prediction error: {str(e)}")
-            xgb_pred = np.zeros(len(X_scaled))
-            xgb_proba = np.full(len(X_scaled), 0.5)
+            xgb_pred = np.zeros(n_rows)
+            xgb_proba = np.full(n_rows, 0.5)
+        xgb_done = time.perf_counter()
         
-        # Anomaly detection
+        # Anomaly detection: IsolationForest.predict flags score_samples below offset_
         try:
-            anomaly_pred = self.isolation_forest.predict(X_scaled)
-            anomaly_score = -self.isolation_forest.score_samples(X_scaled)
+            raw_scores = isolation_forest.score_samples(X_scaled)
+            iso_vote = (raw_scores < isolation_forest.offset_).astype(int)
+            anomaly_score = -raw_scores
         except Exception as e:
             print(f"Anomaly detection error: {str(e)}")
-            anomaly_pred = np.ones(len(X_scaled))
-            anomaly_score = np.zeros(len(X_scaled))
+            iso_vote = np.zeros(n_rows, dtype=int)
+            anomaly_score = np.zeros(n_rows)
+        iso_done = time.perf_counter()
 
         # Ensemble voting with weighted average based on model performance
         ensemble_proba = (rf_proba + xgb_proba) / 2
         ensemble_pred = (ensemble_proba > 0.5).astype(int)
-        iso_vote = (anomaly_pred == -1).astype(int)
 
         # Normalize anomaly score to 0-1 range for display
         if len(anomaly_score) > 0:
@@ -294,61 +1175,184 @@ class FraudDetectionModel:
         else:
             iso_norm = np.zeros_like(anomaly_score)
 
-        results_df = df.copy()
-        results_df['rf_fraud_probability'] = rf_proba
-        results_df['xgb_fraud_probability'] = xgb_proba
-        results_df['ensemble_fraud_probability'] = ensemble_proba
-        results_df['is_fraud_predicted'] = ensemble_pred
-        results_df['anomaly_score'] = anomaly_score
-        results_df['is_anomaly'] = iso_vote
-        results_df['iso_fraud_probability'] = iso_norm
-        results_df['risk_level'] = results_df['ensemble_fraud_probability'].apply(
-            lambda x: 'Critical' if x > 0.7 else ('High' if x > 0.5 else ('Medium' if x > 0.3 else 'Low'))
-        )
-
-        # Add confidence score
-        results_df['confidence_score'] = np.abs(ensemble_proba - 0.5) * 2
-
-        # Store per-model decision labels for frontend explainability
-        results_df['rf_prediction'] = np.where(rf_pred == 1, 'Fraud', 'Normal')
-        results_df['xgb_prediction'] = np.where(xgb_pred == 1, 'Fraud', 'Normal')
-        results_df['iso_prediction'] = np.where(iso_vote == 1, 'Fraud', 'Normal')
-        results_df['final_decision_label'] = np.where(ensemble_pred == 1, 'Fraud', 'Normal')
-
-        agreement_state = []
-        for rf_vote, xgb_vote, iso_result in zip(rf_pred, xgb_pred, iso_vote):
-            unique_votes = len({int(rf_vote), int(xgb_vote), int(iso_result)})
-            if unique_votes == 1:
-                agreement_state.append('unanimous')
-            elif unique_votes == 2:
-                agreement_state.append('majority')
-            else:
-                agreement_state.append('split')
+        rf_vote = rf_pred.astype(int)
+        xgb_vote = xgb_pred.astype(int)
+        rf_xgb_agree = rf_vote == xgb_vote
+        any_pair_agrees = rf_xgb_agree | (rf_vote == iso_vote) | (xgb_vote == iso_vote)
 
-        results_df['agreement_state'] = agreement_state
+        scores = {
+            'rf_fraud_probability': rf_proba,
+            'xgb_fraud_probability': xgb_proba,
+            'ensemble_fraud_probability': ensemble_proba,
+            'is_fraud_predicted': ensemble_pred,
+            'anomaly_score': anomaly_score,
+            'is_anomaly': iso_vote,
+            'iso_fraud_probability': iso_norm,
+            'risk_level': np.select(
+                [ensemble_proba > 0.7, ensemble_proba > 0.5, ensemble_proba > 0.3],
+                ['Critical', 'High', 'Medium'],
+                default='Low'
+            ),
+            # Add confidence score
+            'confidence_score': np.abs(ensemble_proba - 0.5) * 2,
+            # Store per-model decision labels for frontend explainability
+            'rf_prediction': np.where(rf_vote == 1, 'Fraud', 'Normal'),
+            'xgb_prediction': np.where(xgb_vote == 1, 'Fraud', 'Normal'),
+            'iso_prediction': np.where(iso_vote == 1, 'Fraud', 'Normal'),
+            'final_decision_label': np.where(ensemble_pred == 1, 'Fraud', 'Normal'),
+            'agreement_state': np.select(
+                [rf_xgb_agree & (xgb_vote == iso_vote), any_pair_agrees],
+                ['unanimous', 'majority'],
+                default='split'
+            ),
+        }
 
-        return results_df
+        finished = time.perf_counter()
+        STAGE_TIMERS['inference', 'random_forest'].observe(rf_done - started)
+        STAGE_TIMERS['inference', 'xgboost'].observe(xgb_done - rf_done)
+        STAGE_TIMERS['inference', 'isolation_forest'].observe(iso_done - xgb_done)
+        STAGE_TIMERS['inference', 'postprocess'].observe(finished - iso_done)
+        ROWS_SCORED_TOTAL.inc(n_rows)
+        if finished > started:
+            LAST_ROWS_PER_SECOND.set(n_rows / (finished - started))
+        return scores
+    
+    def compile_inference(self, probe=None):
+        """Flatten the fitted ensembles into the array-backed inference engine"""
+        self.inference_engine = None
+        if self.compiled_inference and self.rf_model is not None and \
+                self.xgb_model is not None and self.isolation_forest is not None:
+            self.inference_engine = InferenceEngine.compile(self, probe)
+        return self.inference_engine is not None
+    
+    def scoring_models(self, n_rows=0):
+        """Return the (rf, xgb, isolation forest) objects used to score n_rows"""
+        if self.inference_engine is not None and n_rows <= self.inference_engine.MAX_BATCH_ROWS:
+            engine = self.inference_engine
+            return engine.rf, engine.xgb, engine.isolation_forest
+        return self.rf_model, self.xgb_model, self.isolation_forest
     
     def save(self, path='models'):
-        """Save trained models"""
+        """Save trained models as one model bundle (plus the feature store directory).
+
+        Both get new versioned names and ``path`` is then pointed at them
+        (see model_bundle.POINTER_FILENAME), so saving over a folder that a
+        loaded model has memory-mapped never touches the mapped files.
+        """
         os.makedirs(path, exist_ok=True)
-        joblib.dump(self.rf_model, f'{path}/rf_model.pkl')
-        joblib.dump(self.xgb_model, f'{path}/xgb_model.pkl')
-        joblib.dump(self.isolation_forest, f'{path}/if_model.pkl')
-        joblib.dump(self.scaler, f'{path}/scaler.pkl')
-        joblib.dump(self.label_encoders, f'{path}/encoders.pkl')
-        joblib.dump(self.feature_names, f'{path}/features.pkl')
+        bundle_name, store_name = new_model_files()
+        engine_arrays, engine_metadata = ({}, None)
+        if self.inference_engine is not None:
+            engine_arrays, engine_metadata = self.inference_engine.to_arrays()
+        objects = {name: getattr(self, name) for name in ESTIMATOR_ATTRIBUTES}
+        objects.update(scaler=self.scaler, label_encoders=self.label_encoders,
+                       probability_shift=self.probability_shift)
+        write_bundle(
+            os.path.join(path, bundle_name),
+            {f'engine.{name}': array for name, array in engine_arrays.items()},
+            objects,
+            metadata={
+                'feature_pipeline_version': FEATURE_PIPELINE_VERSION,
+                'feature_names': self.feature_names,
+                'inference_engine': engine_metadata,
+                'created_at': datetime.now().isoformat()
+            }
+        )
+        if self.feature_store is not None:
+            self.feature_store.save(os.path.join(path, store_name))
+        else:
+            store_name = None
+        publish_model_files(path, {'bundle': bundle_name, 'feature_store': store_name})
         print(f"Models saved to {path}")
     
-    def load(self, path='models'):
-        """Load trained models"""
+    def load(self, path='models', pointer=None):
+        """Load trained models from a model bundle, or the per-object pickles of older saves.
+
+        ``pointer`` loads that version of the folder instead of its current one.
+        """
         try:
-            self.rf_model = joblib.load(f'{path}/rf_model.pkl')
-            self.xgb_model = joblib.load(f'{path}/xgb_model.pkl')
-            self.isolation_forest = joblib.load(f'{path}/if_model.pkl')
-            self.scaler = joblib.load(f'{path}/scaler.pkl')
-            self.label_encoders = joblib.load(f'{path}/encoders.pkl')
-            self.feature_names = joblib.load(f'{path}/features.pkl')
+            bundle_path, store_path = model_files(path, pointer)
+            if os.path.exists(bundle_path):
+                self._load_bundle(bundle_path)
+            else:
+                self._load_pickles(path)
+            # Models saved before the feature store existed keep the groupby path
+            self.feature_store = EntityFeatureStore.load(store_path) if store_path and os.path.isdir(store_path) else None
             print(f"Models loaded from {path}")
         except Exception as e:
-            print(f"Could not load models: {str(e)}")
\ No newline at end of file
+            print(f"Could not load models: {str(e)}")
+
+    def _load_bundle(self, bundle_path):
+        # Rejects truncated, corrupt and other-format files before anything is replaced
+        bundle = ModelBundle(bundle_path)
+        metadata = bundle.metadata
+        if metadata.get('feature_pipeline_version') != FEATURE_PIPELINE_VERSION:
+            raise BundleError(
+                f"{bundle_path} was built by feature pipeline {metadata.get('feature_pipeline_version')}, "
+                f"expected {FEATURE_PIPELINE_VERSION}"
+            )
+        scaler = bundle.load_object('scaler')
+        label_encoders = bundle.load_object('label_encoders')
+        probability_shift = bundle.load_object('probability_shift')
+        engine = None
+        if self.compiled_inference and metadata.get('inference_engine'):
+            engine = InferenceEngine.from_arrays(bundle.arrays('engine.'), metadata['inference_engine'])
+
+        for name in ESTIMATOR_ATTRIBUTES:
+            setattr(self, name, None)
+        self._bundle = bundle
+        self._deferred = set(ESTIMATOR_ATTRIBUTES)
+        self.bundle_checksum = bundle.checksum
+        self.scaler = scaler
+        self.label_encoders = label_encoders
+        self.feature_names = metadata['feature_names']
+        self.probability_shift = probability_shift
+        self.inference_engine = engine
+        if engine is None:
+            # Every batch goes through the fitted objects, so read them now
+            for name in ESTIMATOR_ATTRIBUTES:
+                getattr(self, name)
+
+    def _load_pickles(self, path):
+        self.rf_model = joblib.load(f'{path}/rf_model.pkl')
+        self.xgb_model = joblib.load(f'{path}/xgb_model.pkl')
+        self.isolation_forest = joblib.load(f'{path}/if_model.pkl')
+        self.scaler = joblib.load(f'{path}/scaler.pkl')
+        # Older bundles pickled sklearn LabelEncoders; keep their codes
+        self.label_encoders = {
+            col: CategoryVocabulary.from_label_encoder(encoder) if isinstance(encoder, LabelEncoder) else encoder
+            for col, encoder in joblib.load(f'{path}/encoders.pkl').items()
+        }
+        self.feature_names = joblib.load(f'{path}/features.pkl')
+        calibration_path = f'{path}/calibration.pkl'
+        self.probability_shift = joblib.load(calibration_path) if os.path.exists(calibration_path) else None
+        self._bundle = None
+        self.bundle_checksum = None
+        self.compile_inference()
+
+
+def train_model_bundle(report, filepath, fraud_label_col, path, params=None, sampling=None, cache=None):
+    """Job task: train a fresh model on a CSV and save the bundle to ``path``.
+
+    ``sampling`` holds train() keywords for negative downsampling
+    (``negative_rate``, ``strata``); ``cache`` is an optional FeatureMatrixCache.
+    """
+    report('loading', 0.0)
+    print(f"Training on {filepath}...")
+    model = FraudDetectionModel()
+    stats = model.train_file(filepath, fraud_label_col, progress=report, params=params, cache=cache, **(sampling or {}))
+    report('saving', 0.9)
+    model.save(path)
+    return stats
+
+
+def train_incremental_bundle(report, model, filepath, fraud_label_col, path, new_trees=10, cache=None):
+    """Job task: warm-start a copy of the live model on a CSV and save it to ``path``"""
+    report('loading', 0.0)
+    df = cache.read_frame(filepath, columns=training_columns(fraud_label_col)) if cache is not None else pd.read_csv(filepath)
+    print(f"Incremental training with {len(df)} samples...")
+    source = cache.content_hash(filepath) if cache is not None else file_sha256(filepath)
+    stats = model.train_incremental(df, fraud_label_col, new_trees=new_trees, progress=report, source=source)
+    report('saving', 0.9)
+    model.save(path)
+    return stats
\ No newline at end of file
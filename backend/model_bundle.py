@@ -0,0 +1,266 @@
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import shutil
+import struct
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+BUNDLE_MAGIC = b'FRAUDMB\x00'
+BUNDLE_FORMAT = 1
+BUNDLE_FILENAME = 'model.bundle'
+STORE_DIRNAME = 'feature_store'
+# A model folder names its current bundle and feature store in this file.
+# Every save writes new versioned names and then switches the pointer, so a
+# file some loaded model has memory-mapped is never renamed over or deleted
+# in place; Windows refuses both while a mapping is open
+POINTER_FILENAME = 'current.json'
+REPLACE_ATTEMPTS = 5
+# Payload entries start on cache-line boundaries so arrays can be viewed in place
+ALIGNMENT = 64
+HEADER = struct.Struct('<8sQ')
+HASH_CHUNK_BYTES = 1 << 20
+
+
+class BundleError(ValueError):
+    """A model bundle that is truncated, corrupt, or written by another format version"""
+
+
+def _aligned(offset):
+    return offset + (-offset % ALIGNMENT)
+
+
+def write_bundle(path, arrays, objects, metadata=None):
+    """Write one bundle file: header, JSON manifest, then the aligned payload.
+
+    ``arrays`` (name -> ndarray) are stored raw so readers can map them
+    without copying; ``objects`` (name -> picklable) are stored as pickles.
+    The manifest records the format version, every entry's location and the
+    payload's SHA-256. The file is written next to ``path`` and renamed into
+    place, so a reader never sees a partial bundle; ``path`` should be a new
+    name (see new_model_files), as a mapped bundle cannot be replaced on Windows.
+    """
+    entries, blobs, size = {}, [], 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        if array.dtype.hasobject:
+            raise TypeError(f"Array {name} has object dtype; store it as an object")
+        size = _aligned(size)
+        entries[name] = {'kind': 'array', 'offset': size, 'nbytes': array.nbytes,
+                         'dtype': array.dtype.str, 'shape': list(array.shape)}
+        blobs.append((size, memoryview(array.reshape(-1).view(np.uint8))))
+        size += array.nbytes
+    for name, value in objects.items():
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        size = _aligned(size)
+        entries[name] = {'kind': 'object', 'offset': size, 'nbytes': len(data)}
+        blobs.append((size, data))
+        size += len(data)
+
+    payload = bytearray(size)
+    for offset, data in blobs:
+        payload[offset:offset + len(data)] = data
+    manifest = json.dumps({
+        'format': BUNDLE_FORMAT,
+        'payload_bytes': size,
+        'sha256': hashlib.sha256(payload).hexdigest(),
+        'entries': entries,
+        'metadata': metadata or {}
+    }, sort_keys=True, default=str).encode('utf-8')
+
+    header = HEADER.pack(BUNDLE_MAGIC, len(manifest)) + manifest
+    tmp_path = f'{path}.tmp-{uuid.uuid4().hex[:8]}'
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(b'\0' * (_aligned(len(header)) - len(header)))
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def read_manifest(path):
+    """Parse a bundle's header and manifest without touching the payload.
+
+    Returns ``(manifest, payload_start)``; raises BundleError when the file
+    is not a bundle, is from another format version, or is truncated.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise BundleError(f"{path} is truncated")
+        magic, manifest_bytes = HEADER.unpack(header)
+        if magic != BUNDLE_MAGIC:
+            raise BundleError(f"{path} is not a model bundle")
+        raw_manifest = f.read(manifest_bytes)
+        file_size = os.fstat(f.fileno()).st_size
+    if len(raw_manifest) < manifest_bytes:
+        raise BundleError(f"{path} is truncated")
+    try:
+        manifest = json.loads(raw_manifest)
+    except ValueError as e:
+        raise BundleError(f"{path} has an unreadable manifest: {str(e)}")
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise BundleError(f"{path} is bundle format {manifest.get('format')}, expected {BUNDLE_FORMAT}")
+    payload_start = _aligned(HEADER.size + manifest_bytes)
+    if file_size != payload_start + manifest['payload_bytes']:
+        raise BundleError(f"{path} is {file_size} bytes, expected {payload_start + manifest['payload_bytes']}")
+    return manifest, payload_start
+
+
+class ModelBundle:
+    """Read-only view of a bundle file through a shared ``mmap``.
+
+    Arrays come back as read-only views into the mapping, so every process
+    that opens the same file shares its physical pages via the page cache.
+    Saves and promotions write new versioned files instead of replacing
+    this one, and on POSIX the mapping outlives the file's later removal.
+    """
+
+    def __init__(self, path, verify=True):
+        self.path = path
+        self.manifest, self._payload_start = read_manifest(path)
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if verify:
+            self.verify()
+
+    def __getstate__(self):
+        raise TypeError("ModelBundle wraps an mmap and cannot be pickled; load the objects first")
+
+    @property
+    def checksum(self):
+        return self.manifest['sha256']
+
+    @property
+    def metadata(self):
+        return self.manifest['metadata']
+
+    def verify(self):
+        """Check the payload against the manifest's SHA-256"""
+        sha = hashlib.sha256()
+        payload = memoryview(self._mmap)[self._payload_start:]
+        try:
+            for start in range(0, len(payload), HASH_CHUNK_BYTES):
+                sha.update(payload[start:start + HASH_CHUNK_BYTES])
+        finally:
+            payload.release()
+        if sha.hexdigest() != self.checksum:
+            raise BundleError(f"{self.path} failed its checksum")
+
+    def _entry(self, name, kind):
+        entry = self.manifest['entries'].get(name)
+        if entry is None or entry['kind'] != kind:
+            raise KeyError(f"{self.path} has no {kind} named {name}")
+        return entry
+
+    def array(self, name):
+        entry = self._entry(name, 'array')
+        dtype = np.dtype(entry['dtype'])
+        count = entry['nbytes'] // dtype.itemsize
+        array = np.frombuffer(self._mmap, dtype=dtype, count=count,
+                              offset=self._payload_start + entry['offset'])
+        return array.reshape(entry['shape'])
+
+    def arrays(self, prefix):
+        """Every array whose name starts with ``prefix``, keyed without it"""
+        return {
+            name[len(prefix):]: self.array(name)
+            for name, entry in self.manifest['entries'].items()
+            if entry['kind'] == 'array' and name.startswith(prefix)
+        }
+
+    def load_object(self, name):
+        entry = self._entry(name, 'object')
+        start = self._payload_start + entry['offset']
+        return pickle.loads(self._mmap[start:start + entry['nbytes']])
+
+
+def new_model_files():
+    """Versioned (bundle, feature store directory) names for one save"""
+    version = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    return f'model-{version}.bundle', f'{STORE_DIRNAME}-{version}'
+
+
+def read_pointer(path):
+    """``{'bundle': name, 'feature_store': name or None}`` for a model folder, or None for older saves"""
+    try:
+        with open(os.path.join(path, POINTER_FILENAME), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def model_files(path, pointer=None):
+    """(bundle path, feature store directory or None) of the model saved in ``path``.
+
+    ``pointer`` selects a version other than the one ``path`` points at;
+    folders saved before pointers existed use the fixed names.
+    """
+    pointer = pointer or read_pointer(path)
+    if pointer is None:
+        return os.path.join(path, BUNDLE_FILENAME), os.path.join(path, STORE_DIRNAME)
+    store = pointer.get('feature_store')
+    return os.path.join(path, pointer['bundle']), os.path.join(path, store) if store else None
+
+
+def _replace_file(src, dst):
+    # On Windows a reader holding ``dst`` open for a moment makes this fail; retry briefly
+    for attempt in range(REPLACE_ATTEMPTS):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if attempt == REPLACE_ATTEMPTS - 1:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+
+def publish_model_files(path, pointer):
+    """Point the model folder ``path`` at ``pointer``'s files, then prune the old ones"""
+    tmp_path = os.path.join(path, f'{POINTER_FILENAME}.tmp-{uuid.uuid4().hex[:8]}')
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(pointer, f)
+        _replace_file(tmp_path, os.path.join(path, POINTER_FILENAME))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    prune_model_files(path)
+
+
+def prune_model_files(path):
+    """Remove the bundles and feature stores in ``path`` its pointer no longer names.
+
+    Best effort: on Windows a file still mapped by a loaded model cannot be
+    removed, so it is left for a later prune. A feature store directory is
+    renamed aside before removal, so it is never left half-deleted under a
+    name a loader might pick.
+    """
+    if read_pointer(path) is None:
+        return
+    current = {os.path.basename(name) for name in model_files(path) if name}
+    for name in os.listdir(path):
+        full = os.path.join(path, name)
+        if name in current:
+            continue
+        try:
+            if os.path.isfile(full) and (name == BUNDLE_FILENAME or (name.startswith('model-') and name.endswith('.bundle'))):
+                os.remove(full)
+            elif os.path.isdir(full) and (name == STORE_DIRNAME or name.startswith(f'{STORE_DIRNAME}-')):
+                retired = os.path.join(path, f'.retired-{name}-{uuid.uuid4().hex[:8]}')
+                os.rename(full, retired)
+                shutil.rmtree(retired, ignore_errors=True)
+            elif name.startswith('.retired-') and os.path.isdir(full):
+                shutil.rmtree(full, ignore_errors=True)
+        except OSError as e:
+            print(f"Could not remove superseded model file {full}: {str(e)}")
@@ -0,0 +1,157 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from model_bundle import model_files
+
+
+def snapshot_bytes(path):
+    """Approximate resident size of a saved model: its bundle and feature store files"""
+    if path is None or not os.path.isdir(path):
+        return 0
+    bundle_path, store_path = model_files(path)
+    if os.path.exists(bundle_path):
+        total = os.path.getsize(bundle_path)
+    else:
+        # Older saves: one pickle per object
+        total = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path) if name.endswith('.pkl'))
+    for folder, _, names in os.walk(store_path or ''):
+        total += sum(os.path.getsize(os.path.join(folder, name)) for name in names)
+    return total
+
+
+class ModelSnapshot:
+    """One loaded model version under a registry name.
+
+    A snapshot's model is never retrained or reloaded in place: deploying
+    a new version registers a new snapshot, so a request holding this one
+    keeps scoring against a consistent set of estimators, scaler and
+    encoders until it finishes. Scoring only reads the model's feature
+    store; explicit ingests (which the store guards) are the one exception.
+    """
+
+    def __init__(self, name, model, version=None, path=None, nbytes=None):
+        self.name = name
+        self.model = model
+        self.version = version
+        self.path = path
+        self.nbytes = snapshot_bytes(path) if nbytes is None else int(nbytes)
+        self.loaded_at = datetime.now().isoformat()
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'version': self.version,
+            'path': self.path,
+            'bytes': self.nbytes,
+            'loaded_at': self.loaded_at,
+            'features': len(self.model.feature_names or [])
+        }
+
+
+class ModelRegistry:
+    """Named model snapshots kept resident under a memory budget, with one active.
+
+    ``active`` is a plain attribute holding the snapshot unnamed requests
+    score against; activation replaces it in a single assignment, so a
+    reader sees either the old snapshot or the new one. Other snapshots
+    stay resident in least-recently-used order until their total size
+    passes ``max_bytes``; the active snapshot is never evicted. Eviction
+    only drops the registry's reference, so requests already holding a
+    snapshot finish on it. ``loader(name)`` builds a snapshot on a miss and
+    runs outside the registry lock, so a slow load never blocks scoring.
+    """
+
+    def __init__(self, loader, max_bytes, active=None):
+        self.loader = loader
+        self.max_bytes = int(max_bytes)
+        self.active = active
+        self._snapshots = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'loads': 0, 'evictions': 0}
+
+    def get(self, name):
+        """Snapshot for ``name``, loading it on first use (concurrent misses load once)"""
+        with self._lock:
+            snapshot = self._lookup(name)
+            if snapshot is not None:
+                return snapshot
+            loading = self._loading.setdefault(name, threading.Lock())
+        try:
+            with loading:
+                with self._lock:
+                    snapshot = self._lookup(name)
+                if snapshot is None:
+                    snapshot = self.loader(name)
+                    with self._lock:
+                        self._stats['loads'] += 1
+                    self.put(snapshot)
+        finally:
+            with self._lock:
+                self._loading.pop(name, None)
+        return snapshot
+
+    def _lookup(self, name):
+        snapshot = self._snapshots.get(name)
+        if snapshot is not None:
+            self._snapshots.move_to_end(name)
+            self._stats['hits'] += 1
+        return snapshot
+
+    def put(self, snapshot, activate=False):
+        """Register (or replace) a snapshot under its name, optionally making it active"""
+        with self._lock:
+            self._snapshots[snapshot.name] = snapshot
+            self._snapshots.move_to_end(snapshot.name)
+            if activate:
+                self.active = snapshot
+            self._evict()
+        return snapshot
+
+    def activate(self, name):
+        """Make the named snapshot active, loading it first if needed"""
+        snapshot = self.get(name)
+        with self._lock:
+            # Re-register in case it was evicted between get() and here
+            self._snapshots[name] = snapshot
+            self.active = snapshot
+            self._evict()
+        return snapshot
+
+    def discard(self, name):
+        """Forget a resident snapshot (its files changed); the active one is kept"""
+        with self._lock:
+            snapshot = self._snapshots.get(name)
+            if snapshot is not None and snapshot is not self.active:
+                del self._snapshots[name]
+
+    def _evict(self):
+        total = sum(snapshot.nbytes for snapshot in self._snapshots.values())
+        for name in list(self._snapshots):
+            if total <= self.max_bytes:
+                break
+            snapshot = self._snapshots[name]
+            if snapshot is self.active:
+                continue
+            del self._snapshots[name]
+            total -= snapshot.nbytes
+            self._stats['evictions'] += 1
+
+    def list(self):
+        """Resident snapshots, most recently used first"""
+        with self._lock:
+            snapshots = list(self._snapshots.values())
+        return list(reversed(snapshots))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'resident': len(self._snapshots),
+                'bytes': sum(snapshot.nbytes for snapshot in self._snapshots.values()),
+                'max_bytes': self.max_bytes,
+                'active': self.active.name if self.active is not None else None
+            })
+        return stats
@@ -0,0 +1,94 @@
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from metrics import ROWS_SCORED
+from ml_models import slice_batch_statistics
+
+# Model held by each pool worker; set once by the pool initializer
+_worker_model = None
+
+
+def _init_worker(model):
+    """Install the model in a worker; one process per core, so no inner threading"""
+    global _worker_model
+    # Workers only read the feature store snapshot taken at pool start
+    model.feature_store_updates = False
+    for estimator in (model.rf_model, model.isolation_forest):
+        if estimator is not None:
+            estimator.n_jobs = 1
+    if model.xgb_model is not None:
+        model.xgb_model.set_params(n_jobs=1)
+    _worker_model = model
+
+
+def worker_model():
+    """Return the model installed in the current pool worker"""
+    return _worker_model
+
+
+def _predict_shard(shard, batch_stats=None):
+    return _worker_model.predict(shard, batch_stats)
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+class ScoringPool:
+    """Process pool whose workers each hold one copy of a trained model.
+
+    On platforms with ``fork`` the workers inherit the parent's model pages
+    copy-on-write; elsewhere the model is pickled once per worker at start-up
+    rather than once per task.
+    """
+
+    def __init__(self, model, workers=None):
+        self.model = model
+        self.workers = max(1, int(workers or default_workers()))
+        context = None
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(model,)
+        )
+
+    def submit(self, fn, *args):
+        return self.executor.submit(fn, *args)
+
+    def predict(self, df, shard_rows=None):
+        """Score ``df`` in contiguous shards and return results in input order.
+
+        Batch-level statistics are taken from the whole of ``df`` and sent
+        with every shard, so the results match ``model.predict(df)``.
+        """
+        n_rows = len(df)
+        if n_rows == 0:
+            return self.submit(_predict_shard, df).result()
+        shard_rows = shard_rows or math.ceil(n_rows / self.workers)
+        batch_stats = self.model.batch_statistics(df)
+        futures = [
+            self.submit(_predict_shard, df.iloc[start:start + shard_rows].reset_index(drop=True),
+                        slice_batch_statistics(batch_stats, start, start + shard_rows))
+            for start in range(0, n_rows, shard_rows)
+        ]
+        results = pd.concat([future.result() for future in futures], ignore_index=True)
+        results.index = df.index
+        # Workers record their own metrics; count the rows where /api/metrics can see them
+        ROWS_SCORED.labels().inc(n_rows)
+        return results
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
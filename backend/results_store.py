@@ -0,0 +1,318 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import closing
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+PROB_COL = 'ensemble_fraud_probability'
+# Indexes built for each run that has their columns. risk_level leads a
+# composite so "one risk level, by probability" pages straight off the index
+INDEXES = [(PROB_COL,), ('risk_level', PROB_COL), ('customer_id',), ('merchant_id',), ('timestamp',)]
+# Columns accepted as ``key=value`` equality filters (comma-separated values match any)
+EQUALITY_FILTERS = ['risk_level', 'customer_id', 'merchant_id', 'merchant_category', 'transaction_type']
+# Query parameter -> (column, operator) range filters
+RANGE_FILTERS = {
+    'min_probability': (PROB_COL, '>='),
+    'max_probability': (PROB_COL, '<='),
+    'min_amount': ('amount', '>='),
+    'max_amount': ('amount', '<='),
+    'start': ('timestamp', '>='),
+    'end': ('timestamp', '<=')
+}
+INGEST_CHUNK_ROWS = 50000
+# A run is 'pending' while its rows are written, then 'complete' (or 'failed')
+RUN_STATUSES = ('pending', 'complete', 'failed')
+RUN_COLUMNS = 'run_id, created_at, rows, columns, metadata, status, error'
+# A run still pending this long was cut off (e.g. by a restart) and may be pruned
+PENDING_TIMEOUT_SECONDS = 24 * 3600
+
+
+class ResultsQueryError(ValueError):
+    """A results query naming an unknown column, sort order or malformed cursor"""
+
+
+class ResultsNotReady(Exception):
+    """A query for a run whose rows are still being stored, or failed to store"""
+
+    def __init__(self, run):
+        super().__init__(f"Run {run['run_id']} is {run['status']}")
+        self.run = run
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _encode_cursor(value, rowid):
+    raw = json.dumps([value, rowid]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def _decode_cursor(cursor):
+    try:
+        value, rowid = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return value, int(rowid)
+    except (ValueError, TypeError):
+        raise ResultsQueryError('Invalid cursor')
+
+
+class ResultsStore:
+    """Prediction runs persisted to one SQLite file for server-side browsing.
+
+    Each run gets its own table (``run_<id>``) holding every scored row,
+    indexed per INDEXES, plus a row in ``runs`` whose ``status`` is
+    ``pending`` until the table is complete, so a run is listed as soon as
+    it is started but never read half-loaded. save_in_background returns
+    the run id straight away and writes the rows on a daemon thread; writes
+    run one at a time. Reads are filtered, sorted and keyset-paginated: the
+    cursor carries the last row's sort value and rowid, so every page is
+    an index range scan however deep the reader has paged. Only the
+    newest ``max_runs`` finished runs are kept; pending ones are never
+    pruned under their writer. A connection is opened per call, so
+    the store can be shared by request threads and job threads alike.
+    """
+
+    def __init__(self, path, max_runs=20):
+        self.path = path
+        self.max_runs = int(max_runs)
+        self._write_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with closing(self._connect()) as conn:
+            # WAL lets readers page through runs while a new one is written
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, created_at TEXT, '
+                "rows INTEGER, columns TEXT, metadata TEXT, status TEXT DEFAULT 'complete', error TEXT)"
+            )
+            # Stores created before runs had a status only ever held complete runs
+            existing = {row[1] for row in conn.execute('PRAGMA table_info(runs)')}
+            if 'status' not in existing:
+                conn.execute("ALTER TABLE runs ADD COLUMN status TEXT DEFAULT 'complete'")
+            if 'error' not in existing:
+                conn.execute('ALTER TABLE runs ADD COLUMN error TEXT')
+            conn.commit()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def reserve(self, metadata=None):
+        """List a new ``pending`` run and return its id (save fills it in)"""
+        run_id = uuid.uuid4().hex[:12]
+        with closing(self._connect()) as conn:
+            conn.execute(
+                f'INSERT INTO runs ({RUN_COLUMNS}) VALUES (?, ?, 0, ?, ?, ?, NULL)',
+                (run_id, datetime.now().isoformat(), '[]', json.dumps(metadata or {}, default=str), 'pending')
+            )
+            conn.commit()
+        return run_id
+
+    def save(self, frames, metadata=None, run_id=None):
+        """Store an iterable of result frames as a run and return its id.
+
+        ``run_id`` completes a run from reserve(); otherwise a new one is
+        started. A failed write leaves the run listed as ``failed``.
+        """
+        if run_id is None:
+            run_id = self.reserve(metadata)
+        table = _quote(f'run_{run_id}')
+        rows, columns = 0, None
+        with self._write_lock, closing(self._connect()) as conn:
+            try:
+                for frame in frames:
+                    if columns is None:
+                        columns = [str(col) for col in frame.columns]
+                    frame.to_sql(f'run_{run_id}', conn, if_exists='append', index=False)
+                    rows += len(frame)
+                if columns is None:
+                    raise ValueError('No result frames to store')
+                # Indexes are built once after the bulk insert, which is far
+                # cheaper than maintaining them row by row
+                for index_columns in INDEXES:
+                    if all(col in columns for col in index_columns):
+                        name = _quote(f'run_{run_id}_' + '_'.join(index_columns))
+                        conn.execute(f'CREATE INDEX {name} ON {table} ({", ".join(map(_quote, index_columns))})')
+                conn.execute(
+                    "UPDATE runs SET rows = ?, columns = ?, status = 'complete' WHERE run_id = ?",
+                    (rows, json.dumps(columns), run_id)
+                )
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                conn.execute(f'DROP TABLE IF EXISTS {table}')
+                conn.execute("UPDATE runs SET status = 'failed', error = ? WHERE run_id = ?", (str(e), run_id))
+                conn.commit()
+                raise
+            self._prune(conn)
+        return run_id
+
+    def save_frame(self, df, metadata=None, run_id=None):
+        return self.save([df], metadata, run_id)
+
+    def save_csv(self, filepath, metadata=None, chunk_rows=INGEST_CHUNK_ROWS, run_id=None):
+        """Store a results CSV (e.g. a streamed run's output) chunk by chunk"""
+        return self.save(pd.read_csv(filepath, chunksize=chunk_rows), metadata, run_id)
+
+    def save_in_background(self, results, metadata=None, chunk_rows=INGEST_CHUNK_ROWS):
+        """Start storing ``results`` (a frame, or a results CSV path) on a daemon
+        thread and return the run id at once; the run is ``pending`` until done"""
+        run_id = self.reserve(metadata)
+
+        def run():
+            try:
+                if isinstance(results, str):
+                    self.save_csv(results, metadata, chunk_rows, run_id)
+                else:
+                    self.save_frame(results, metadata, run_id)
+            except Exception as e:
+                print(f"Results store error for run {run_id}: {str(e)}")
+
+        threading.Thread(target=run, name=f'results-{run_id}', daemon=True).start()
+        return run_id
+
+    def _prune(self, conn):
+        # Pending runs are neither counted nor dropped: their writer may be
+        # inserting rows that a reader is already paging towards. Only one
+        # still pending after PENDING_TIMEOUT_SECONDS (cut off by a restart)
+        # is treated as finished
+        abandoned = (datetime.now() - timedelta(seconds=PENDING_TIMEOUT_SECONDS)).isoformat()
+        stale = conn.execute(
+            "SELECT run_id FROM runs WHERE status != 'pending' OR created_at < ? "
+            'ORDER BY created_at DESC LIMIT -1 OFFSET ?', (abandoned, self.max_runs)
+        ).fetchall()
+        for (run_id,) in stale:
+            conn.execute(f'DROP TABLE IF EXISTS {_quote(f"run_{run_id}")}')
+            conn.execute('DELETE FROM runs WHERE run_id = ?', (run_id,))
+        conn.commit()
+
+    def _run_dict(self, row):
+        run_id, created_at, rows, columns, metadata, status, error = row
+        run = {
+            'run_id': run_id,
+            'created_at': created_at,
+            'rows': rows,
+            'columns': json.loads(columns),
+            'status': status,
+            **json.loads(metadata)
+        }
+        if error:
+            run['error'] = error
+        return run
+
+    def runs(self):
+        """Stored runs (pending and failed ones included), newest first"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(f'SELECT {RUN_COLUMNS} FROM runs ORDER BY created_at DESC').fetchall()
+        return [self._run_dict(row) for row in rows]
+
+    def run(self, run_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute(f'SELECT {RUN_COLUMNS} FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+        return self._run_dict(row) if row is not None else None
+
+    def query(self, run_id, filters=None, sort=None, descending=None, limit=100, cursor=None, count=False):
+        """One page of a run's rows.
+
+        ``filters`` maps EQUALITY_FILTERS names to a value (or a list of
+        values) and RANGE_FILTERS names to a bound. Rows come back ordered
+        by ``sort`` (default: probability, highest first) then by row
+        number; pass the returned ``next_cursor`` to get the next page.
+        Returns None when the run does not exist; raises ResultsNotReady
+        while it is still pending (or if it failed).
+        """
+        run = self.run(run_id)
+        if run is None:
+            return None
+        if run['status'] != 'complete':
+            raise ResultsNotReady(run)
+        columns = run['columns']
+        sort = sort or (PROB_COL if PROB_COL in columns else None)
+        if descending is None:
+            descending = sort == PROB_COL
+        if sort is not None and sort not in columns:
+            raise ResultsQueryError(f'Unknown sort column: {sort}')
+
+        clauses, params = [], []
+        for name, value in (filters or {}).items():
+            if value is None or value == '' or value == []:
+                continue
+            if name in EQUALITY_FILTERS:
+                if name not in columns:
+                    raise ResultsQueryError(f'Run {run_id} has no column {name}')
+                values = value if isinstance(value, (list, tuple)) else [value]
+                # Values are bound as text; SQLite converts them to the column's
+                # numeric affinity where it has one, so ids match either way
+                clauses.append(f'{_quote(name)} IN ({", ".join("?" * len(values))})')
+                params.extend(str(item) for item in values)
+            elif name in RANGE_FILTERS:
+                column, operator = RANGE_FILTERS[name]
+                if column not in columns:
+                    raise ResultsQueryError(f'Run {run_id} has no column {column}')
+                clauses.append(f'{_quote(column)} {operator} ?')
+                params.append(value if column == 'timestamp' else float(value))
+            else:
+                raise ResultsQueryError(f'Unknown filter: {name}')
+
+        filter_sql = ' AND '.join(clauses) or '1'
+        page_clauses, page_params = [], []
+        if cursor:
+            last_value, last_rowid = _decode_cursor(cursor)
+            page_clauses.append(self._after(sort, last_value, last_rowid, descending))
+            page_params.extend(self._after_params(sort, last_value, last_rowid))
+
+        direction = 'DESC' if descending else 'ASC'
+        order = f'{_quote(sort)} {direction}, rowid {direction}' if sort else f'rowid {direction}'
+        where = ' AND '.join([f'({filter_sql})'] + page_clauses)
+        table = _quote(f'run_{run_id}')
+        limit = max(1, int(limit))
+        with closing(self._connect()) as conn:
+            cur = conn.execute(
+                f'SELECT rowid AS _row, * FROM {table} WHERE {where} ORDER BY {order} LIMIT ?',
+                params + page_params + [limit + 1]
+            )
+            names = [desc[0] for desc in cur.description]
+            rows = [dict(zip(names, row)) for row in cur.fetchall()]
+            total = None
+            if count:
+                total = conn.execute(f'SELECT COUNT(*) FROM {table} WHERE {filter_sql}', params).fetchone()[0]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = _encode_cursor(last[sort] if sort else None, last['_row'])
+        page = {'run': run, 'results': rows, 'next_cursor': next_cursor, 'sort': sort,
+                'order': 'desc' if descending else 'asc'}
+        if count:
+            page['count'] = total
+        return page
+
+    @staticmethod
+    def _after(sort, value, rowid, descending):
+        """WHERE clause for rows after (value, rowid) in the page order.
+
+        SQLite sorts NULLs first ascending and last descending, so a NULL
+        sort value needs its own branch.
+        """
+        op = '<' if descending else '>'
+        if sort is None:
+            return f'rowid {op} ?'
+        col = _quote(sort)
+        if value is None:
+            if descending:
+                return f'({col} IS NULL AND rowid < ?)'
+            return f'(({col} IS NULL AND rowid > ?) OR {col} IS NOT NULL)'
+        tail = f' OR {col} IS NULL' if descending else ''
+        return f'({col} {op} ? OR ({col} = ? AND rowid {op} ?){tail})'
+
+    @staticmethod
+    def _after_params(sort, value, rowid):
+        if sort is None or value is None:
+            return [rowid]
+        return [value, value, rowid]
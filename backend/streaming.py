@@ -0,0 +1,619 @@
+import os
+import shutil
+import tempfile
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from data_processor import DataProcessor
+from ml_models import BATCH_STAT_COLUMNS, FileStatistics
+from parallel_scoring import ScoringPool, worker_model
+from metrics import ROWS_SCORED
+
+PROB_COL = 'ensemble_fraud_probability'
+PREVIEW_ROWS = 500
+ALERT_LIMIT = 100
+
+
+def numeric_column(df, col, default=0.0):
+    """Return a column as floats, or a constant column when it is missing"""
+    if col not in df.columns:
+        return pd.Series(default, index=df.index, dtype=float)
+    return pd.to_numeric(df[col], errors='coerce').fillna(default)
+
+
+def string_column(df, col, default='--'):
+    if col not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    return df[col].astype(str)
+
+
+class GroupedSums:
+    """Per-key running sums that stay compact across many chunks.
+
+    Each update contributes an already grouped frame; partial frames are only
+    concatenated and re-grouped once they outgrow the consolidated table, so
+    folding N chunks does not re-align the whole table N times.
+    """
+
+    def __init__(self, columns, compact_rows=250000):
+        self.columns = list(columns)
+        self.compact_rows = compact_rows
+        self.frame = None
+        self.pending = []
+        self.pending_rows = 0
+
+    def add(self, keys, values):
+        """Group ``values`` (dict of column -> array) by ``keys`` and fold them in"""
+        chunk = pd.DataFrame(values, columns=self.columns)
+        chunk.index = pd.Index(np.asarray(keys), name='key')
+        self.add_grouped(chunk.groupby(level=0, sort=False).sum())
+
+    def add_grouped(self, grouped):
+        self.pending.append(grouped)
+        self.pending_rows += len(grouped)
+        current_rows = len(self.frame) if self.frame is not None else 0
+        if self.pending_rows > max(self.compact_rows, current_rows):
+            self.compact()
+
+    def compact(self):
+        parts = ([self.frame] if self.frame is not None else []) + self.pending
+        if parts:
+            self.frame = pd.concat(parts).groupby(level=0, sort=False).sum()
+        self.pending = []
+        self.pending_rows = 0
+
+    def merge(self, other):
+        other.compact()
+        if other.frame is not None:
+            self.add_grouped(other.frame)
+
+    def result(self):
+        self.compact()
+        if self.frame is None:
+            return pd.DataFrame(columns=self.columns, index=pd.Index([], name='key'))
+        return self.frame
+
+
+class StatisticsAccumulator:
+    """Mergeable equivalent of ``DataProcessor.get_statistics``"""
+
+    def __init__(self):
+        self.total = 0
+        self.frauds = 0
+        self.anomalies = 0
+        self.prob_sum = 0.0
+        self.prob_max = None
+        self.high_risk = 0
+        self.confidence_sum = 0.0
+        self.high_confidence = 0
+        self.has_amount = False
+        self.risk_levels = GroupedSums(['count'])
+        self.categories = GroupedSums(['count', 'fraud'])
+        self.band_counts = np.zeros(len(DataProcessor.AMOUNT_BAND_LABELS), dtype=np.int64)
+        self.band_frauds = np.zeros(len(DataProcessor.AMOUNT_BAND_LABELS))
+
+    def update(self, df):
+        if df.empty:
+            return
+        fraud = numeric_column(df, 'is_fraud_predicted')
+        probability = numeric_column(df, PROB_COL)
+        confidence = numeric_column(df, 'confidence_score')
+
+        self.total += len(df)
+        self.frauds += fraud.sum()
+        self.anomalies += numeric_column(df, 'is_anomaly').sum()
+        self.prob_sum += float(probability.sum())
+        chunk_max = float(probability.max())
+        self.prob_max = chunk_max if self.prob_max is None else max(self.prob_max, chunk_max)
+        self.high_risk += int((probability > 0.7).sum())
+        self.confidence_sum += float(confidence.sum())
+        self.high_confidence += int((confidence > 0.8).sum())
+
+        risk_level = string_column(df, 'risk_level', 'Low')
+        self.risk_levels.add(risk_level, {'count': np.ones(len(df), dtype=np.int64)})
+        category = string_column(df, 'merchant_category', 'unknown')
+        self.categories.add(category, {'count': np.ones(len(df), dtype=np.int64), 'fraud': fraud.values})
+
+        if 'amount' in df.columns:
+            self.has_amount = True
+            bands = pd.cut(
+                numeric_column(df, 'amount'),
+                bins=DataProcessor.AMOUNT_BAND_BINS,
+                labels=DataProcessor.AMOUNT_BAND_LABELS
+            ).cat.codes.values
+            valid = bands >= 0
+            n_bands = len(self.band_counts)
+            self.band_counts += np.bincount(bands[valid], minlength=n_bands)
+            self.band_frauds += np.bincount(bands[valid], weights=fraud.values[valid], minlength=n_bands)
+
+    def merge(self, other):
+        self.total += other.total
+        self.frauds += other.frauds
+        self.anomalies += other.anomalies
+        self.prob_sum += other.prob_sum
+        if other.prob_max is not None:
+            self.prob_max = other.prob_max if self.prob_max is None else max(self.prob_max, other.prob_max)
+        self.high_risk += other.high_risk
+        self.confidence_sum += other.confidence_sum
+        self.high_confidence += other.high_confidence
+        self.has_amount = self.has_amount or other.has_amount
+        self.risk_levels.merge(other.risk_levels)
+        self.categories.merge(other.categories)
+        self.band_counts += other.band_counts
+        self.band_frauds += other.band_frauds
+
+    def result(self):
+        total = self.total
+        risk_levels = self.risk_levels.result()['count'].sort_values(ascending=False)
+        categories = self.categories.result()
+        category_counts = categories['count'].sort_values(ascending=False)
+        category_rates = (categories['fraud'] / categories['count'] * 100).sort_index()
+
+        amount_band_stats = []
+        if self.has_amount:
+            for label, count, fraud_count in zip(DataProcessor.AMOUNT_BAND_LABELS, self.band_counts, self.band_frauds):
+                amount_band_stats.append({
+                    'amount_band': label,
+                    'transactions': int(count),
+                    'fraud_count': int(fraud_count),
+                    'fraud_rate': round((fraud_count / count) * 100, 2) if count > 0 else 0
+                })
+
+        avg_confidence = self.confidence_sum / total if total > 0 else 0.0
+        return {
+            'total_transactions': int(total),
+            'fraudulent_detected': int(self.frauds),
+            'anomalies_detected': int(self.anomalies),
+            'fraud_percentage': round(self.frauds / total * 100, 2) if total > 0 else 0,
+            'avg_fraud_probability': float(self.prob_sum / total) if total > 0 else float('nan'),
+            'max_fraud_probability': float(self.prob_max) if self.prob_max is not None else float('nan'),
+            'high_risk_count': int(self.high_risk),
+            'avg_confidence': round(avg_confidence * 100, 2),
+            'high_confidence_frauds': int(self.high_confidence),
+            'by_risk_level': {key: int(value) for key, value in risk_levels.items()},
+            'by_category': {key: int(value) for key, value in category_counts.head(5).items()},
+            'category_fraud_rates': {key: float(value) for key, value in category_rates.items()},
+            'amount_band_stats': amount_band_stats
+        }
+
+
+class InsightsAccumulator:
+    """Mergeable equivalent of ``build_prediction_insights``"""
+
+    GROUP_COLUMNS = ['prob_sum', 'transaction_count', 'total_amount', 'high_risk_count']
+
+    def __init__(self, top_n=5):
+        self.top_n = top_n
+        self.top = None
+        self.customers = GroupedSums(self.GROUP_COLUMNS)
+        self.merchants = GroupedSums(self.GROUP_COLUMNS)
+        self.total = 0
+        self.prob_sum = 0.0
+        self.high = 0
+        self.medium = 0
+        self.low = 0
+        self.anomalies = 0
+
+    def update(self, df):
+        if df is None or df.empty:
+            return
+        probability = numeric_column(df, PROB_COL)
+        amount = numeric_column(df, 'amount')
+        customer_id = string_column(df, 'customer_id')
+        merchant_id = string_column(df, 'merchant_id')
+        is_high_risk = (probability >= 0.7).astype(np.int64)
+
+        top = pd.DataFrame({
+            'customer_id': customer_id,
+            'merchant_id': merchant_id,
+            'amount': amount,
+            'probability': probability,
+            'risk_level': df['risk_level'] if 'risk_level' in df.columns else 'Low'
+        })
+        if 'transaction_id' in df.columns:
+            top.insert(0, 'transaction_id', df['transaction_id'])
+        self._merge_top(top.nlargest(self.top_n, 'probability'))
+
+        group_values = {
+            'prob_sum': probability.values,
+            'transaction_count': np.ones(len(df), dtype=np.int64),
+            'total_amount': amount.values,
+            'high_risk_count': is_high_risk.values
+        }
+        self.customers.add(customer_id, group_values)
+        self.merchants.add(merchant_id, group_values)
+
+        self.total += len(df)
+        self.prob_sum += float(probability.sum())
+        self.high += int((probability >= 0.7).sum())
+        self.medium += int(((probability >= 0.5) & (probability < 0.7)).sum())
+        self.low += int((probability < 0.3).sum())
+        self.anomalies += int((numeric_column(df, 'is_anomaly') == 1).sum())
+
+    def _merge_top(self, top):
+        if self.top is None:
+            self.top = top
+        else:
+            self.top = pd.concat([self.top, top]).nlargest(self.top_n, 'probability')
+
+    def merge(self, other):
+        if other.top is not None:
+            self._merge_top(other.top)
+        self.customers.merge(other.customers)
+        self.merchants.merge(other.merchants)
+        self.total += other.total
+        self.prob_sum += other.prob_sum
+        self.high += other.high
+        self.medium += other.medium
+        self.low += other.low
+        self.anomalies += other.anomalies
+
+    def _hotspots(self, sums, key_name):
+        stats = sums.result().copy()
+        stats['avg_probability'] = stats['prob_sum'] / stats['transaction_count']
+        stats = stats.sort_values(
+            ['high_risk_count', 'avg_probability', 'transaction_count'],
+            ascending=False
+        ).head(self.top_n)
+        return [
+            {
+                key_name: str(key),
+                'avg_probability': round(float(row['avg_probability']), 4),
+                'transaction_count': int(row['transaction_count']),
+                'total_amount': round(float(row['total_amount']), 2),
+                'high_risk_count': int(row['high_risk_count'])
+            }
+            for key, row in stats.iterrows()
+            if key not in {None, 'nan', 'NaN'}
+        ]
+
+    def result(self):
+        insights = {
+            'top_transactions': [],
+            'hot_customers': [],
+            'merchant_hotspots': [],
+            'risk_pulse': {}
+        }
+        if self.total == 0:
+            return insights
+
+        insights['top_transactions'] = [
+            {
+                'transaction_id': str(row.get('transaction_id') or f"TXN-{idx + 1:03d}"),
+                'customer_id': str(row['customer_id']),
+                'merchant_id': str(row['merchant_id']),
+                'amount': round(float(row['amount']), 2),
+                'probability': round(float(row['probability']), 4),
+                'risk_level': row['risk_level']
+            }
+            for idx, (_, row) in enumerate(self.top.iterrows())
+        ]
+        insights['hot_customers'] = self._hotspots(self.customers, 'customer_id')
+        insights['merchant_hotspots'] = self._hotspots(self.merchants, 'merchant_id')
+
+        total = self.total
+        insights['risk_pulse'] = {
+            'avg_probability': round(self.prob_sum / total, 3),
+            'high_risk_ratio': round(self.high / total * 100, 2),
+            'medium_risk_ratio': round(self.medium / total * 100, 2),
+            'low_risk_ratio': round(self.low / total * 100, 2),
+            'anomaly_rate': round(self.anomalies / total * 100, 2)
+        }
+        return insights
+
+
+class AlertAccumulator:
+    """Counts every custom alert / watchlist hit but only keeps the first ``limit``"""
+
+    ALERT_TYPES = ['amount', 'critical_probability', 'high_probability']
+
+    def __init__(self, alert_rules, limit=ALERT_LIMIT):
+        thresholds = alert_rules.get('thresholds', {})
+        watchlist = alert_rules.get('watchlist', {})
+        self.amount_limit = float(thresholds.get('amount_limit', 0) or 0)
+        self.critical_threshold = float(thresholds.get('critical_probability', 0.85))
+        self.high_threshold = float(thresholds.get('high_probability', 0.65))
+        self.watch_customers = set(str(x) for x in watchlist.get('customers', []))
+        self.watch_merchants = set(str(x) for x in watchlist.get('merchants', []))
+        self.limit = limit
+        self.alerts = []
+        self.watchlist_hits = []
+        self.type_counts = dict.fromkeys(self.ALERT_TYPES, 0)
+        self.watchlist_count = 0
+
+    def update(self, df):
+        if df.empty:
+            return
+        probability = numeric_column(df, PROB_COL).values
+        amount = numeric_column(df, 'amount').values
+        customer_id = string_column(df, 'customer_id', '').str.strip().values
+        merchant_id = string_column(df, 'merchant_id', '').str.strip().values
+        risk_level = string_column(df, 'risk_level', 'Low').values
+
+        amount_hit = amount >= self.amount_limit if self.amount_limit else np.zeros(len(df), dtype=bool)
+        critical_hit = probability >= self.critical_threshold
+        high_hit = ~critical_hit & (probability >= self.high_threshold)
+        watch_hit = (
+            (customer_id != '') & np.isin(customer_id, list(self.watch_customers))
+        ) | (
+            (merchant_id != '') & np.isin(merchant_id, list(self.watch_merchants))
+        )
+
+        self.type_counts['amount'] += int(amount_hit.sum())
+        self.type_counts['critical_probability'] += int(critical_hit.sum())
+        self.type_counts['high_probability'] += int(high_hit.sum())
+        self.watchlist_count += int(watch_hit.sum())
+
+        # Only materialise alert records while there is room under the limit
+        for idx in np.flatnonzero(amount_hit | critical_hit | high_hit):
+            if len(self.alerts) >= self.limit:
+                break
+            prob = float(probability[idx])
+            base = {'customer_id': customer_id[idx], 'merchant_id': merchant_id[idx]}
+            if amount_hit[idx]:
+                self.alerts.append({
+                    'type': 'amount',
+                    'message': f'Transaction amount ${amount[idx]:,.2f} exceeds watch threshold',
+                    **base,
+                    'risk_level': risk_level[idx],
+                    'probability': prob
+                })
+            if critical_hit[idx]:
+                self.alerts.append({
+                    'type': 'critical_probability',
+                    'message': f'Critical probability ({prob:.2%}) detected',
+                    **base,
+                    'risk_level': 'Critical',
+                    'probability': prob
+                })
+            elif high_hit[idx]:
+                self.alerts.append({
+                    'type': 'high_probability',
+                    'message': f'High probability ({prob:.2%}) detected',
+                    **base,
+                    'risk_level': 'High',
+                    'probability': prob
+                })
+        del self.alerts[self.limit:]
+
+        for idx in np.flatnonzero(watch_hit)[:max(0, self.limit - len(self.watchlist_hits))]:
+            self.watchlist_hits.append({
+                'customer_id': customer_id[idx],
+                'merchant_id': merchant_id[idx],
+                'amount': float(amount[idx]),
+                'risk_level': risk_level[idx],
+                'probability': float(probability[idx])
+            })
+
+    def merge(self, other):
+        self.alerts = (self.alerts + other.alerts)[:self.limit]
+        self.watchlist_hits = (self.watchlist_hits + other.watchlist_hits)[:self.limit]
+        for alert_type, count in other.type_counts.items():
+            self.type_counts[alert_type] = self.type_counts.get(alert_type, 0) + count
+        self.watchlist_count += other.watchlist_count
+
+    def summary(self):
+        by_type = {key: value for key, value in self.type_counts.items() if value}
+        return {
+            'total_alerts': sum(self.type_counts.values()),
+            'watchlist_hits': self.watchlist_count,
+            'by_type': by_type,
+            'amount_breaches': by_type.get('amount', 0),
+            'critical_flags': by_type.get('critical_probability', 0),
+            'high_flags': by_type.get('high_probability', 0)
+        }
+
+
+class HeatmapAccumulator:
+    """Per-day transaction / fraud / amount buckets for the heatmap calendar"""
+
+    def __init__(self):
+        self.buckets = GroupedSums(['count', 'fraud_count', 'total_amount'])
+        self.enabled = False
+
+    def update(self, df):
+        if df.empty or 'timestamp' not in df.columns:
+            return
+        self.enabled = True
+        dates = pd.to_datetime(df['timestamp'], errors='coerce').dt.date.astype(str)
+        ones = np.ones(len(df), dtype=np.int64)
+        self.buckets.add(dates, {
+            'count': ones,
+            'fraud_count': (numeric_column(df, PROB_COL) > 0.5).astype(np.int64).values,
+            'total_amount': numeric_column(df, 'amount').values if 'amount' in df.columns else ones
+        })
+
+    def merge(self, other):
+        self.enabled = self.enabled or other.enabled
+        self.buckets.merge(other.buckets)
+
+    def result(self):
+        if not self.enabled:
+            return []
+        grouped = self.buckets.result().sort_index()
+        return [
+            {
+                'date': date,
+                'count': int(row['count']),
+                'fraud_count': int(row['fraud_count']),
+                'total_amount': float(row['total_amount'])
+            }
+            for date, row in grouped.iterrows()
+        ]
+
+
+class PredictionAccumulator:
+    """Folds scored result chunks into every aggregate /api/predict returns"""
+
+    def __init__(self, alert_rules, preview_rows=PREVIEW_ROWS):
+        self.alert_rules = alert_rules
+        self.preview_rows = preview_rows
+        self.preview = []
+        self.preview_count = 0
+        self.total_rows = 0
+        self.chunks = 0
+        self.statistics = StatisticsAccumulator()
+        self.insights = InsightsAccumulator()
+        self.alerts = AlertAccumulator(alert_rules)
+        self.heatmap = HeatmapAccumulator()
+
+    def update(self, results_df):
+        if self.preview_count < self.preview_rows:
+            head = results_df.head(self.preview_rows - self.preview_count)
+            self.preview.append(head)
+            self.preview_count += len(head)
+        self.total_rows += len(results_df)
+        self.chunks += 1
+        self.statistics.update(results_df)
+        self.insights.update(results_df)
+        self.alerts.update(results_df)
+        self.heatmap.update(results_df)
+
+    def merge(self, other):
+        """Fold in the accumulator of the rows that directly follow this one"""
+        for head in other.preview:
+            if self.preview_count >= self.preview_rows:
+                break
+            head = head.head(self.preview_rows - self.preview_count)
+            self.preview.append(head)
+            self.preview_count += len(head)
+        self.total_rows += other.total_rows
+        self.chunks += other.chunks
+        self.statistics.merge(other.statistics)
+        self.insights.merge(other.insights)
+        self.alerts.merge(other.alerts)
+        self.heatmap.merge(other.heatmap)
+
+    def preview_frame(self):
+        if not self.preview:
+            return pd.DataFrame()
+        return pd.concat(self.preview, ignore_index=True)
+
+
+def file_batch_statistics(model, filepath, chunk_size=50000, chunks=None):
+    """First pass over a CSV, chunk by chunk: the FileStatistics of the whole file.
+
+    Only BATCH_STAT_COLUMNS are parsed; ``chunks`` replaces the CSV reader
+    (e.g. with those columns of a columnar copy).
+    """
+    file_stats = FileStatistics(model)
+    if chunks is None:
+        chunks = pd.read_csv(filepath, chunksize=chunk_size, usecols=lambda col: col in BATCH_STAT_COLUMNS)
+    for chunk in chunks:
+        file_stats.add(chunk)
+    return file_stats
+
+
+def stream_predictions(model, filepath, results_filepath, alert_rules, chunk_size=50000, workers=1,
+                       progress=None, chunks=None, file_stats=None):
+    """Score a CSV in bounded chunks, appending results to ``results_filepath``.
+
+    Only one chunk is held in memory at a time; everything the response needs
+    is folded into a PredictionAccumulator. Batch-level features (amount
+    z-score, merchant/customer aggregates, velocity) come from
+    ``file_stats``, by default a chunked first pass over just the columns
+    they need (see file_batch_statistics), so every chunk scores as it
+    would in the whole file. Only the display-only
+    ``iso_fraud_probability`` is still normalised per chunk. With
+    ``workers > 1`` chunks are scored as shards on a ScoringPool and merged
+    back in input order. ``progress(stage, rows_scored=...)`` is called
+    after every chunk. ``chunks`` replaces the CSV reader with any iterable
+    of ``chunk_size``-row frames (e.g. a columnar copy).
+    """
+    accumulator = PredictionAccumulator(alert_rules)
+    for _ in iter_predictions(model, filepath, results_filepath, accumulator, chunk_size, workers, progress,
+                              chunks, keep_rows=False, file_stats=file_stats):
+        pass
+    return accumulator
+
+
+def iter_predictions(model, filepath, results_filepath, accumulator, chunk_size=50000, workers=1,
+                     progress=None, chunks=None, keep_rows=True, file_stats=None):
+    """Generator behind stream_predictions: yields each scored chunk in input order.
+
+    Every chunk is written to ``results_filepath`` and folded into
+    ``accumulator`` before it is yielded, so a consumer can forward rows as
+    they finish (e.g. an NDJSON response) while the aggregates build up.
+    With ``keep_rows=False`` pool shards do not send their rows back to
+    this process and None is yielded in their place.
+    """
+    progress = progress or (lambda stage, fraction=None, **details: None)
+    if file_stats is None:
+        file_stats = file_batch_statistics(model, filepath, chunk_size)
+    if workers and workers > 1:
+        yield from _iter_predictions_parallel(
+            model, filepath, results_filepath, accumulator, chunk_size, workers, progress, chunks, keep_rows,
+            file_stats
+        )
+        return
+
+    header = True
+    if chunks is None:
+        chunks = pd.read_csv(filepath, chunksize=chunk_size)
+    for chunk in chunks:
+        chunk = chunk.reset_index(drop=True)
+        results_chunk = model.predict(chunk, file_stats.for_chunk(chunk))
+        results_chunk.to_csv(results_filepath, mode='w' if header else 'a', header=header, index=False)
+        header = False
+        accumulator.update(results_chunk)
+        progress('scoring', rows_scored=accumulator.total_rows, chunks=accumulator.chunks)
+        yield results_chunk
+    if header:
+        # Empty input: still leave a valid (header-only) results file behind
+        pd.read_csv(filepath, nrows=0).to_csv(results_filepath, index=False)
+
+
+def _score_shard_to_file(chunk, alert_rules, part_path, keep_rows=False, batch_stats=None):
+    """Pool task: score one shard, write its rows to ``part_path``, return its aggregates"""
+    results = worker_model().predict(chunk, batch_stats)
+    results.to_csv(part_path, index=False, header=False)
+    accumulator = PredictionAccumulator(alert_rules)
+    accumulator.update(results)
+    return list(results.columns), accumulator, results if keep_rows else None
+
+
+def _iter_predictions_parallel(model, filepath, results_filepath, accumulator, chunk_size, workers, progress,
+                               chunks=None, keep_rows=False, file_stats=None):
+    alert_rules = accumulator.alert_rules
+    part_dir = tempfile.mkdtemp(prefix='shards_', dir=os.path.dirname(results_filepath) or '.')
+    pending = deque()
+    header_written = False
+
+    def collect_next(out):
+        # Shards are collected strictly in submission order to keep input order
+        nonlocal header_written
+        future, part_path, chunk = pending.popleft()
+        columns, shard_accumulator, results = future.result()
+        ROWS_SCORED.labels().inc(len(chunk))
+        if not header_written:
+            out.write(pd.DataFrame(columns=columns).to_csv(index=False).encode('utf-8'))
+            header_written = True
+        with open(part_path, 'rb') as part:
+            shutil.copyfileobj(part, out)
+        os.remove(part_path)
+        accumulator.merge(shard_accumulator)
+        progress('scoring', rows_scored=accumulator.total_rows, chunks=accumulator.chunks)
+        return results
+
+    try:
+        with ScoringPool(model, workers) as pool, open(results_filepath, 'wb') as out:
+            if chunks is None:
+                chunks = pd.read_csv(filepath, chunksize=chunk_size)
+            for shard_idx, chunk in enumerate(chunks):
+                # Bound the number of shards in flight so memory stays flat
+                if len(pending) >= pool.workers * 2:
+                    yield collect_next(out)
+                part_path = os.path.join(part_dir, f'shard_{shard_idx:06d}.csv')
+                chunk = chunk.reset_index(drop=True)
+                # Velocity state moves through the file in order, so it is taken here, not in the shard
+                future = pool.submit(_score_shard_to_file, chunk, alert_rules, part_path, keep_rows,
+                                     file_stats.for_chunk(chunk))
+                pending.append((future, part_path, chunk))
+            while pending:
+                yield collect_next(out)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+    if not header_written:
+        pd.read_csv(filepath, nrows=0).to_csv(results_filepath, index=False)
@@ -0,0 +1,32 @@
+import importlib
+import os
+
+import pytest
+
+from data_processor import DataProcessor
+from ml_models import FraudDetectionModel
+
+
+@pytest.fixture(scope='module')
+def backend(tmp_path_factory):
+    # The app keeps its models/ and uploads/ folders relative to the working directory
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(tmp_path_factory.mktemp('backend'))
+        backend_app = importlib.import_module('backend_app')
+        model = FraudDetectionModel()
+        model.train(DataProcessor.generate_sample_data(600, random_state=0))
+        backend_app.swap_model(model, 'test')
+        yield backend_app
+
+
+def test_saved_models_are_listed(backend):
+    client = backend.app.test_client()
+    for name in ('v1', 'v1', 'v2'):
+        assert client.post('/api/save-model', json={'name': name}).get_json()['success']
+    assert 'current.json' in os.listdir(os.path.join('models', 'v1'))
+
+    listing = client.get('/api/models').get_json()
+    assert listing['saved'] == ['v1', 'v2']
+
+    loaded = client.post('/api/load-model', json={'name': 'v1', 'activate': False}).get_json()
+    assert loaded['success']
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar import ColumnWriter, UnsupportedColumn, read_columns, write_columns
+from feature_cache import FeatureMatrixCache
+
+CHUNK_ROWS = 40
+
+
+def upload(path, rows=200, seed=0):
+    """A CSV whose columns only reveal their whole-file dtype in later chunks"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'transaction_id': [f'T{i}' for i in range(rows)],
+        'amount': np.round(rng.exponential(50, rows), 2),
+        'customer_id': rng.integers(1, 30, rows).astype(object),
+        'merchant_category': rng.choice(['grocery', 'travel', 'online'], rows).astype(object),
+        'note': pd.Series(np.nan, index=range(rows), dtype=object),
+        'flag': pd.Series(rng.random(rows) < 0.5, dtype=object),
+    })
+    # Integer ids with a missing value near the end, text missing for whole chunks
+    df.loc[rows - 3, 'customer_id'] = np.nan
+    df.loc[:CHUNK_ROWS, 'merchant_category'] = np.nan
+    df.loc[rows - 1, 'note'] = 'late'
+    # Booleans that turn out to be text in the last chunk
+    df.loc[rows - 1, 'flag'] = 'unknown'
+    df.to_csv(path, index=False)
+    return path
+
+
+def read_in_chunks(path):
+    return pd.concat(pd.read_csv(path, chunksize=CHUNK_ROWS), ignore_index=True)
+
+
+def test_chunked_writer_matches_whole_file(tmp_path):
+    path = upload(str(tmp_path / 'upload.csv'))
+    writer = ColumnWriter(str(tmp_path / 'chunked'))
+    with pytest.raises(UnsupportedColumn, match='flag'):
+        for chunk in pd.read_csv(path, chunksize=CHUNK_ROWS):
+            writer.append(chunk)
+
+    whole = pd.read_csv(path).drop(columns='flag')
+    writer = ColumnWriter(str(tmp_path / 'chunked'))
+    for chunk in pd.read_csv(path, chunksize=CHUNK_ROWS, usecols=list(whole.columns)):
+        writer.append(chunk)
+    writer.close()
+    write_columns(str(tmp_path / 'whole'), whole)
+
+    pd.testing.assert_frame_equal(read_columns(str(tmp_path / 'chunked')), whole)
+    pd.testing.assert_frame_equal(read_columns(str(tmp_path / 'chunked')), read_columns(str(tmp_path / 'whole')))
+
+
+def test_header_only_file(tmp_path):
+    path = str(tmp_path / 'empty.csv')
+    pd.DataFrame(columns=['amount', 'customer_id']).to_csv(path, index=False)
+    writer = ColumnWriter(str(tmp_path / 'chunked'))
+    for chunk in pd.read_csv(path, chunksize=CHUNK_ROWS):
+        writer.append(chunk)
+    writer.close()
+    pd.testing.assert_frame_equal(read_columns(str(tmp_path / 'chunked')), pd.read_csv(path))
+
+
+def test_streamed_read_leaves_a_columnar_copy(tmp_path):
+    path = upload(str(tmp_path / 'upload.csv'))
+    pd.read_csv(path).drop(columns='flag').to_csv(path, index=False)
+    cache = FeatureMatrixCache(str(tmp_path / 'cache'), 1 << 30)
+
+    # Stopping part-way keeps no copy
+    next(cache.stream_frame(path, CHUNK_ROWS))
+    assert cache.frame_chunks(path, CHUNK_ROWS) is None
+
+    streamed = pd.concat(cache.stream_frame(path, CHUNK_ROWS), ignore_index=True)
+    pd.testing.assert_frame_equal(streamed, read_in_chunks(path))
+    cached = pd.concat(cache.frame_chunks(path, CHUNK_ROWS), ignore_index=True)
+    pd.testing.assert_frame_equal(cached, pd.read_csv(path))
+
+
+def test_unsupported_file_is_still_read_through(tmp_path):
+    path = upload(str(tmp_path / 'upload.csv'))
+    cache = FeatureMatrixCache(str(tmp_path / 'cache'), 1 << 30)
+    streamed = pd.concat(cache.stream_frame(path, CHUNK_ROWS), ignore_index=True)
+    pd.testing.assert_frame_equal(streamed, read_in_chunks(path))
+    assert cache.frame_chunks(path, CHUNK_ROWS) is None
@@ -0,0 +1,96 @@
+import io
+import random
+
+import pandas as pd
+import pytest
+
+from csv_validation import CsvUploadError, RecordCounter, spool_csv
+
+BLOCK_SIZES = [1, 2, 3, 7, 64, 1 << 20]
+RANDOM_BLOCK_SIZES = [2, 7, 1 << 20]
+
+EDGE_CASES = [
+    b'a,b\n1,2\n',
+    b'a,b\n1,2',
+    b'a,b\n\n1,2\n\n\n',
+    b'a,b\r\n1,2\r\n\r\n3,4',
+    b'a,b\r1,2\r3,4\r',
+    b'a,b\n"x\ny",2\n"q""\n",3\n',
+    b'a,b\n1,"\n\n"\n',
+    # Stray quotes inside unquoted fields are literal
+    b'a,b\n1,ab"c\n3,4\n5,6\n',
+    b'a,b\n1,5" pipe\n2,3\n',
+    b'a,b\n1, "x\n2,3\n',
+    # Junk after a closing quote continues the field
+    b'a,b\n"x"y,1\n"p"q"r,2\n3,4\n',
+    # Whitespace-only lines are blank
+    b'a,b\n1,2\n   \n\t\n3,4\n',
+    b'a,b\n  \r\n1,2\n \t ',
+    b'a,b\n1,2\n "x",3\n',
+]
+
+
+def count_rows(data, block_bytes):
+    counter = RecordCounter()
+    for i in range(0, len(data), block_bytes):
+        counter.feed(data[i:i + block_bytes])
+    return counter.total() - 1
+
+
+def random_csv(rng):
+    fields = ['1', 'z', 'ab"c', '5"', '"x\ny"', '"a""b"', '"\n\n"', '""', '"q"r', ' "s"', '"t,u"', '']
+    rows = ['a,b,c']
+    for _ in range(rng.randint(0, 30)):
+        rows.append(f'{rng.choice(fields)},{rng.randint(0, 9)},{rng.choice(fields)}')
+        if rng.random() < .2:
+            rows.append(rng.choice(['', ' ', '\t', '  \t ']))
+    # pandas itself miscounts some bare-\r files, which the edge cases cover
+    newline = rng.choice(['\n', '\r\n'])
+    return (newline.join(rows) + rng.choice(['', newline, newline * 2])).encode()
+
+
+def expected_rows(data):
+    try:
+        return len(pd.read_csv(io.BytesIO(data), engine='c'))
+    except (pd.errors.ParserError, pd.errors.EmptyDataError):
+        return None
+
+
+@pytest.mark.parametrize('data', EDGE_CASES)
+def test_counter_matches_pandas_on_edge_cases(data):
+    expected = expected_rows(data)
+    for block_bytes in BLOCK_SIZES:
+        assert count_rows(data, block_bytes) == expected, (block_bytes, data)
+
+
+def test_counter_matches_pandas_on_random_csv():
+    rng = random.Random(21)
+    checked = 0
+    while checked < 400:
+        data = random_csv(rng)
+        expected = expected_rows(data)
+        # Unterminated quoted fields are a parse error, not a count
+        if expected is None:
+            continue
+        for block_bytes in RANDOM_BLOCK_SIZES:
+            assert count_rows(data, block_bytes) == expected, (block_bytes, data)
+        checked += 1
+
+
+def test_spool_csv_counts_rows_and_replaces_file(tmp_path):
+    target = tmp_path / 'upload.csv'
+    data = b'amount,label\n1.5,0\n"2,5",1\n\n3,0\n'
+    result = spool_csv(io.BytesIO(data), str(target), block_bytes=4)
+    assert result['success']
+    assert result['rows'] == 3
+    assert result['columns'] == ['amount', 'label']
+    assert target.read_bytes() == data
+
+
+@pytest.mark.parametrize('data, message', [(b'', 'empty'), (b'a,b\n\xff,1\n', 'UTF-8')])
+def test_spool_csv_rejects_bad_uploads(tmp_path, data, message):
+    target = tmp_path / 'upload.csv'
+    with pytest.raises(CsvUploadError, match=message):
+        spool_csv(io.BytesIO(data), str(target))
+    assert not target.exists()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,129 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_store import EntityFeatureStore, HashIndex, VelocityWindows
+
+WEEK = 7 * 86400
+# Recent enough that the watermark check against the wall clock lets it advance
+START = 1_700_000_000
+
+
+def transactions(seed=0):
+    """A heavy customer (500 transactions in a week) among light ones, with tied timestamps"""
+    rng = np.random.default_rng(seed)
+    heavy = pd.DataFrame({'customer': 7, 'time': START + rng.integers(0, WEEK, 500)})
+    light = pd.DataFrame({'customer': rng.integers(100, 150, 300), 'time': START + rng.integers(0, 3 * WEEK, 300)})
+    df = pd.concat([heavy, light, heavy.iloc[:20]], ignore_index=True)
+    df['amount'] = np.round(rng.exponential(60, len(df)), 2)
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def rolling_reference(df):
+    """Velocity features from a pandas time-based rolling window per customer"""
+    frame = df.assign(ts=pd.to_datetime(df['time'], unit='s')).sort_values('ts', kind='stable')
+    # Results come back customer by customer, each in time order
+    rows = frame.index[np.argsort(frame['customer'].values, kind='stable')]
+    expected = {}
+    for label, seconds in VelocityWindows.WINDOWS:
+        rolled = frame.groupby('customer').rolling(f'{seconds}s', on='ts')['amount']
+        for kind, values in (('count', rolled.count()), ('amount', rolled.sum())):
+            expected[f'velocity_{kind}_{label}'] = pd.Series(values.values, index=rows).reindex(df.index).values
+    return expected
+
+
+def assert_matches(features, expected, rows=slice(None)):
+    for name, values in expected.items():
+        np.testing.assert_allclose(features[name], values[rows], rtol=1e-9, atol=1e-6, err_msg=name)
+
+
+def test_heavy_customer_matches_rolling_reference():
+    df = transactions()
+    features = VelocityWindows().transform(df['customer'], df['time'], df['amount'])
+    expected = rolling_reference(df)
+    assert_matches(features, expected)
+    heavy = (df['customer'] == 7).values
+    assert features['velocity_count_7d'][heavy].max() == 520
+
+
+def test_read_only_transform_leaves_the_store_alone():
+    df = transactions(seed=2)
+    windows = VelocityWindows()
+    windows.transform(df['customer'], df['time'], df['amount'])
+    before = (windows.times.copy(), windows.offsets.copy(), windows.watermark)
+    probe = pd.DataFrame({'customer': [7, 7, 999], 'time': [START + WEEK] * 3, 'amount': [1.0, 2.0, 3.0]})
+    first = windows.transform(probe['customer'], probe['time'], probe['amount'], update=False)
+    again = windows.transform(probe['customer'], probe['time'], probe['amount'], update=False)
+    assert_matches(again, first)
+    np.testing.assert_array_equal(windows.times, before[0])
+    np.testing.assert_array_equal(windows.offsets, before[1])
+    assert windows.watermark == before[2]
+    assert list(first['velocity_count_1h']) == [first['velocity_count_1h'][0], first['velocity_count_1h'][0] + 1, 1]
+
+
+def test_out_of_window_events_and_idle_customers_are_dropped():
+    windows = VelocityWindows()
+    windows.transform([1, 2, 2], [START, START, START + 10], [5.0, 6.0, 7.0])
+    later = START + WEEK + 5
+    features = windows.transform([2], [later], [1.0])
+    # Customer 1's only event is a week before the watermark, customer 2's first one too
+    assert len(windows) == 1
+    assert list(windows.times) == [START + 10, later]
+    assert features['velocity_count_7d'][0] == 2
+    assert features['velocity_amount_7d'][0] == 8.0
+
+
+def test_missing_timestamps_get_nan_and_are_not_stored():
+    windows = VelocityWindows()
+    features = windows.transform([1, 1], [VelocityWindows.NO_TIME, START], [5.0, 6.0])
+    assert np.isnan(features['velocity_count_1h'][0])
+    assert features['velocity_count_1h'][1] == 1
+    assert list(windows.times) == [START]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    df = transactions(seed=3)
+    store = EntityFeatureStore()
+    store.transform(df['amount'], customer_ids=df['customer'], timestamps=df['time'])
+    path = str(tmp_path / 'store')
+    store.save(path)
+    loaded = EntityFeatureStore.load(path)
+    probe = df.iloc[:50]
+    assert_matches(
+        loaded.velocity_features(probe['customer'], probe['time'], probe['amount']),
+        store.velocity_features(probe['customer'], probe['time'], probe['amount'])
+    )
+    assert loaded.velocity.watermark == store.velocity.watermark
+
+
+def test_format_2_ring_buffers_load(tmp_path):
+    path = str(tmp_path)
+    capacity = 4
+    keys = np.array([10, 20], dtype=np.int64)
+    times = np.zeros((2, capacity), dtype=np.int64)
+    amounts = np.zeros((2, capacity))
+    times[0, :3], amounts[0, :3] = [START, START + 60, START + 120], [1.0, 2.0, 3.0]
+    times[1, :1], amounts[1, :1] = [START + 30], [4.0]
+    arrays = {'keys': keys, 'table': HashIndex(keys).table, 'times': times, 'amounts': amounts,
+              'lengths': np.array([3, 1])}
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f'velocity_{name}.npy'), array)
+    windows = VelocityWindows.load_ring_buffers(path, 'velocity', capacity, START + 120)
+    assert list(windows.offsets) == [0, 3, 4]
+    features = windows.transform([10, 20], [START + 180] * 2, [0.0, 0.0], update=False)
+    assert list(features['velocity_count_1h']) == [4, 2]
+    assert list(features['velocity_amount_1h']) == [6.0, 4.0]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_any_batch_cut_matches_rolling_reference(seed):
+    rng = np.random.default_rng(seed)
+    df = transactions(seed=seed).sort_values('time', kind='stable').reset_index(drop=True)
+    expected = rolling_reference(df)
+    cuts = np.sort(rng.choice(np.arange(1, len(df)), 15, replace=False))
+    windows = VelocityWindows()
+    for rows in np.split(np.arange(len(df)), cuts):
+        batch = df.iloc[rows]
+        assert_matches(windows.transform(batch['customer'], batch['time'], batch['amount']), expected, rows)
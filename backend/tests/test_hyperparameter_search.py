@@ -0,0 +1,39 @@
+import pytest
+
+from hyperparameter_search import DEFAULT_PARAMS, PARAM_LIMITS, SEARCH_SPACE, validate_params
+
+
+def test_limits_cover_every_default():
+    for member, defaults in DEFAULT_PARAMS.items():
+        assert set(PARAM_LIMITS[member]) == set(defaults)
+        assert validate_params({member: dict(defaults)}) == {member: defaults}
+
+
+def test_search_space_is_within_limits():
+    for member, space in SEARCH_SPACE.items():
+        for name, values in space.items():
+            for value in values:
+                validate_params({member: {name: value}})
+
+
+def test_whole_number_floats_become_ints():
+    checked = validate_params({'random_forest': {'n_estimators': 100.0}, 'xgboost': {'learning_rate': 1}})
+    assert checked == {'random_forest': {'n_estimators': 100}, 'xgboost': {'learning_rate': 1.0}}
+    assert type(checked['random_forest']['n_estimators']) is int
+
+
+@pytest.mark.parametrize('params', [
+    {'xgboost': {'max_depth': 'abc'}},
+    {'random_forest': {'n_estimators': 1e9}},
+    {'random_forest': {'max_depth': 2.5}},
+    {'random_forest': {'min_samples_split': 1}},
+    {'xgboost': {'learning_rate': 0}},
+    {'xgboost': {'learning_rate': float('nan')}},
+    {'xgboost': {'subsample': True}},
+    {'xgboost': {'colsample_bytree': None}},
+    {'xgboost': {'gamma': 1}},
+    {'lightgbm': {}},
+])
+def test_rejects_bad_overrides(params):
+    with pytest.raises(ValueError):
+        validate_params(params)
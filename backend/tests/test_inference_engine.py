@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from inference_engine import InferenceEngine
+from ml_models import FraudDetectionModel, random_forest_classifier, xgboost_classifier
+
+N_FEATURES = 8
+TOLERANCE = 1e-6
+
+
+def training_data(rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((rows, N_FEATURES))
+    y = ((X[:, 0] + X[:, 1] * X[:, 2] > 1.0) | (rng.random(rows) < 0.03)).astype(int)
+    # Missing values while fitting give splits that send NaN either way
+    X[rng.random(X.shape) < 0.05] = np.nan
+    return X, y
+
+
+def scoring_inputs(seed=1):
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((300, N_FEATURES)) * 1.5
+    X[rng.random(X.shape) < 0.1] = np.nan
+    X[0] = np.nan
+    return {
+        'batch': X,
+        'single row': X[5:6],
+        'single missing row': X[:1],
+        'dense': np.nan_to_num(X),
+    }
+
+
+@pytest.fixture(scope='module', params=[1.0, 0.5], ids=['all-features', 'feature-subsampled'])
+def model(request):
+    X, y = training_data()
+    model = FraudDetectionModel()
+    model.rf_model = random_forest_classifier({'n_estimators': 20}, n_jobs=1).fit(X, y)
+    model.xgb_model = xgboost_classifier({'n_estimators': 20}, base_score=float(y.mean()), n_jobs=1).fit(X, y)
+    model.isolation_forest = IsolationForest(
+        n_estimators=20, max_features=request.param, contamination=0.05, random_state=42
+    ).fit(X)
+    assert model.compile_inference(X[:200])
+    return model
+
+
+@pytest.mark.parametrize('name', list(scoring_inputs()))
+def test_members_match_fitted_models(model, name):
+    X = scoring_inputs()[name]
+    engine = model.inference_engine
+    np.testing.assert_allclose(engine.rf.predict_proba(X), model.rf_model.predict_proba(X), rtol=0, atol=TOLERANCE)
+    np.testing.assert_allclose(engine.xgb.predict_proba(X), model.xgb_model.predict_proba(X), rtol=0, atol=TOLERANCE)
+    np.testing.assert_allclose(
+        engine.isolation_forest.score_samples(X), model.isolation_forest.score_samples(X), rtol=0, atol=TOLERANCE
+    )
+    np.testing.assert_array_equal(engine.isolation_forest.predict(X), model.isolation_forest.predict(X))
+
+
+@pytest.mark.parametrize('name', list(scoring_inputs()))
+def test_score_matrix_matches_fitted_models(model, name):
+    X = scoring_inputs()[name]
+    engine = model.inference_engine
+    compiled = model.score_matrix(X)
+    try:
+        model.inference_engine = None
+        fitted = model.score_matrix(X)
+    finally:
+        model.inference_engine = engine
+
+    assert compiled.keys() == fitted.keys()
+    for column, expected in fitted.items():
+        if np.asarray(expected).dtype.kind == 'f':
+            np.testing.assert_allclose(compiled[column], expected, rtol=0, atol=TOLERANCE, err_msg=column)
+        else:
+            np.testing.assert_array_equal(compiled[column], expected, err_msg=column)
+
+
+def test_stored_arrays_rebuild_the_same_engine(model):
+    X = scoring_inputs()['batch']
+    arrays, metadata = model.inference_engine.to_arrays()
+    restored = InferenceEngine.from_arrays(arrays, metadata)
+    np.testing.assert_array_equal(restored.rf.predict_proba(X), model.inference_engine.rf.predict_proba(X))
+    np.testing.assert_array_equal(restored.xgb.predict_proba(X), model.inference_engine.xgb.predict_proba(X))
+    np.testing.assert_array_equal(
+        restored.isolation_forest.score_samples(X), model.inference_engine.isolation_forest.score_samples(X)
+    )
+
+
+def test_mismatched_engine_fails_verification(model):
+    engine = model.inference_engine
+    try:
+        # A threshold moved without remapping (e.g. after a scaler update) must fail the check
+        engine.rf.ensemble.threshold[engine.rf.ensemble.roots] += 0.5
+        with pytest.raises(ValueError, match='Random Forest'):
+            engine.verify(model, scoring_inputs()['dense'])
+    finally:
+        engine.rf.ensemble.threshold[engine.rf.ensemble.roots] -= 0.5
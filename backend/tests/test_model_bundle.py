@@ -0,0 +1,123 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from model_bundle import (
+    BUNDLE_FILENAME, POINTER_FILENAME, BundleError, ModelBundle, model_files, new_model_files,
+    prune_model_files, publish_model_files, read_pointer, write_bundle
+)
+
+WEIGHTS = np.arange(1000, dtype=np.float32).reshape(100, 10)
+
+
+def write_version(folder, scale=1.0):
+    """Write a bundle and an (empty) feature store under new names; returns their pointer"""
+    bundle_name, store_name = new_model_files()
+    write_bundle(os.path.join(folder, bundle_name), {'weights': WEIGHTS * scale}, {'params': {'scale': scale}})
+    os.makedirs(os.path.join(folder, store_name))
+    return {'bundle': bundle_name, 'feature_store': store_name}
+
+
+@pytest.fixture
+def bundle_path(tmp_path):
+    path = str(tmp_path / 'model.bundle')
+    write_bundle(path, {'weights': WEIGHTS}, {'params': {'depth': 3}}, metadata={'version': 'test'})
+    return path
+
+
+def rewrite(path, edit):
+    with open(path, 'rb') as f:
+        data = bytearray(f.read())
+    with open(path, 'wb') as f:
+        f.write(edit(data))
+
+
+def test_round_trip(bundle_path):
+    bundle = ModelBundle(bundle_path)
+    assert np.array_equal(bundle.array('weights'), WEIGHTS)
+    assert not bundle.array('weights').flags.writeable
+    assert bundle.load_object('params') == {'depth': 3}
+    assert bundle.metadata == {'version': 'test'}
+
+
+@pytest.mark.parametrize('edit', [
+    pytest.param(lambda data: data[:-10], id='truncated-payload'),
+    pytest.param(lambda data: data[:12], id='truncated-header'),
+    pytest.param(lambda data: data[:100], id='truncated-manifest'),
+    pytest.param(lambda data: b'NOTABUND' + data[8:], id='wrong-magic'),
+    pytest.param(lambda data: data.replace(b'"format": 1', b'"format": 2', 1), id='other-format'),
+])
+def test_rejects_damaged_header(bundle_path, edit):
+    rewrite(bundle_path, edit)
+    with pytest.raises(BundleError):
+        ModelBundle(bundle_path)
+
+
+def test_rejects_flipped_payload_byte(bundle_path):
+    def flip(data):
+        data[-1] ^= 0xFF
+        return data
+    rewrite(bundle_path, flip)
+    with pytest.raises(BundleError, match='checksum'):
+        ModelBundle(bundle_path)
+    # Skipping verification still opens it, for callers that checked already
+    assert ModelBundle(bundle_path, verify=False).array('weights').shape == WEIGHTS.shape
+
+
+def test_folder_without_pointer_uses_fixed_names(tmp_path):
+    folder = str(tmp_path)
+    assert read_pointer(folder) is None
+    assert model_files(folder) == (os.path.join(folder, BUNDLE_FILENAME), os.path.join(folder, 'feature_store'))
+
+
+def test_pointer_switch_prunes_while_mapped(tmp_path):
+    folder = str(tmp_path)
+    first = write_version(folder)
+    publish_model_files(folder, first)
+    live = ModelBundle(model_files(folder)[0])
+    weights = live.array('weights')
+
+    second = write_version(folder, scale=2.0)
+    publish_model_files(folder, second)
+
+    assert read_pointer(folder) == second
+    bundle_path, store_path = model_files(folder)
+    assert sorted(os.listdir(folder)) == sorted([POINTER_FILENAME, second['bundle'], second['feature_store']])
+    assert np.array_equal(ModelBundle(bundle_path).array('weights'), WEIGHTS * 2)
+    assert os.path.isdir(store_path)
+    # The superseded bundle is gone from disk, but the mapping still reads it
+    assert np.array_equal(weights, WEIGHTS)
+    assert live.load_object('params') == {'scale': 1.0}
+
+
+def test_prune_leaves_files_it_cannot_remove(tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    first = write_version(folder)
+    publish_model_files(folder, first)
+    second = write_version(folder, scale=2.0)
+
+    # Windows refuses to delete a file some process still maps
+    real_remove = os.remove
+    def remove(path):
+        if os.path.basename(path) == first['bundle']:
+            raise PermissionError(13, 'The process cannot access the file', path)
+        real_remove(path)
+    monkeypatch.setattr(os, 'remove', remove)
+    publish_model_files(folder, second)
+    assert read_pointer(folder) == second
+    assert first['bundle'] in os.listdir(folder)
+    assert first['feature_store'] not in os.listdir(folder)
+
+    monkeypatch.setattr(os, 'remove', real_remove)
+    prune_model_files(folder)
+    assert sorted(os.listdir(folder)) == sorted([POINTER_FILENAME, second['bundle'], second['feature_store']])
+
+
+def test_pointer_is_plain_json(tmp_path):
+    folder = str(tmp_path)
+    pointer = write_version(folder)
+    publish_model_files(folder, pointer)
+    with open(os.path.join(folder, POINTER_FILENAME), encoding='utf-8') as f:
+        assert json.load(f) == pointer
@@ -0,0 +1,105 @@
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from results_store import PROB_COL, ResultsNotReady, ResultsStore
+
+
+def results_frame(rows=250, seed=0):
+    rng = np.random.default_rng(seed)
+    # Coarse probabilities give long runs of ties for the rowid tie-break
+    probability = np.round(rng.random(rows), 1)
+    amount = np.round(rng.exponential(50, rows), 2)
+    amount[rng.choice(rows, rows // 10, replace=False)] = np.nan
+    return pd.DataFrame({
+        'transaction_id': [f'T{i}' for i in range(rows)],
+        'customer_id': rng.integers(1, 20, rows),
+        'amount': amount,
+        PROB_COL: probability,
+        'risk_level': np.where(probability > 0.7, 'HIGH', 'LOW')
+    })
+
+
+def all_pages(store, run_id, limit, **options):
+    ids, cursor = [], None
+    while True:
+        page = store.query(run_id, limit=limit, cursor=cursor, **options)
+        ids.extend(row['transaction_id'] for row in page['results'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return ids
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultsStore(str(tmp_path / 'results.sqlite3'), max_runs=2)
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'sort': 'amount'},
+    {'sort': 'amount', 'descending': True},
+    {'sort': 'customer_id', 'filters': {'risk_level': 'HIGH'}},
+    {'filters': {'min_probability': 0.3, 'customer_id': ['3', '4', '5']}},
+])
+def test_pages_are_stable_and_complete(store, options):
+    run_id = store.save_frame(results_frame())
+    single = store.query(run_id, limit=1000, **options)
+    expected = [row['transaction_id'] for row in single['results']]
+    assert single['next_cursor'] is None and expected
+
+    for limit in (1, 7, 50):
+        assert all_pages(store, run_id, limit, **options) == expected
+    # Every page is ordered by the sort column, then by row number
+    rows = pd.DataFrame(single['results'])
+    sort = single['sort']
+    ascending = single['order'] == 'asc'
+    ordered = rows.sort_values([sort, '_row'], ascending=ascending, na_position='first' if ascending else 'last')
+    assert list(ordered['transaction_id']) == expected
+
+
+def test_pages_ignore_runs_saved_in_between(store):
+    run_id = store.save_frame(results_frame())
+    expected = all_pages(store, run_id, 1000)
+    page = store.query(run_id, limit=40)
+    ids = [row['transaction_id'] for row in page['results']]
+    store.save_frame(results_frame(seed=1))
+    cursor = page['next_cursor']
+    while cursor:
+        page = store.query(run_id, limit=40, cursor=cursor)
+        ids.extend(row['transaction_id'] for row in page['results'])
+        cursor = page['next_cursor']
+    assert ids == expected
+
+
+def test_cursor_outlives_its_run(store):
+    run_id = store.save_frame(results_frame())
+    cursor = store.query(run_id, limit=10)['next_cursor']
+    for seed in (1, 2):
+        store.save_frame(results_frame(seed=seed))
+    assert store.run(run_id) is None
+    assert store.query(run_id, limit=10, cursor=cursor) is None
+
+
+def test_pending_runs_are_not_pruned(store):
+    pending = store.reserve({'filepath': 'slow.csv'})
+    for seed in range(3):
+        store.save_frame(results_frame(seed=seed))
+    runs = store.runs()
+    assert [run['status'] for run in runs].count('complete') == 2
+    assert pending in [run['run_id'] for run in runs]
+    with pytest.raises(ResultsNotReady):
+        store.query(pending)
+
+
+def test_abandoned_pending_runs_are_pruned(store):
+    pending = store.reserve()
+    with closing(sqlite3.connect(store.path)) as conn:
+        conn.execute("UPDATE runs SET created_at = '2000-01-01T00:00:00' WHERE run_id = ?", (pending,))
+        conn.commit()
+    for seed in range(2):
+        store.save_frame(results_frame(seed=seed))
+    assert store.run(pending) is None
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_processor import DataProcessor
+from feature_store import EntityFeatureStore
+from ml_models import FileStatistics, FraudDetectionModel
+from streaming import PROB_COL, file_batch_statistics, stream_predictions
+
+CHUNK_ROWS = 97
+
+
+def transactions(rows=600, seed=0):
+    df = DataProcessor.generate_sample_data(rows, random_state=seed)
+    # Velocity only carries across chunks for files in time order
+    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+
+def model_with_store(history):
+    model = FraudDetectionModel()
+    model.feature_store = EntityFeatureStore()
+    model.feature_store.transform(
+        history['amount'].values, merchant_ids=history['merchant_id'].values,
+        customer_ids=history['customer_id'].values,
+        timestamps=history['timestamp'].values.astype('datetime64[s]').astype(np.int64)
+    )
+    return model
+
+
+def chunks_of(df, rows=CHUNK_ROWS):
+    return [df.iloc[start:start + rows].reset_index(drop=True) for start in range(0, len(df), rows)]
+
+
+def assert_same_statistics(chunked, whole):
+    assert chunked.keys() == whole.keys()
+    for name, expected in whole.items():
+        actual = chunked[name]
+        if isinstance(expected, pd.DataFrame):
+            key = expected.columns[0]
+            actual = actual.sort_values(key).reset_index(drop=True)
+            expected = expected.sort_values(key).reset_index(drop=True)
+            pd.testing.assert_frame_equal(actual, expected, check_dtype=False, rtol=1e-9)
+        elif isinstance(expected, dict):
+            for column, values in expected.items():
+                np.testing.assert_allclose(actual[column], values, rtol=1e-9, err_msg=column)
+        else:
+            assert actual == pytest.approx(expected, rel=1e-9), name
+
+
+@pytest.mark.parametrize('with_store', [False, True], ids=['batch-aggregates', 'feature-store'])
+def test_chunked_statistics_match_the_whole_file(with_store):
+    df = transactions()
+    model = model_with_store(transactions(seed=1)) if with_store else FraudDetectionModel()
+    whole = model.batch_statistics(df)
+
+    file_stats = FileStatistics(model)
+    for chunk in chunks_of(df):
+        file_stats.add(chunk)
+    parts = [file_stats.for_chunk(chunk) for chunk in chunks_of(df)]
+    for start, part in zip(range(0, len(df), CHUNK_ROWS), parts):
+        expected = dict(whole)
+        if 'velocity' in whole:
+            expected['velocity'] = {name: values[start:start + CHUNK_ROWS] for name, values in whole['velocity'].items()}
+        assert_same_statistics(part, expected)
+
+
+def test_first_pass_reads_only_the_statistics_columns(tmp_path):
+    path = str(tmp_path / 'upload.csv')
+    df = transactions()
+    df.to_csv(path, index=False)
+    model = FraudDetectionModel()
+    file_stats = file_batch_statistics(model, path, chunk_size=CHUNK_ROWS)
+    assert_same_statistics(file_stats.for_chunk(df.head(0)), model.batch_statistics(df))
+
+
+@pytest.fixture(scope='module')
+def trained_model():
+    model = FraudDetectionModel()
+    model.train(DataProcessor.generate_sample_data(600, random_state=0))
+    return model
+
+
+def test_streamed_file_scores_like_one_batch(trained_model, tmp_path):
+    path = str(tmp_path / 'upload.csv')
+    results_path = str(tmp_path / 'results.csv')
+    df = transactions(400, seed=2)
+    df.to_csv(path, index=False)
+    accumulator = stream_predictions(trained_model, path, results_path, {}, chunk_size=CHUNK_ROWS)
+    assert accumulator.chunks == -(-len(df) // CHUNK_ROWS)
+    streamed = pd.read_csv(results_path)
+    whole = trained_model.predict(pd.read_csv(path))
+    np.testing.assert_allclose(streamed[PROB_COL], whole[PROB_COL], rtol=0, atol=1e-6)
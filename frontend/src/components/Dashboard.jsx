@@ -9,6 +9,22 @@ import '../styles/dashboard.css';
 import DownloadDialog from './DownloadDialog';
 import { exportData } from '../utils/exportUtils';
 
+const JOB_POLL_INTERVAL_MS = 1000;
+
+// Poll a background job until it finishes; onProgress receives each status update
+const waitForJob = async (jobId, onProgress) => {
+  for (;;) {
+    const response = await axios.get(`${API_URL}/api/jobs/${jobId}`);
+    const job = response.data.job;
+    if (job.status === 'completed') return job;
+    if (job.status === 'failed' || job.status === 'cancelled') {
+      throw new Error(job.error || `Job ${job.status}`);
+    }
+    if (onProgress) onProgress(job);
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+};
+
 export const Dashboard = ({ fileInfo, onPredictionsComplete }) => {
   const [fraudLabel, setFraudLabel] = useState('is_fraud');
   const [predictions, setPredictions] = useState(null);
@@ -75,7 +91,19 @@ export const Dashboard = ({ fileInfo, onPredictionsComplete }) => {
       });
 
       if (response.data.success) {
-        setTrainingStats(response.data.stats);
+        // Training runs as a background job; poll it until the new model is live
+        let stats = response.data.stats;
+        if (!stats && response.data.job_id) {
+          const job = await waitForJob(response.data.job_id, (progressJob) => {
+            setModelStatus({
+              state: 'training',
+              message: `Training: ${(progressJob.stage || progressJob.status).replace('_', ' ')} (${Math.round(progressJob.progress * 100)}%)`,
+              timestamp: new Date().toISOString()
+            });
+          });
+          stats = job.result;
+        }
+        setTrainingStats(stats);
         setModelStatus({
           state: 'online',
           message: 'Training completed successfully — model is live!',